@@ -26,7 +26,8 @@ with DAG(dag_id='trading_daily_import', schedule_interval="@daily", default_args
                                function=get_events_on_period, first_delete=True)
     uploading_candles = AnyToDb(task_id="uploading_candles", provide_context=True, table_name='candle',
                                 function=get_candles_all_symbols)
-    aggregating_candles = CandleAggregation(task_id='aggregating_candles',  provide_context=True, scope='day')
+    aggregating_candles = CandleAggregation(task_id='aggregating_candles',  provide_context=True, scope='day',
+                                            incremental=True)
 
     uploading_events >> uploading_candles >> aggregating_candles
 
@@ -4,16 +4,18 @@ from airflow.models.baseoperator import BaseOperator
 from airflow.hooks.postgres_hook import PostgresHook
 from airflow.utils.decorators import apply_defaults
 
-from db.utils import insert_df_to_db, delete_data
+from db.utils import insert_df_to_db, delete_data, create_candle_partitions, CANDLE_TABLES
 
 
 class AnyToDb(BaseOperator):
     @apply_defaults
-    def __init__(self, table_name: str, function: Callable, first_delete: bool = False, *args, **kwargs) -> None:
+    def __init__(self, table_name: str, function: Callable, first_delete: bool = False, insert_method: str = 'values',
+                 *args, **kwargs) -> None:
         super().__init__(*args, **kwargs)
         self.table_name = table_name
         self.function = function
         self.first_delete = first_delete
+        self.insert_method = insert_method
 
     def execute(self, context):
         schema = 'trading'
@@ -22,9 +24,11 @@ class AnyToDb(BaseOperator):
 
         pg_hook = PostgresHook(postgres_conn_id='trading', schema=schema)
         with pg_hook.get_conn() as conn:
+            if self.table_name in CANDLE_TABLES:
+                create_candle_partitions(conn, schema, date, date)
             if self.first_delete:
                 delete_data(conn, self.table_name, schema, date, date)
-            insert_df_to_db(conn, data, self.table_name, schema)
+            insert_df_to_db(conn, data, self.table_name, schema, method=self.insert_method)
 
         return
 
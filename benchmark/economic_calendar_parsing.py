@@ -0,0 +1,96 @@
+import json
+import logging
+from pathlib import Path
+from time import perf_counter
+from typing import Dict, List, Optional
+
+import pandas as pd
+from bs4 import BeautifulSoup, Tag
+from cerberus import Validator
+
+from data.economic_calendar import schema, parse_event_columns
+from utils.utils import convert_to_number
+
+fixtures_path = Path(__file__).parent.parent / 'test' / 'data' / 'economic_calendar'
+
+
+def bs4_parse_event_html(event: Tag) -> Optional[Dict]:
+    # parse_event_html before parse_event_columns, with a new Validator for every event
+    res = dict()
+    res['time'] = event.find(class_='time').get_text().strip()
+    res['country'] = event.find(class_='flagCur').get_text().strip()
+    importance = event.find(class_='sentiment').get('title').strip()
+    if 'faible' in importance.lower():
+        res['importance'] = 1
+    elif 'moyenne' in importance.lower():
+        res['importance'] = 2
+    elif 'forte' in importance.lower():
+        res['importance'] = 3
+    res['name'] = event.find(class_='event').get_text().strip()
+
+    actual_value = event.find(class_='act')
+    is_positive = 0
+    if 'greenFont' in actual_value['class']:
+        is_positive = 1
+    elif 'redFont' in actual_value['class']:
+        is_positive = -1
+    res['actual_value'] = convert_to_number(actual_value.get_text().strip())
+    res['is_positive'] = is_positive
+
+    res['forecast_value'] = convert_to_number(event.find(class_='fore').get_text().strip())
+    res['previous_value'] = convert_to_number(event.find(class_='prev').get_text().strip())
+
+    event_validator = Validator(schema)
+    if not event_validator(res):
+        res = None
+    return res
+
+
+def bs4_parse_events(data: str, date: str) -> List[Dict]:
+    events = list()
+    soup = BeautifulSoup(data, features='lxml')
+    for ev in soup.select('.js-event-item'):
+        res = bs4_parse_event_html(ev)
+        if res:
+            res['date'] = date + ' ' + res['time']
+            del res['time']
+            events.append(res)
+    return events
+
+
+def build_pages(nb_pages: int, nb_rows: int = 200) -> List[str]:
+    # pages of nb_rows events made of the rows of the recorded responses
+    rows = list()
+    for fixture in sorted(fixtures_path.glob('2021-*.json')):
+        rows.extend([x + '\n' for x in json.loads(fixture.read_text())['data'].split('\n') if 'js-event-item' in x])
+    page = ''.join(rows[i % len(rows)] for i in range(nb_rows))
+    return [page] * nb_pages
+
+
+def run_benchmark(nb_pages: int = 20) -> pd.DataFrame:
+    logging.disable(logging.INFO)
+    pages = build_pages(nb_pages)
+    results = list()
+
+    start = perf_counter()
+    old_events = [bs4_parse_events(page, '2021-03-15') for page in pages]
+    old_time = perf_counter() - start
+
+    start = perf_counter()
+    new_columns = [parse_event_columns(page, '2021-03-15') for page in pages]
+    new_time = perf_counter() - start
+    new_events = [[dict(zip(c.keys(), values)) for values in zip(*c.values())] for c in new_columns]
+
+    nb_events = 200 * nb_pages
+    for name, elapsed in [('bs4 + Validator per event', old_time), ('lxml + ColumnValidator', new_time)]:
+        results.append({'parser': name,
+                        'nb_events': nb_events,
+                        'time_s': round(elapsed, 3),
+                        'events_per_s': round(nb_events / elapsed),
+                        'same_output': old_events == new_events})
+    logging.disable(logging.NOTSET)
+    return pd.DataFrame(results)
+
+
+if __name__ == '__main__':
+    print(run_benchmark().to_string(index=False))
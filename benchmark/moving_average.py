@@ -0,0 +1,55 @@
+from time import perf_counter
+
+import numpy as np
+import pandas as pd
+
+from indicator.trend import WeightedMovingAverage, HullMovingAverage
+
+
+def rolling_apply_wma(data: pd.DataFrame, col: str, span: int) -> np.ndarray:
+    # WeightedMovingAverage.compute before it used a convolution
+    weights = np.arange(1, span + 1)
+    weights_sum = weights.sum()
+    return data[col].rolling(window=span).apply(lambda x: (x * weights).sum() / weights_sum, raw=True).values
+
+
+def rolling_apply_hma(data: pd.DataFrame, col: str, span: int) -> np.ndarray:
+    # HullMovingAverage.compute before it used a convolution, it adds scratch columns to data
+    data['wma_span1'] = rolling_apply_wma(data, col, span)
+    data['wma_span2'] = rolling_apply_wma(data, col, span // 2)
+    data['diff_wma'] = data['wma_span2'] * 2 - data['wma_span1']
+    return rolling_apply_wma(data, 'diff_wma', int(np.sqrt(span)))
+
+
+def run_benchmark(sizes=(10_000, 100_000, 1_000_000), spans=(6, 20, 200)) -> pd.DataFrame:
+    results = list()
+    rng = np.random.RandomState(0)
+    for nb_values in sizes:
+        data = pd.DataFrame({'close': 1.2 + np.cumsum(rng.normal(0, 5e-4, nb_values))})
+        for span in spans:
+            for name, old_func, new_class in [('WMA', rolling_apply_wma, WeightedMovingAverage),
+                                              ('HMA', rolling_apply_hma, HullMovingAverage)]:
+                old_data = data.copy()
+                start = perf_counter()
+                old_res = old_func(old_data, 'close', span)
+                old_time = perf_counter() - start
+
+                new_data = data.copy()
+                start = perf_counter()
+                new_res = new_class(new_data, 'close').compute(span)
+                new_time = perf_counter() - start
+
+                results.append({'indicator': name,
+                                'nb_values': nb_values,
+                                'span': span,
+                                'rolling_apply_s': round(old_time, 4),
+                                'convolution_s': round(new_time, 4),
+                                'speedup': round(old_time / new_time, 1),
+                                'max_abs_diff': np.nanmax(np.abs(old_res - new_res)),
+                                'same_nan': bool(np.array_equal(np.isnan(old_res), np.isnan(new_res))),
+                                'added_columns': len(old_data.columns) - len(new_data.columns)})
+    return pd.DataFrame(results)
+
+
+if __name__ == '__main__':
+    print(run_benchmark().to_string(index=False))
@@ -0,0 +1,78 @@
+from time import perf_counter
+
+import pandas as pd
+
+from test.helpers import generate_symbol_candles
+from utils.resampling import resample_candles
+
+AGG = {'open': 'first',
+       'close': 'last',
+       'low': 'min',
+       'high': 'max',
+       'tickqty': 'sum'
+       }
+
+COLS = ['symbol', 'day', 'open', 'close', 'low', 'high', 'tickqty']
+
+
+def _one_digit_to_two_digits(x: float) -> str:
+    return str(int(x)) if len(str(int(x))) > 1 else '0' + str(int(x))
+
+
+def string_resampling(candles: pd.DataFrame) -> dict:
+    # CandleAggregation.execute before it used resample_candles, the day, hour4, hour, min30 and min15 columns were
+    # computed by the SQL request
+    candles = candles.copy()
+    candles['day'] = candles['date'].dt.date
+    candles['hour4'] = 4 * (candles['date'].dt.hour // 4)
+    candles['hour'] = candles['date'].dt.hour
+    candles['min30'] = 30 * (candles['date'].dt.minute // 30)
+    candles['min15'] = 15 * (candles['date'].dt.minute // 15)
+    for col in ['hour', 'hour4', 'min30', 'min15']:
+        candles[col] = candles.apply(axis=1, func=lambda x: _one_digit_to_two_digits(x[col]))
+
+    result = dict()
+    for table_name, keys, time_format in [
+            ('candle1d', [], lambda x: ' 00:00:00'),
+            ('candle4h', ['hour4'], lambda x: ' ' + x['hour4'] + ':00:00'),
+            ('candle1h', ['hour'], lambda x: ' ' + x['hour'] + ':00:00'),
+            ('candle30m', ['hour', 'min30'], lambda x: ' ' + x['hour'] + ':' + x['min30'] + ':00'),
+            ('candle15m', ['hour', 'min15'], lambda x: ' ' + x['hour'] + ':' + x['min15'] + ':00')]:
+        agg = candles[COLS + keys].groupby(['symbol', 'day'] + keys).aggregate(AGG).reset_index()
+        agg.rename(columns={'day': 'date'}, inplace=True)
+        agg['date'] = agg['date'].astype(str) + time_format(agg)
+        result[table_name] = agg.drop(columns=keys)
+    return result
+
+
+def run_benchmark(nb_days_list=(1, 7, 31)) -> pd.DataFrame:
+    results = list()
+    for nb_days in nb_days_list:
+        end = pd.Timestamp('2021-01-01') + pd.Timedelta(nb_days, 'D')
+        candles = generate_symbol_candles('2021-01-01', str(end), missing_ratio=0.02)
+
+        start = perf_counter()
+        old_res = string_resampling(candles)
+        old_time = perf_counter() - start
+
+        start = perf_counter()
+        new_res = resample_candles(candles)
+        new_time = perf_counter() - start
+
+        same = True
+        for table_name, new_candles in new_res.items():
+            old_candles = old_res[table_name].sort_values(['symbol', 'date'], ignore_index=True)
+            old_candles['date'] = pd.to_datetime(old_candles['date'])
+            same &= old_candles[new_candles.columns].equals(new_candles)
+
+        results.append({'nb_days': nb_days,
+                        'nb_candles': len(candles),
+                        'string_groupby_s': round(old_time, 4),
+                        'floor_reduceat_s': round(new_time, 4),
+                        'speedup': round(old_time / new_time, 1),
+                        'same_result': same})
+    return pd.DataFrame(results)
+
+
+if __name__ == '__main__':
+    print(run_benchmark().to_string(index=False))
@@ -0,0 +1,53 @@
+from time import perf_counter
+
+import numpy as np
+import pandas as pd
+
+from indicator.oscillator import Rsi, Atr, Stochastic
+from indicator.trend import ExponentialMovingAverage, BollingerBands
+from indicator.streaming import StreamingRsi, StreamingAtr, StreamingStochastic, StreamingExponentialMovingAverage, \
+    StreamingBollingerBands
+from test.helpers import generate_candles
+
+INDICATORS = [('Rsi', StreamingRsi, lambda x: Rsi(x).compute(14)),
+              ('Atr', StreamingAtr, lambda x: Atr(x).compute(14)[0]),
+              ('ExponentialMovingAverage', StreamingExponentialMovingAverage,
+               lambda x: ExponentialMovingAverage(x).compute(20)),
+              ('BollingerBands', StreamingBollingerBands, lambda x: BollingerBands(x).compute(20)[1]),
+              ('Stochastic', StreamingStochastic, lambda x: Stochastic(x).compute(14, 3)[1])]
+
+
+def run_benchmark(history: int = 100_000, nb_new_candles: int = 20) -> pd.DataFrame:
+    """
+    Cost of the value of an indicator on a new candle, by recomputing it over the whole history as the live process
+    did, or by updating its streaming version
+    """
+    candles = generate_candles(history + nb_new_candles)
+    records = candles.to_dict('records')
+    results = list()
+    for name, streaming_cls, batch_func in INDICATORS:
+        start = perf_counter()
+        for i in range(history, history + nb_new_candles):
+            batch_value = np.asarray(batch_func(candles.iloc[:i + 1]))[-1]
+        recompute_time = (perf_counter() - start) / nb_new_candles
+
+        indicator = streaming_cls()
+        for candle in records[:history]:
+            indicator.update(candle)
+        start = perf_counter()
+        for candle in records[history:]:
+            value = indicator.update(candle)
+        update_time = (perf_counter() - start) / nb_new_candles
+        value = value[0] if name == 'Atr' else value[1] if isinstance(value, tuple) else value
+
+        results.append({'indicator': name,
+                        'history': history,
+                        'recompute_us': round(1e6 * recompute_time, 1),
+                        'update_us': round(1e6 * update_time, 1),
+                        'speedup': round(recompute_time / update_time),
+                        'abs_diff': abs(value - batch_value)})
+    return pd.DataFrame(results)
+
+
+if __name__ == '__main__':
+    print(run_benchmark().to_string(index=False))
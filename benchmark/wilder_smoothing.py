@@ -0,0 +1,99 @@
+from time import perf_counter
+
+import numpy as np
+import pandas as pd
+
+from indicator.oscillator import Rsi, Atr
+from indicator.trend import Adx
+from test.helpers import generate_candles
+
+
+def loop_rsi(data: pd.DataFrame, span: int = 14) -> np.ndarray:
+    # Rsi.compute before the recursion was vectorized
+    delta = data['close'] - data['close'].shift(1)
+    delta_pos = np.where(delta >= 0, delta, 0)
+    delta_neg = np.where(delta < 0, abs(delta), 0)
+    avg_gain = list()
+    avg_loss = list()
+    for i in range(len(data)):
+        if i < span:
+            avg_gain.append(np.NaN)
+            avg_loss.append(np.NaN)
+        elif i == span:
+            avg_gain.append(np.mean(delta_pos[:span]))
+            avg_loss.append(np.mean(delta_neg[:span]))
+        else:
+            avg_gain.append(((span - 1) * avg_gain[-1] + delta_pos[i]) / span)
+            avg_loss.append(((span - 1) * avg_loss[-1] + delta_neg[i]) / span)
+    avg_gain = np.array(avg_gain)
+    avg_loss = np.where(np.array(avg_loss) == 0, 1e-10, np.array(avg_loss))
+    return 100 - 100 / (1 + avg_gain / avg_loss)
+
+
+def loop_adx(data: pd.DataFrame, span: int = 14) -> np.ndarray:
+    # Adx.compute before the recursions were vectorized
+    atr = Atr(data, 'close')
+    atr.compute(span)
+    _, tr_max = atr.result
+    high_diff = data['high'] - data.shift(1)['high']
+    low_diff = data.shift(1)['low'] - data['low']
+    dm_plus = np.where(high_diff > low_diff, high_diff, 0)
+    dm_plus = np.where(dm_plus > 0, dm_plus, 0)
+    dm_minus = np.where(low_diff > high_diff, low_diff, 0)
+    dm_minus = np.where(dm_minus > 0, dm_minus, 0)
+
+    tr_max_n, dm_plus_n, dm_minus_n = list(), list(), list()
+    for i in range(len(data)):
+        if i < span:
+            tr_max_n.append(np.NaN)
+            dm_plus_n.append(np.NaN)
+            dm_minus_n.append(np.NaN)
+        elif i == span:
+            tr_max_n.append(np.sum(tr_max[1: span + 1]))
+            dm_plus_n.append(np.sum(dm_plus[1: span + 1]))
+            dm_minus_n.append(np.sum(dm_minus[1: span + 1]))
+        else:
+            tr_max_n.append(tr_max_n[-1] - (tr_max_n[-1] / span) + tr_max[i])
+            dm_plus_n.append(dm_plus_n[-1] - (dm_plus_n[-1] / span) + dm_plus[i])
+            dm_minus_n.append(dm_minus_n[-1] - (dm_minus_n[-1] / span) + dm_minus[i])
+    dm_plus_norm = 100 * np.array(dm_plus_n) / np.array(tr_max_n)
+    dm_minus_norm = 100 * np.array(dm_minus_n) / np.array(tr_max_n)
+    dx = 100 * (np.abs(dm_plus_norm - dm_minus_norm)) / (dm_plus_norm + dm_minus_norm)
+
+    adx = list()
+    for i in range(len(data)):
+        if i < 2 * span - 1:
+            adx.append(np.NaN)
+        elif i == 2 * span - 1:
+            adx.append(np.mean(dx[span: 2 * span]))
+        else:
+            adx.append(((span - 1) * adx[-1] + dx[i]) / span)
+    return np.array(adx)
+
+
+def timeit(func, *args) -> (float, np.ndarray):
+    start = perf_counter()
+    res = func(*args)
+    return perf_counter() - start, res
+
+
+def run_benchmark(sizes=(10_000, 100_000, 1_000_000), span: int = 14) -> pd.DataFrame:
+    results = list()
+    for nb_candles in sizes:
+        candles = generate_candles(nb_candles)
+        for name, loop_func, vectorized_func in [('Rsi', loop_rsi, lambda x, s: Rsi(x).compute(s)),
+                                                 ('Adx', loop_adx, lambda x, s: Adx(x).compute(s)[2])]:
+            loop_time, loop_res = timeit(loop_func, candles, span)
+            vectorized_time, vectorized_res = timeit(vectorized_func, candles, span)
+            results.append({'indicator': name,
+                            'nb_candles': nb_candles,
+                            'loop_s': round(loop_time, 4),
+                            'vectorized_s': round(vectorized_time, 4),
+                            'speedup': round(loop_time / vectorized_time, 1),
+                            'max_abs_diff': np.nanmax(np.abs(loop_res - vectorized_res)),
+                            'same_nan': bool(np.array_equal(np.isnan(loop_res), np.isnan(vectorized_res)))})
+    return pd.DataFrame(results)
+
+
+if __name__ == '__main__':
+    print(run_benchmark().to_string(index=False))
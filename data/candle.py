@@ -1,41 +1,74 @@
 import os
 import logging
-from traceback import print_tb
+import threading
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+from queue import Queue
+from typing import List, Optional
 
-from fxcmpy import fxcmpy
 import pandas as pd
 
-from db.utils import insert_df_to_db, get_uri_db
+from db.pool import get_pool_stats
+from db.utils import insert_df_to_db, get_uri_db, create_candle_partitions
 from utils.utils import get_password, split_period_by_chunk, add_days_to_date
 
 logger = logging.getLogger(__name__)
 
 SYMBOLS = ['EUR/USD', 'USD/JPY', 'GBP/USD', 'AUD/USD', 'USD/CAD', 'USD/CHF', 'USD/HKD', 'EUR/GBP']
+FXCM_COLS = ['askopen', 'askclose', 'askhigh', 'asklow', 'tickqty']
+
+
+class CandleClient(ABC):
+    """
+    Source of candles, with the get_candles and close methods of fxcmpy. One client is shared by the threads
+    downloading the symbols, so get_candles must be thread safe.
+    """
+    @abstractmethod
+    def get_candles(self, symbol: str, period: str, columns: List[str], with_index: bool, start: str, end: str) -> \
+            pd.DataFrame:
+        pass
+
+    def close(self) -> None:
+        pass
 
 
 class FCXMContextManager(object):
+    """
+    FXCM session closed on exit, the errors raised while it is open are logged and raised to the caller
+    """
     def __init__(self, access_token: str, log_level: str, server: str, log_file: str) -> None:
+        # imported here so that the pipeline can be run with another client without fxcmpy installed
+        from fxcmpy import fxcmpy
         self.conn = fxcmpy(access_token=access_token, log_level=log_level, server=server, log_file=log_file)
 
-    def __enter__(self) -> fxcmpy:
+    def __enter__(self) -> CandleClient:
         return self.conn
 
     def __exit__(self, type_, value, traceback):
         self.conn.close()
         if type_ is not None:
             logger.error(f'{type_} : {value}')
-            print_tb(traceback)
-        return True
+        return False
 
 
-def get_candles(symbol: str, period: str = 'm5', start: str = None, end: str = None) -> pd.DataFrame:
-    logger.info(f"Getting candles from FXCM for symbol {symbol} from {start} to {end}")
+def open_client(client: Optional[CandleClient] = None):
+    """
+    :param client: client to use, it is not closed on exit. If None a FXCM session is opened and closed on exit.
+    """
+    if client is not None:
+        return nullcontext(client)
     access_token = get_password('TRADING_FXCM_KEY')
+    return FCXMContextManager(access_token=access_token, log_level='error', server='demo',
+                              log_file=os.environ['TRADING_FXCM_LOGS_PATH'])
+
+
+def fetch_candles(client: CandleClient, symbol: str, period: str = 'm5', start: str = None, end: str = None) -> \
+        pd.DataFrame:
+    logger.info(f"Getting candles from FXCM for symbol {symbol} from {start} to {end}")
     data = pd.DataFrame()
-    with FCXMContextManager(access_token=access_token, log_level='error', server='demo',
-                            log_file=os.environ['TRADING_FXCM_LOGS_PATH']) as conn:
-        data = conn.get_candles(symbol, period=period, columns=['askopen', 'askclose', 'askhigh', 'asklow', 'tickqty'],
-                                with_index=False, start=start, end=end)
+    try:
+        data = client.get_candles(symbol, period=period, columns=FXCM_COLS, with_index=False, start=start, end=end)
         # We rename columns this way because it appears that the column order in API response can change
         for col in ['askopen', 'askclose', 'askhigh', 'asklow']:
             data[col[len('ask'):]] = data[col]
@@ -45,40 +78,80 @@ def get_candles(symbol: str, period: str = 'm5', start: str = None, end: str = N
         # For whatever reason sometimes high and low are not the lowest and the highest
         data['high'] = data[['open', 'close', 'low', 'high']].max(axis=1)
         data['low'] = data[['open', 'close', 'low', 'high']].min(axis=1)
+    except (ValueError, KeyError) as error:
+        # fxcmpy raises a ValueError for a symbol or a period it does not know, and a response without candles has
+        # none of the ask columns. Server, authentication and network errors are raised to the caller.
+        logger.error(f'{type(error)} : {error}')
+        data = pd.DataFrame()
 
     if data.empty:
         logger.warning('No data has been retrieved')
     return data
 
 
-def get_candles_all_symbols(start: str, end: str) -> pd.DataFrame:
-    candles = pd.DataFrame()
+def get_candles(symbol: str, period: str = 'm5', start: str = None, end: str = None,
+                client: Optional[CandleClient] = None) -> pd.DataFrame:
+    with open_client(client) as conn:
+        data = fetch_candles(conn, symbol, period, start, end)
+    return data
+
+
+def get_candles_all_symbols(start: str, end: str, client: Optional[CandleClient] = None, nb_workers: int = 4) -> \
+        pd.DataFrame:
+    """
+    Download the candles of every symbol with nb_workers threads sharing the same session
+    """
     end = add_days_to_date(end, 1)
-    for symb in SYMBOLS:
-        candles_tmp = get_candles(symb, start=start, end=end)
-        candles = pd.concat([candles, candles_tmp], axis=0)
-    candles.reset_index(inplace=True, drop=True)
+    with open_client(client) as conn:
+        with ThreadPoolExecutor(max_workers=nb_workers) as executor:
+            candles = list(executor.map(lambda symb: fetch_candles(conn, symb, start=start, end=end), SYMBOLS))
+    candles = pd.concat(candles, axis=0, ignore_index=True)
     return candles
 
 
-def upload_to_db_candles(start: str, end: str) -> None:
+def upload_to_db_candles(start: str, end: str, insert_method: str = 'values', client: Optional[CandleClient] = None,
+                         nb_workers: int = 4, queue_size: int = 2) -> None:
+    """
+    Download the candles 30 days at a time and insert them in the database. The download of the next chunks goes on
+    while a chunk is inserted, at most queue_size downloaded chunks wait to be inserted.
+    """
     schema = 'trading'
     uri = get_uri_db(schema=schema)
     nb_days_one_chunk = 30
     periods = split_period_by_chunk(start, end, nb_days_one_chunk)
-
-    for p in periods:
-        start_date = p[0]
-        end_date = p[1]
-        candles = get_candles_all_symbols(start_date, end_date)
-        insert_df_to_db(uri, candles, 'candle', schema)
-
-
-
-
-
-
-
-
-
-
+    create_candle_partitions(uri, schema, start, end)
+    chunks = Queue(maxsize=queue_size)
+    errors = list()
+    stop = threading.Event()
+
+    def download() -> None:
+        try:
+            with open_client(client) as conn:
+                for start_date, end_date in periods:
+                    if stop.is_set():
+                        break
+                    chunks.put(get_candles_all_symbols(start_date, end_date, client=conn, nb_workers=nb_workers))
+        except Exception as error:
+            errors.append(error)
+        finally:
+            chunks.put(None)
+
+    downloader = threading.Thread(target=download, name='candle-downloader', daemon=True)
+    downloader.start()
+    done = False
+    try:
+        while not done:
+            candles = chunks.get()
+            done = candles is None
+            if not done:
+                insert_df_to_db(uri, candles, 'candle', schema, method=insert_method)
+    finally:
+        # if an insert failed, the downloader stops after its current chunk, and the queue is drained so that it is
+        # not blocked on a full queue and closes its session
+        stop.set()
+        while not done:
+            done = chunks.get() is None
+        downloader.join()
+    if errors:
+        raise errors[0]
+    logger.info(f"Connection pools: {get_pool_stats()}")
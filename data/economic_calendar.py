@@ -1,9 +1,20 @@
+import os
+import json
+import hashlib
 import logging
-from typing import Dict, List, Optional
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from pathlib import Path
+from time import monotonic, sleep
+from typing import Dict, List, Optional, Tuple
 
 import requests
-from bs4 import BeautifulSoup, Tag
 from cerberus import Validator
+from requests.adapters import HTTPAdapter
+import lxml.html
+from lxml import etree
+import numpy as np
 import pandas as pd
 
 from utils.utils import convert_to_number, split_period_by_chunk
@@ -54,96 +65,311 @@ header = {
 }
 
 
-def parse_event_html(event: Tag) -> Optional[Dict]:
-    res = dict()
-    res['time'] = event.find(class_='time').get_text().strip()
-    res['country'] = event.find(class_='flagCur').get_text().strip()
-    importance = event.find(class_='sentiment').get('title').strip()
-    if 'faible' in importance.lower():
-        res['importance'] = 1
-    elif 'moyenne' in importance.lower():
-        res['importance'] = 2
-    elif 'forte' in importance.lower():
-        res['importance'] = 3
-    res['name'] = event.find(class_='event').get_text().strip()
-
-    actual_value = event.find(class_='act')
-    is_positive = 0
-    if 'greenFont' in actual_value['class']:
-        is_positive = 1
-    elif 'redFont' in actual_value['class']:
-        is_positive = -1
-    res['actual_value'] = convert_to_number(actual_value.get_text().strip())
-    res['is_positive'] = is_positive
-
-    res['forecast_value'] = convert_to_number(event.find(class_='fore').get_text().strip())
-    res['previous_value'] = convert_to_number(event.find(class_='prev').get_text().strip())
-
-    event_validator = Validator(schema)
-    if not event_validator(res):
-        for err, reason in event_validator.errors.items():
-            logger.info(res)
+# a field absent from a record, it is not validated as fields are not required
+MISSING = object()
+
+
+class ColumnValidator(object):
+    """
+    Validate records stored by column against a cerberus schema. A Validator keeps the errors of the last record, so
+    one is created by thread, the schema being compiled then, and it is reused for every record. The fields whose
+    value is MISSING are left out of the record.
+    """
+    def __init__(self, schema: Dict[str, Dict]) -> None:
+        self.schema = schema
+        self._local = threading.local()
+
+    @property
+    def validator(self) -> Validator:
+        if not hasattr(self._local, 'validator'):
+            self._local.validator = Validator(self.schema)
+        return self._local.validator
+
+    def __call__(self, columns: Dict[str, List]) -> Tuple[np.ndarray, List[Dict[str, List[str]]]]:
+        """
+        :param columns: values of each field of the schema, one per record
+        :return: a mask of the valid records and the errors of each record by field
+        """
+        validator = self.validator
+        fields = list(columns.keys())
+        errors = list()
+        for values in zip(*columns.values()):
+            record = {field: value for field, value in zip(fields, values) if value is not MISSING}
+            errors.append(dict() if validator.validate(record) else validator.errors)
+        return np.array([not err for err in errors], dtype=bool), errors
+
+
+EVENT_FIELDS = list(schema.keys())
+EVENT_COLS = ['country', 'importance', 'name', 'actual_value', 'is_positive', 'forecast_value', 'previous_value',
+              'date']
+CELL_CLASSES = ['time', 'flagCur', 'sentiment', 'event', 'act', 'fore', 'prev']
+event_rows = etree.XPath("//*[contains(concat(' ', normalize-space(@class), ' '), ' js-event-item ')]")
+event_validator = ColumnValidator(schema)
+
+
+def find_cells(event: lxml.html.HtmlElement) -> Dict[str, lxml.html.HtmlElement]:
+    """
+    :return: the first descendant of the event having each class of CELL_CLASSES, found in a single pass
+    """
+    cells = dict()
+    for element in event.iterdescendants():
+        classes = element.get('class')
+        if classes is None:
+            continue
+        for cls in classes.split():
+            if cls in CELL_CLASSES and cls not in cells:
+                cells[cls] = element
+        if len(cells) == len(CELL_CLASSES):
+            break
+    return cells
+
+
+def get_text(element: Optional[lxml.html.HtmlElement]) -> Optional[str]:
+    return element.text_content().strip() if element is not None else None
+
+
+def parse_event_columns(data: str, date: str) -> Dict[str, List]:
+    """
+    :param data: html of the events returned for one day
+    :return: the valid events with their date, by column of EVENT_COLS
+    """
+    columns = {field: list() for field in EVENT_FIELDS}
+    events_html = event_rows(lxml.html.document_fromstring(data)) if data.strip() else list()
+    for event in events_html:
+        cells = find_cells(event)
+        columns['time'].append(get_text(cells.get('time')))
+        columns['country'].append(get_text(cells.get('flagCur')))
+        importance = (cells['sentiment'].get('title') or '').strip().lower() if 'sentiment' in cells else ''
+        if 'faible' in importance:
+            columns['importance'].append(1)
+        elif 'moyenne' in importance:
+            columns['importance'].append(2)
+        elif 'forte' in importance:
+            columns['importance'].append(3)
+        else:
+            columns['importance'].append(MISSING)
+        columns['name'].append(get_text(cells.get('event')))
+
+        actual_value = cells.get('act')
+        act_classes = actual_value.get('class', '').split() if actual_value is not None else []
+        is_positive = 0
+        if 'greenFont' in act_classes:
+            is_positive = 1
+        elif 'redFont' in act_classes:
+            is_positive = -1
+        columns['actual_value'].append(convert_to_number(get_text(actual_value)))
+        columns['is_positive'].append(is_positive)
+
+        columns['forecast_value'].append(convert_to_number(get_text(cells.get('fore'))))
+        columns['previous_value'].append(convert_to_number(get_text(cells.get('prev'))))
+
+    is_valid, errors = event_validator(columns)
+    for i in np.flatnonzero(~is_valid):
+        logger.info({field: values[i] for field, values in columns.items() if values[i] is not MISSING})
+        for err, reason in errors[i].items():
             logger.info(f'Error on field {err} : {reason}')
-        res = None
+
+    valid_idx = np.flatnonzero(is_valid)
+    res = {col: [None if columns[col][i] is MISSING else columns[col][i] for i in valid_idx]
+           for col in EVENT_COLS if col != 'date'}
+    res['date'] = [date + ' ' + columns['time'][i] for i in valid_idx]
     return res
 
 
-def get_events(date: str) -> List[Dict]:
-    start_date = date
-    end_date = date
+def parse_events(data: str, date: str) -> List[Dict]:
+    """
+    :param data: html of the events returned for one day
+    :return: the valid events with their date
+    """
+    columns = parse_event_columns(data, date)
+    return [dict(zip(columns.keys(), values)) for values in zip(*columns.values())]
 
+
+def get_request_params(date: str) -> List[tuple]:
     params = [('country[]', c_id) for c_id in countries_id.values()]
-    params.extend([('dateFrom', start_date),
-                   ('dateTo', end_date),
+    params.extend([('dateFrom', date),
+                   ('dateTo', date),
                    ('timeZone', time_zone_gmt0),
                    ('timeFilter', 'timeRemain'),
                    ('currentTab', 'custom'),
                    ('limit_from', '0'),
                    ('submitFilters', '1')
                    ])
+    return params
+
+
+class RateLimiter(object):
+    """
+    Space out the calls to wait, shared by several threads, so that there are at most max_per_second per second
+    """
+    def __init__(self, max_per_second: float) -> None:
+        self.interval = 1 / max_per_second
+        self.next_time = monotonic()
+        self.lock = threading.Lock()
+
+    def wait(self) -> None:
+        with self.lock:
+            now = monotonic()
+            call_time = max(now, self.next_time)
+            self.next_time = call_time + self.interval
+        sleep(call_time - now)
+
 
-    r = requests.post(url, data=params, headers=header)
+class ResponseCache(object):
+    """
+    Responses of getCalendarFilteredData stored on disk, one file per request identified by its date range and the
+    other parameters, the country set included. The values of the events may be revised during revision_days: a
+    response whose dateTo is less than revision_days old is fetched again, older ones are final and served from disk.
+    """
+    def __init__(self, cache_dir: str, revision_days: int = 3) -> None:
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.revision_days = revision_days
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
 
-    events = list()
-    if r.status_code == requests.codes.ok:
-        data = r.json()['data']
-        soup = BeautifulSoup(data, features='lxml')
-        events_html = soup.select('.js-event-item')
-        for ev in events_html:
-            res = parse_event_html(ev)
-            if res:
-                res['date'] = date + ' ' + res['time']
-                del res['time']
-                events.append(res)
+    def _path(self, params: List[tuple]) -> Path:
+        values = dict(params)
+        key = sorted((k, v) for k, v in params if k not in ('dateFrom', 'dateTo'))
+        digest = hashlib.blake2b(repr(key).encode(), digest_size=8).hexdigest()
+        return self.cache_dir / f"{values['dateFrom']}_{values['dateTo']}_{digest}.json"
 
-    if len(events) >= max_event_per_request:
-        logger.warning(f"Missing events for date : {date}")
+    def is_final(self, params: List[tuple]) -> bool:
+        date_to = datetime.strptime(dict(params)['dateTo'], '%Y-%m-%d')
+        return date_to < datetime.now() - timedelta(days=self.revision_days)
 
-    logger.info(f"number of events : {len(events)}")
+    def get(self, params: List[tuple]) -> Optional[bytes]:
+        path = self._path(params)
+        content = path.read_bytes() if self.is_final(params) and path.is_file() else None
+        with self.lock:
+            if content is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return content
 
-    return events
+    def put(self, params: List[tuple], content: bytes) -> None:
+        path = self._path(params)
+        tmp_path = path.with_name(f'{path.name}.{threading.get_ident()}.tmp')
+        tmp_path.write_bytes(content)
+        os.replace(tmp_path, path)
 
+    def stats(self) -> Dict[str, int]:
+        return {'hits': self.hits, 'misses': self.misses}
 
-def get_events_on_period(start_date: str, end_date: str) -> pd.DataFrame:
-    periods = split_period_by_chunk(start_date, end_date, chunk_size=1)
-    events = list()
-    for p in periods:
-        events.extend(get_events(p[0]))
-    events.extend(get_events(end_date))
 
-    events_df = pd.DataFrame(events)
-    events_df = events_df.where(pd.notnull(events_df), None)
+class EventFetcher(object):
+    """
+    Download the events day by day with nb_workers threads sharing one keep-alive session. Requests are rate limited
+    and retried with an exponential backoff on connection errors, 429 and 5xx responses. If cache_dir is set, the
+    responses are kept in a ResponseCache.
+    """
+    retry_status = (429, 500, 502, 503, 504)
 
-    return events_df
+    def __init__(self, base_url: str = url, nb_workers: int = 4, max_requests_per_second: float = 2.,
+                 nb_retries: int = 3, backoff: float = 1., timeout: float = 30., cache_dir: Optional[str] = None,
+                 revision_days: int = 3) -> None:
+        self.base_url = base_url
+        self.cache = ResponseCache(cache_dir, revision_days) if cache_dir is not None else None
+        self.nb_workers = nb_workers
+        self.rate_limiter = RateLimiter(max_requests_per_second)
+        self.nb_retries = nb_retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.session = requests.Session()
+        self.session.headers.update(header)
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=nb_workers)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
 
+    def __enter__(self) -> 'EventFetcher':
+        return self
 
-def upload_to_db_events(start: str = None, end: str = None) -> None:
+    def __exit__(self, type_, value, traceback) -> None:
+        self.session.close()
+
+    def _post(self, params: List[tuple]) -> Optional[requests.Response]:
+        for attempt in range(self.nb_retries + 1):
+            self.rate_limiter.wait()
+            try:
+                r = self.session.post(self.base_url, data=params, timeout=self.timeout)
+                if r.status_code not in self.retry_status:
+                    return r
+                retry_after = r.headers.get('Retry-After', '')
+                delay = float(retry_after) if retry_after.isdigit() else self.backoff * 2 ** attempt
+                logger.warning(f"Status {r.status_code}, attempt {attempt + 1} / {self.nb_retries + 1}")
+            except requests.RequestException as error:
+                delay = self.backoff * 2 ** attempt
+                logger.warning(f"{error}, attempt {attempt + 1} / {self.nb_retries + 1}")
+            if attempt < self.nb_retries:
+                sleep(delay)
+        return None
+
+    def _get_content(self, params: List[tuple]) -> Optional[bytes]:
+        content = self.cache.get(params) if self.cache is not None else None
+        if content is not None:
+            return content
+
+        r = self._post(params)
+        if r is None or r.status_code != requests.codes.ok:
+            return None
+        if self.cache is not None:
+            self.cache.put(params, r.content)
+        return r.content
+
+    def get_event_columns(self, date: str) -> Dict[str, List]:
+        content = self._get_content(get_request_params(date))
+
+        events = {col: list() for col in EVENT_COLS}
+        if content is not None:
+            events = parse_event_columns(json.loads(content)['data'], date)
+
+        nb_events = len(events['date'])
+        if nb_events >= max_event_per_request:
+            logger.warning(f"Missing events for date : {date}")
+
+        logger.info(f"number of events : {nb_events}")
+
+        return events
+
+    def get_events(self, date: str) -> List[Dict]:
+        events = self.get_event_columns(date)
+        return [dict(zip(events.keys(), values)) for values in zip(*events.values())]
+
+    def get_events_on_period(self, start_date: str, end_date: str) -> pd.DataFrame:
+        # every day from start_date to end_date included, once
+        days = sorted({p[0] for p in split_period_by_chunk(start_date, end_date, chunk_size=1)} | {end_date})
+        with ThreadPoolExecutor(max_workers=self.nb_workers) as executor:
+            events_by_day = list(executor.map(self.get_event_columns, days))
+
+        events = {col: [x for events_day in events_by_day for x in events_day[col]] for col in EVENT_COLS}
+        events_df = pd.DataFrame(events) if events['date'] else pd.DataFrame()
+        events_df = events_df.drop_duplicates(['date', 'country', 'name'], ignore_index=True) \
+            if not events_df.empty else events_df
+        events_df = events_df.where(pd.notnull(events_df), None)
+
+        if self.cache is not None:
+            logger.info(f"Response cache: {self.cache.stats()}")
+        return events_df
+
+
+def get_events(date: str) -> List[Dict]:
+    with EventFetcher(nb_workers=1) as fetcher:
+        return fetcher.get_events(date)
+
+
+def get_events_on_period(start_date: str, end_date: str, nb_workers: int = 4, max_requests_per_second: float = 2.,
+                         cache_dir: Optional[str] = None) -> pd.DataFrame:
+    with EventFetcher(nb_workers=nb_workers, max_requests_per_second=max_requests_per_second,
+                      cache_dir=cache_dir) as fetcher:
+        return fetcher.get_events_on_period(start_date, end_date)
+
+
+def upload_to_db_events(start: str = None, end: str = None, cache_dir: Optional[str] = None) -> None:
     schema = 'trading'
     uri = get_uri_db(schema=schema)
-    events = get_events_on_period(start, end)
+    events = get_events_on_period(start, end, cache_dir=cache_dir)
     delete_data(uri, 'event', schema, start, end)
     insert_df_to_db(uri, events, 'event', schema=schema)
     return None
-
-
-
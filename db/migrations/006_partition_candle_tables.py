@@ -0,0 +1,83 @@
+from yoyo import step
+
+from db.utils import CANDLE_TABLES
+
+__depends__ = {'004_add_indexes', '005_create_other_candles_granularities'}
+
+steps = [
+    step('''
+        CREATE OR REPLACE FUNCTION trading.create_monthly_partitions(schema_name text, table_name text,
+                                                                     start_date date, end_date date)
+        RETURNS void AS $$
+        DECLARE
+            month date := date_trunc('month', start_date)::date;
+            next_month date;
+            partition_name text;
+            default_name text := table_name || '_default';
+        BEGIN
+            -- rows outside of the monthly partitions go to the default one instead of failing
+            EXECUTE format('CREATE TABLE IF NOT EXISTS %I.%I PARTITION OF %I.%I DEFAULT',
+                           schema_name, default_name, schema_name, table_name);
+            WHILE month < end_date LOOP
+                next_month := (month + interval '1 month')::date;
+                partition_name := table_name || '_' || to_char(month, 'YYYY_MM');
+                IF to_regclass(format('%I.%I', schema_name, partition_name)) IS NULL THEN
+                    -- the rows of the month in the default partition are moved to the new partition, which can't
+                    -- be created while the default one holds some of its rows
+                    EXECUTE format('CREATE TEMP TABLE month_rows ON COMMIT DROP AS
+                                    SELECT * FROM %I.%I WHERE date >= %L AND date < %L',
+                                   schema_name, default_name, month, next_month);
+                    EXECUTE format('DELETE FROM %I.%I WHERE date >= %L AND date < %L',
+                                   schema_name, default_name, month, next_month);
+                    EXECUTE format('CREATE TABLE %I.%I PARTITION OF %I.%I FOR VALUES FROM (%L) TO (%L)',
+                                   schema_name, partition_name, schema_name, table_name, month, next_month);
+                    EXECUTE format('INSERT INTO %I.%I SELECT * FROM month_rows', schema_name, table_name);
+                    DROP TABLE month_rows;
+                END IF;
+                month := next_month;
+            END LOOP;
+        END;
+        $$ LANGUAGE plpgsql;
+    ''')
+]
+
+for table in CANDLE_TABLES:
+    steps += [
+        step(f'''
+            ALTER TABLE trading.{table} RENAME TO {table}_old;
+        '''),
+        step(f'''
+            CREATE TABLE trading.{table} (
+                id uuid DEFAULT public.uuid_generate_v4() NOT NULL,
+                created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+                date TIMESTAMP NOT NULL,
+                symbol text NOT NULL,
+                open NUMERIC NOT NULL,
+                close NUMERIC NOT NULL,
+                low NUMERIC NOT NULL,
+                high NUMERIC NOT NULL,
+                tickqty INTEGER NOT NULL,
+                UNIQUE (symbol, date)
+            ) PARTITION BY RANGE (date);
+        '''),
+        # partitions from the first candle to one year ahead, the following ones are created by
+        # db.utils.create_candle_partitions before candles are inserted. The rows outside of them go to the default
+        # partition.
+        step(f'''
+            SELECT trading.create_monthly_partitions(
+                'trading', '{table}',
+                COALESCE((SELECT min(date) FROM trading.{table}_old), NOW())::date,
+                (date_trunc('month', NOW()) + interval '13 months')::date);
+        '''),
+        step(f'''
+            INSERT INTO trading.{table} (id, created_at, date, symbol, open, close, low, high, tickqty)
+            SELECT id, created_at, date, symbol, open, close, low, high, tickqty
+            FROM trading.{table}_old;
+        '''),
+        step(f'''
+            DROP TABLE trading.{table}_old;
+        '''),
+        step(f'''
+            CREATE INDEX idx_{table}_date_brin ON trading.{table} USING BRIN (date);
+        ''')
+    ]
@@ -0,0 +1,144 @@
+import os
+import re
+import time
+import logging
+import threading
+from contextlib import contextmanager
+from typing import Dict, Union, Iterator
+
+import psycopg2
+import psycopg2.extensions
+
+logger = logging.getLogger(__name__)
+
+
+def _redact(dsn: str) -> str:
+    return re.sub(r':[^:@/]*@', ':***@', dsn)
+
+
+class ConnectionPool(object):
+    """
+    Pool of connections to one database. Connections are opened when needed, up to max_size, and a checkout waits
+    for a connection to be given back when all of them are in use.
+    """
+    def __init__(self, dsn: str, max_size: int = 5) -> None:
+        self.dsn = dsn
+        self.max_size = max_size
+        self._idle = list()
+        self.nb_opened = 0
+        self._available = threading.BoundedSemaphore(max_size)
+        self._lock = threading.Lock()
+        self.nb_checkouts = 0
+        self.nb_in_use = 0
+        self.wait_time = 0.
+        self.max_wait_time = 0.
+
+    @contextmanager
+    def connection(self) -> Iterator[psycopg2.extensions.connection]:
+        start = time.perf_counter()
+        self._available.acquire()
+        wait_time = time.perf_counter() - start
+        with self._lock:
+            conn = self._idle.pop() if self._idle else None
+        if conn is None:
+            try:
+                conn = psycopg2.connect(self.dsn)
+            except Exception:
+                self._available.release()
+                raise
+            with self._lock:
+                self.nb_opened += 1
+        with self._lock:
+            self.nb_checkouts += 1
+            self.nb_in_use += 1
+            self.wait_time += wait_time
+            self.max_wait_time = max(self.max_wait_time, wait_time)
+
+        try:
+            yield conn
+        finally:
+            # a transaction left open by the caller is not seen by the next one
+            close = bool(conn.closed)
+            if not close and conn.status != psycopg2.extensions.STATUS_READY:
+                try:
+                    conn.rollback()
+                except psycopg2.Error:
+                    close = True
+            if close:
+                conn.close()
+            with self._lock:
+                if close:
+                    self.nb_opened -= 1
+                else:
+                    self._idle.append(conn)
+                self.nb_in_use -= 1
+            self._available.release()
+
+    def close(self) -> None:
+        with self._lock:
+            for conn in self._idle:
+                conn.close()
+            self.nb_opened -= len(self._idle)
+            self._idle = list()
+
+    def stats(self) -> Dict[str, Union[int, float]]:
+        with self._lock:
+            return {'max_size': self.max_size,
+                    'size': self.nb_opened,
+                    'in_use': self.nb_in_use,
+                    'checkouts': self.nb_checkouts,
+                    'wait_time': round(self.wait_time, 6),
+                    'max_wait_time': round(self.max_wait_time, 6)}
+
+
+_pools = dict()
+_pools_pid = os.getpid()
+_pools_lock = threading.Lock()
+
+
+def get_pool(uri: str, max_size: int = 5) -> ConnectionPool:
+    """
+    :param uri: dsn of the database, possibly followed by ?schema=<schema>. The schema is set by every query, so the
+    connections to a database are shared by all the schemas.
+    :param max_size: max number of connections, only used when the pool is created
+    :return: the pool of the process for this database
+    """
+    global _pools, _pools_pid
+    dsn = uri.split('?schema=')[0]
+    with _pools_lock:
+        # connections cannot be shared with a forked process, which starts with its own pools
+        if _pools_pid != os.getpid():
+            _pools, _pools_pid = dict(), os.getpid()
+        if dsn not in _pools:
+            _pools[dsn] = ConnectionPool(dsn, max_size)
+        return _pools[dsn]
+
+
+@contextmanager
+def get_connection(conn: Union[str, psycopg2.extensions.connection]) -> \
+        Iterator[psycopg2.extensions.connection]:
+    """
+    :param conn: an open connection, used as is, or a uri of the database to check out a connection from its pool
+    """
+    if isinstance(conn, str):
+        with get_pool(conn).connection() as pooled_conn:
+            yield pooled_conn
+    else:
+        yield conn
+
+
+def get_pool_stats() -> Dict[str, Dict[str, Union[int, float]]]:
+    """
+    :return: stats of the pools of the process, by database with the password hidden
+    """
+    with _pools_lock:
+        pools = dict(_pools) if _pools_pid == os.getpid() else dict()
+    return {_redact(dsn): pool.stats() for dsn, pool in pools.items()}
+
+
+def close_pools() -> None:
+    global _pools
+    with _pools_lock:
+        for pool in _pools.values():
+            pool.close()
+        _pools = dict()
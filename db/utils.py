@@ -1,15 +1,19 @@
 import os
+import io
 import logging
-from typing import Tuple, Optional
+from typing import Tuple, Optional, Sequence
 
 import pandas as pd
 import psycopg2
 import psycopg2.extras as extras
 
+from db.pool import get_connection
 from utils.utils import get_password, add_days_to_date
 
 logger = logging.getLogger(__name__)
 
+CANDLE_TABLES = ['candle', 'candle15m', 'candle30m', 'candle1h', 'candle4h', 'candle1d']
+
 
 def get_uri_db(schema: str = None) -> str:
     password = get_password('TRADING_DB_PASSWORD_PATH')
@@ -32,13 +36,24 @@ def split_uri_to_dsn_and_schema(uri: str) -> Tuple[str, Optional[str]]:
     return res[0], schema
 
 
-def insert_df_to_db(conn: str, df: pd.DataFrame, table_name: str, schema: Optional[str]) -> None:
+def insert_df_to_db(conn: str, df: pd.DataFrame, table_name: str, schema: Optional[str], method: str = 'values') -> \
+        Optional[Tuple[int, int]]:
+    """
+    :param method:
+    - value 'values' to insert the rows with a multi-values INSERT
+    - value 'copy' to load them with COPY through a staging table, see copy_df_to_db
+    :return: with method 'copy', number of rows inserted and number of rows skipped
+    """
+    if method == 'copy':
+        return copy_df_to_db(conn, df, table_name, schema)
+    elif method != 'values':
+        raise ValueError(f"Unknown insert method {method}")
+
     logger.info(f"Inserting data into table {table_name}")
 
-    # case connection is represented by a uri
+    # case connection is represented by a uri, a connection is checked out from its pool
     if type(conn) == str:
-        dsn, schema = split_uri_to_dsn_and_schema(conn)
-        conn = psycopg2.connect(dsn)
+        _, schema = split_uri_to_dsn_and_schema(conn)
 
     if schema is None:
         raise ValueError("No schema is specified")
@@ -47,7 +62,7 @@ def insert_df_to_db(conn: str, df: pd.DataFrame, table_name: str, schema: Option
     tuples = [tuple(x) for x in df.to_numpy()]
     cols = ','.join(list(df.columns))
     query = f'''INSERT INTO {table_name}({cols}) VALUES %s ON CONFLICT DO NOTHING;'''
-    with conn.cursor() as cur:
+    with get_connection(conn) as conn, conn.cursor() as cur:
         try:
             extras.execute_values(cur, query, tuples)
             conn.commit()
@@ -57,18 +72,99 @@ def insert_df_to_db(conn: str, df: pd.DataFrame, table_name: str, schema: Option
     return
 
 
+def copy_df_to_db(conn: str, df: pd.DataFrame, table_name: str, schema: Optional[str], chunk_size: int = 100000) -> \
+        Tuple[int, int]:
+    """
+    Load a DataFrame into a table by streaming it as csv with COPY into a temporary staging table, chunk by chunk,
+    and merging each chunk into the table. Rows conflicting with existing ones are skipped, as in insert_df_to_db.
+    :return: number of rows inserted and number of rows skipped, an error is raised after the rollback
+    """
+    logger.info(f"Copying data into table {table_name}")
+
+    # case connection is represented by a uri, a connection is checked out from its pool
+    if type(conn) == str:
+        _, schema = split_uri_to_dsn_and_schema(conn)
+
+    if schema is None:
+        raise ValueError("No schema is specified")
+
+    staging_table = 'staging_' + table_name
+    table_name = schema + '.' + table_name
+    cols = ','.join(list(df.columns))
+    nb_inserted = 0
+    with get_connection(conn) as conn, conn.cursor() as cur:
+        try:
+            cur.execute(f'''CREATE TEMP TABLE {staging_table} ON COMMIT DROP AS
+                           SELECT {cols} FROM {table_name} WITH NO DATA;''')
+            for start in range(0, len(df), chunk_size):
+                buffer = io.StringIO()
+                df.iloc[start: start + chunk_size].to_csv(buffer, index=False, header=False)
+                buffer.seek(0)
+                cur.copy_expert(f'''COPY {staging_table} ({cols}) FROM STDIN WITH (FORMAT csv);''', buffer)
+                cur.execute(f'''INSERT INTO {table_name}({cols}) SELECT {cols} FROM {staging_table}
+                               ON CONFLICT DO NOTHING;''')
+                nb_inserted += cur.rowcount
+                cur.execute(f'''TRUNCATE {staging_table};''')
+            conn.commit()
+        except (Exception, psycopg2.DatabaseError) as error:
+            logger.error("Error: %s" % error)
+            conn.rollback()
+            raise
+
+    nb_skipped = len(df) - nb_inserted
+    logger.info(f"{nb_inserted} rows inserted, {nb_skipped} rows skipped")
+    return nb_inserted, nb_skipped
+
+
+def upsert_df_to_db(conn: str, df: pd.DataFrame, table_name: str, schema: Optional[str],
+                    keys: Sequence[str] = ('date', 'symbol'), page_size: int = 1000) -> int:
+    """
+    Insert the rows of a DataFrame, the rows conflicting with existing ones on keys replace them
+    :return: number of rows inserted or updated
+    """
+    logger.info(f"Upserting data into table {table_name}")
+
+    # case connection is represented by a uri, a connection is checked out from its pool
+    if type(conn) == str:
+        _, schema = split_uri_to_dsn_and_schema(conn)
+
+    if schema is None:
+        raise ValueError("No schema is specified")
+
+    table_name = schema + '.' + table_name
+    tuples = [tuple(x) for x in df.to_numpy()]
+    cols = ','.join(list(df.columns))
+    updates = ','.join([f'{col} = EXCLUDED.{col}' for col in df.columns if col not in keys])
+    query = f'''INSERT INTO {table_name}({cols}) VALUES %s
+                ON CONFLICT ({','.join(keys)}) DO UPDATE SET {updates};'''
+    nb_rows = 0
+    with get_connection(conn) as conn, conn.cursor() as cur:
+        try:
+            # rowcount only covers the last statement run by execute_values, so pages are sent one by one
+            for start in range(0, len(tuples), page_size):
+                extras.execute_values(cur, query, tuples[start: start + page_size], page_size=page_size)
+                nb_rows += cur.rowcount
+            conn.commit()
+        except (Exception, psycopg2.DatabaseError) as error:
+            logger.error("Error: %s" % error)
+            conn.rollback()
+    return nb_rows
+
+
 def delete_data(conn: str, table_name: str, schema: Optional[str], start_date, end_date) -> None:
     logger.info(f"Delete data from table {table_name}")
 
-    # case connection is represented by a uri
+    # case connection is represented by a uri, a connection is checked out from its pool
     if type(conn) == str:
-        dsn, schema = split_uri_to_dsn_and_schema(conn)
-        conn = psycopg2.connect(dsn)
+        _, schema = split_uri_to_dsn_and_schema(conn)
+
+    if schema is None:
+        raise ValueError("No schema is specified")
 
     end_date = add_days_to_date(end_date, 1)
     table_name = schema + '.' + table_name
     query = f'''DELETE FROM {table_name} WHERE date >= %s AND date < %s;'''
-    with conn.cursor() as cur:
+    with get_connection(conn) as conn, conn.cursor() as cur:
         try:
             cur.execute(query, (start_date, end_date, ))
             conn.commit()
@@ -77,3 +173,25 @@ def delete_data(conn: str, table_name: str, schema: Optional[str], start_date, e
             conn.rollback()
 
 
+def create_candle_partitions(conn: str, schema: Optional[str], start_date, end_date) -> None:
+    """
+    Create the monthly partitions of the candle tables which are missing between start_date and end_date, and the
+    default partition of each table which receives the rows outside of the monthly ones
+    """
+    # case connection is represented by a uri, a connection is checked out from its pool
+    if type(conn) == str:
+        _, schema = split_uri_to_dsn_and_schema(conn)
+
+    if schema is None:
+        raise ValueError("No schema is specified")
+
+    end_date = add_days_to_date(end_date, 1)
+    query = f'''SELECT {schema}.create_monthly_partitions(%s, %s, %s, %s);'''
+    with get_connection(conn) as conn, conn.cursor() as cur:
+        try:
+            for table_name in CANDLE_TABLES:
+                cur.execute(query, (schema, table_name, start_date, end_date))
+            conn.commit()
+        except (Exception, psycopg2.DatabaseError) as error:
+            logger.error("Error: %s" % error)
+            conn.rollback()
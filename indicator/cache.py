@@ -0,0 +1,161 @@
+import hashlib
+import inspect
+import pickle
+import copy
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, Optional, Callable, Hashable
+
+import numpy as np
+import pandas as pd
+
+
+def fingerprint_column(data: pd.Series) -> str:
+    """
+    :param data: column given to an indicator
+    :return: a digest of the values, dtype and index of the column
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    values = data.values
+    if isinstance(values, np.ndarray) and values.dtype != object:
+        digest.update(str(values.dtype).encode())
+        digest.update(np.ascontiguousarray(values).view(np.uint8).data)
+    else:
+        digest.update(pd.util.hash_pandas_object(data, index=False).values.tobytes())
+    if isinstance(data.index, pd.RangeIndex):
+        digest.update(repr((data.index.start, data.index.stop, data.index.step)).encode())
+    else:
+        digest.update(pd.util.hash_pandas_object(data.index).values.tobytes())
+    return digest.hexdigest()
+
+
+def get_size(obj: Any, seen: Optional[set] = None) -> int:
+    """
+    :return: approximate number of bytes of an indicator result, objects referenced several times are counted once
+    """
+    seen = set() if seen is None else seen
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    if isinstance(obj, np.ndarray):
+        return obj.nbytes
+    if isinstance(obj, (pd.Series, pd.DataFrame)):
+        return int(np.sum(obj.memory_usage(index=True, deep=False)))
+    if isinstance(obj, (tuple, list)):
+        return sum(get_size(x, seen) for x in obj)
+    return 64
+
+
+class IndicatorCache(object):
+    """
+    LRU cache of indicator results, identified by the indicator class, the parameters of compute and a fingerprint
+    of the columns it reads. When the memory bound is reached the least recently used results are dropped, or written
+    to spill_dir if it is set and read back from there on the next request.
+    """
+    def __init__(self, max_bytes: int = 2**28, spill_dir: Optional[str] = None) -> None:
+        self.max_bytes = max_bytes
+        self.spill_dir = Path(spill_dir) if spill_dir is not None else None
+        if self.spill_dir is not None:
+            self.spill_dir.mkdir(parents=True, exist_ok=True)
+        self.entries = OrderedDict()
+        self.nb_bytes = 0
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _spill_path(self, key: Hashable) -> Path:
+        return self.spill_dir / (hashlib.blake2b(repr(key).encode(), digest_size=16).hexdigest() + '.pkl')
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        if key in self.entries:
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return copy.deepcopy(self.entries[key][0])
+
+        if self.spill_dir is not None and self._spill_path(key).is_file():
+            value = pickle.loads(self._spill_path(key).read_bytes())
+            self.disk_hits += 1
+            self._store(key, value)
+            return copy.deepcopy(value)
+
+        self.misses += 1
+        return None
+
+    def put(self, key: Hashable, value: Any) -> None:
+        self._store(key, copy.deepcopy(value))
+
+    def _store(self, key: Hashable, value: Any) -> None:
+        size = get_size(value)
+        if size > self.max_bytes:
+            return
+        if key in self.entries:
+            self.nb_bytes -= self.entries.pop(key)[1]
+        self.entries[key] = (value, size)
+        self.nb_bytes += size
+        while self.nb_bytes > self.max_bytes:
+            old_key, (old_value, old_size) = self.entries.popitem(last=False)
+            self.nb_bytes -= old_size
+            self.evictions += 1
+            if self.spill_dir is not None:
+                self._spill_path(old_key).write_bytes(pickle.dumps(old_value, protocol=pickle.HIGHEST_PROTOCOL))
+
+    def clear(self) -> None:
+        self.entries = OrderedDict()
+        self.nb_bytes = 0
+
+    def stats(self) -> Dict[str, int]:
+        return {'hits': self.hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'nb_entries': len(self.entries),
+                'nb_bytes': self.nb_bytes}
+
+
+_cache = None
+
+
+def set_indicator_cache(cache: Optional[IndicatorCache]) -> None:
+    """
+    :param cache: cache used by the compute method of every indicator, None to disable caching
+    """
+    global _cache
+    _cache = cache
+
+
+def get_indicator_cache() -> Optional[IndicatorCache]:
+    return _cache
+
+
+def cached_compute(compute: Callable) -> Callable:
+    """
+    Wrap the compute method of an indicator so that its result is taken from the indicator cache when there is one
+    and the same indicator was already computed with the same parameters on the same columns.
+    """
+    signature = inspect.signature(compute)
+
+    def wrapper(self, *args, **kwargs):
+        if _cache is None or self.extra_cols is None:
+            return compute(self, *args, **kwargs)
+
+        params = signature.bind(self, *args, **kwargs)
+        params.apply_defaults()
+        cols = [self.col] + [x for x in self.extra_cols if x != self.col]
+        fingerprints = tuple((col, fingerprint_column(self.data[col])) for col in cols if col in self.data.columns)
+        key = (type(self).__module__, type(self).__qualname__, self.col, fingerprints,
+               repr(sorted((k, v) for k, v in params.arguments.items() if k != 'self')))
+
+        cached = _cache.get(key)
+        if cached is not None:
+            self.result, res = cached
+            return res
+
+        res = compute(self, *args, **kwargs)
+        _cache.put(key, (self.result, res))
+        return res
+
+    wrapper.__name__ = compute.__name__
+    wrapper.__doc__ = compute.__doc__
+    wrapper.__wrapped__ = compute
+    return wrapper
@@ -1,10 +1,23 @@
 from abc import ABC, abstractmethod
+from typing import Optional, Tuple
 
 from pandas import DataFrame
 import plotly.graph_objects as go
 
+from indicator.cache import cached_compute
+
 
 class IndicatorAbstract(ABC):
+    # Columns read by compute besides self.col, they identify the input of the indicator in the indicator cache.
+    # None, the default, for the indicators which must not be cached: an indicator is cached only once it declares
+    # every column it reads.
+    extra_cols: Optional[Tuple[str, ...]] = None
+
+    def __init_subclass__(cls, **kwargs) -> None:
+        super().__init_subclass__(**kwargs)
+        if 'compute' in cls.__dict__:
+            cls.compute = cached_compute(cls.__dict__['compute'])
+
     def __init__(self, data: DataFrame, col: str = 'close'):
         self.data = data
         self.col = col
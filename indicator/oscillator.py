@@ -4,10 +4,12 @@ import numpy as np
 import pandas as pd
 
 from indicator.indicator import IndicatorAbstract
-from utils.utils import compute_average
+from utils.utils import compute_average, compute_wilder_smoothing
 
 
 class Atr(IndicatorAbstract):
+    extra_cols = ('high', 'low', 'close')
+
     def compute(self, span: int = 14, avg_type='ma') -> Tuple[np.ndarray, np.ndarray]:
         tr = pd.DataFrame()
         tr['HL'] = self.data['high'] - self.data['low']
@@ -34,6 +36,8 @@ class Atr(IndicatorAbstract):
 
 
 class Macd(IndicatorAbstract):
+    extra_cols = ()
+
     def compute(self, span_fast: int = 12, span_slow: int = 26, span_signal: int = 9) -> Tuple[np.ndarray,
                                                                                                np.ndarray, np.ndarray]:
         ewm_fast = self.data[self.col].ewm(span=span_fast, min_periods=span_fast).mean()
@@ -79,24 +83,14 @@ class Macd(IndicatorAbstract):
 
 
 class Rsi(IndicatorAbstract):
+    extra_cols = ()
+
     def compute(self, span=14) -> np.ndarray:
         delta = self.data[self.col] - self.data[self.col].shift(1)
         delta_pos = np.where(delta >= 0, delta, 0)
         delta_neg = np.where(delta < 0, abs(delta), 0)
-        avg_gain = list()
-        avg_loss = list()
-        for i in range(len(self.data)):
-            if i < span:
-                avg_gain.append(np.NaN)
-                avg_loss.append(np.NaN)
-            elif i == span:
-                avg_gain.append(np.mean(delta_pos[:span]))
-                avg_loss.append(np.mean(delta_neg[:span]))
-            else:
-                avg_gain.append(((span - 1) * avg_gain[-1] + delta_pos[i]) / span)
-                avg_loss.append(((span - 1) * avg_loss[-1] + delta_neg[i]) / span)
-        avg_gain = np.array(avg_gain)
-        avg_loss = np.array(avg_loss)
+        avg_gain = compute_wilder_smoothing(delta_pos, span, span, np.mean(delta_pos[:span]))
+        avg_loss = compute_wilder_smoothing(delta_neg, span, span, np.mean(delta_neg[:span]))
 
         # if avg_loss is null rsi must be equal to 100
         avg_loss = np.where(avg_loss == 0, 1e-10, avg_loss)
@@ -138,6 +132,8 @@ class Rsi(IndicatorAbstract):
 
 
 class Stochastic(IndicatorAbstract):
+    extra_cols = ('high', 'low', 'close')
+
     def compute(self, span_fast=14, span_slow=3, slow=False) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
         low = self.data['low'].rolling(span_fast, min_periods=span_fast).min()
         high = self.data['high'].rolling(span_fast, min_periods=span_fast).max()
@@ -197,6 +193,8 @@ class Stochastic(IndicatorAbstract):
 
 
 class Obv(IndicatorAbstract):
+    extra_cols = ('tickqty',)
+
     def compute(self) -> np.ndarray:
         change = self.data[self.col].pct_change()
         direction_plus = np.where(change > 0, 1, 0)
@@ -226,10 +224,12 @@ class Obv(IndicatorAbstract):
 
 
 class AwesomeOscillator(IndicatorAbstract):
+    extra_cols = ('high', 'low')
+
     def compute(self, span_fast: int = 5, span_slow: int = 34) -> np.ndarray:
-        self.data['median'] = (self.data['high'] + self.data['low']) / 2
-        sma_fast = self.data['median'].rolling(span_fast, min_periods=span_fast).mean()
-        sma_slow = self.data['median'].rolling(span_slow, min_periods=span_slow).mean()
+        median = (self.data['high'] + self.data['low']) / 2
+        sma_fast = median.rolling(span_fast, min_periods=span_fast).mean()
+        sma_slow = median.rolling(span_slow, min_periods=span_slow).mean()
         self.result = sma_fast - sma_slow
         return self.result.values
 
@@ -247,6 +247,8 @@ class AwesomeOscillator(IndicatorAbstract):
 
 
 class Outstreched(IndicatorAbstract):
+    extra_cols = ()
+
     def compute(self, momentum_span: int = 3, ma_span: int = 5) -> np.ndarray:
         col_and_shift_col = pd.concat([self.data[self.col], self.data[self.col].shift(momentum_span)], axis=1)
         col_and_shift_col.columns = ['col', 'shift_col']
@@ -1,19 +1,37 @@
-from typing import Union, Dict
+from typing import Union, Dict, Optional
 
 import numpy as np
+import pandas as pd
 import plotly.graph_objects as go
 
 from indicator.indicator import IndicatorAbstract
+from indicator.trade import TradeLedger
 from utils.utils import AnnualGranularity
 
 
+class ReturnsContext(object):
+    """
+    Series derived from an equity column which are needed by several performance and risk indicators, computed once
+    and shared by them:
+    - returns: percentage change of the equity from one candle to the next
+    - cum_return: cumulated product of 1 + returns
+    - cum_roll_max: running max of cum_return
+    - max_drawdown: largest drop of cum_return from cum_roll_max, as a fraction of cum_roll_max
+    """
+    def __init__(self, equity: pd.Series) -> None:
+        self.returns = equity.pct_change()
+        self.cum_return = (1 + self.returns).cumprod()
+        self.cum_roll_max = self.cum_return.cummax()
+        self.max_drawdown = ((self.cum_roll_max - self.cum_return) / self.cum_roll_max).max()
+
+
 class CAGR(IndicatorAbstract):
-    def compute(self, annual_granularity: int = AnnualGranularity.D_1.value) -> float:
+    def compute(self, annual_granularity: int = AnnualGranularity.D_1.value,
+                context: Optional[ReturnsContext] = None) -> float:
         # Be careful only for daily data
-        daily_return = self.data[self.col].pct_change()
-        cum_return = (1 + daily_return).cumprod()
-        n = len(daily_return) / annual_granularity
-        self.result = round((cum_return.values[-1])**(1/n) - 1, 2)
+        context = ReturnsContext(self.data[self.col]) if context is None else context
+        n = len(context.returns) / annual_granularity
+        self.result = round((context.cum_return.values[-1])**(1/n) - 1, 2)
         return self.result
 
     def plot(self, fig) -> go.Figure:
@@ -21,53 +39,19 @@ class CAGR(IndicatorAbstract):
 
 
 class Expectancy(IndicatorAbstract):
-    def compute(self, trade_size) -> Dict[str, Union[int, float]]:
-        wins, losses = list(), list()
-        idx_wins_sell, idx_losses_sell, idx_wins_buy, idx_losses_buy = list(), list(), list(), list()
-        init_action_price = None
-        is_buying = False
-        is_selling = False
-        prev_candle = None
-        idx_init = None
-        for candle in self.data.itertuples():
-            if not is_buying and not is_selling:
-                if candle.action == 1:
-                    is_buying = True
-                    init_action_price = candle.action_price
-                    idx_init = candle.Index
-                elif candle.action == -1:
-                    is_selling = True
-                    init_action_price = candle.action_price
-                    idx_init = candle.Index
-            elif is_buying:
-                if candle.action in (0, -1):
-                    is_buying = False
-                    if init_action_price < prev_candle.action_price:
-                        wins.append(prev_candle.action_price - init_action_price)
-                        idx_wins_buy.append(idx_init)
-                    else:
-                        losses.append(init_action_price - prev_candle.action_price)
-                        idx_losses_buy.append(idx_init)
-                if candle.action == -1:
-                    is_selling = True
-                    init_action_price = candle.action_price
-                    idx_init = candle.Index
-            elif is_selling:
-                if candle.action in (0, 1):
-                    is_selling = False
-                    if init_action_price > prev_candle.action_price:
-                        wins.append(init_action_price - prev_candle.action_price)
-                        idx_wins_sell.append(idx_init)
-                    else:
-                        losses.append(prev_candle.action_price - init_action_price)
-                        idx_losses_sell.append(idx_init)
-                if candle.action == 1:
-                    is_buying = True
-                    init_action_price = candle.action_price
-                    idx_init = candle.Index
-            prev_candle = candle
+    def compute(self, trade_size, ledger: Optional[TradeLedger] = None) -> Dict[str, Union[int, float]]:
+        ledger = TradeLedger.from_result(self.data) if ledger is None else ledger
+        pnl = ledger.pnl
+        is_win = pnl > 0
+        is_buy = ledger.side == 1
+        wins = pnl[is_win]
+        losses = -pnl[~is_win]
+        idx_wins_buy = ledger.entry_idx[is_win & is_buy].tolist()
+        idx_wins_sell = ledger.entry_idx[is_win & ~is_buy].tolist()
+        idx_losses_buy = ledger.entry_idx[~is_win & is_buy].tolist()
+        idx_losses_sell = ledger.entry_idx[~is_win & ~is_buy].tolist()
 
-        nb_trades = len(wins + losses)
+        nb_trades = len(ledger)
         prct_winning = len(wins) / nb_trades
         expectancy = np.mean(wins) * prct_winning - np.mean(losses) * (1 - prct_winning)
         profit_factor = float(np.sum(wins) / np.sum(losses))
@@ -1,17 +1,20 @@
-from typing import Dict
+from typing import Any, Dict, Optional
 
 import plotly.graph_objects as go
 import numpy as np
+import pandas as pd
 
 from indicator.indicator import IndicatorAbstract
-from indicator.performance import CAGR
+from indicator.performance import CAGR, Expectancy, ReturnsContext
+from indicator.trade import TradeLedger
 from utils.utils import AnnualGranularity
 
 
 class Volatility(IndicatorAbstract):
-    def compute(self, annual_granularity: int = AnnualGranularity.D_1.value) -> float:
-        daily_return = self.data[self.col].pct_change()
-        self.result = round(daily_return.std() * np.sqrt(annual_granularity), 2)
+    def compute(self, annual_granularity: int = AnnualGranularity.D_1.value,
+                context: Optional[ReturnsContext] = None) -> float:
+        context = ReturnsContext(self.data[self.col]) if context is None else context
+        self.result = round(context.returns.std() * np.sqrt(annual_granularity), 2)
         return self.result
 
     def plot(self, fig) -> go.Figure:
@@ -19,12 +22,14 @@ class Volatility(IndicatorAbstract):
 
 
 class SharpeRatio(IndicatorAbstract):
-    def compute(self,annual_granularity: int = AnnualGranularity.D_1.value,  risk_free_cagr: float = 0.005) -> float:
+    def compute(self, annual_granularity: int = AnnualGranularity.D_1.value, risk_free_cagr: float = 0.005,
+                context: Optional[ReturnsContext] = None) -> float:
+        context = ReturnsContext(self.data[self.col]) if context is None else context
         cagr = CAGR(self.data, self.col)
-        cagr.compute(annual_granularity)
+        cagr.compute(annual_granularity, context)
 
         vol = Volatility(self.data, self.col)
-        vol.compute(annual_granularity)
+        vol.compute(annual_granularity, context)
         self.result = round((cagr.result - risk_free_cagr) / vol.result, 2)
         return self.result
 
@@ -33,13 +38,9 @@ class SharpeRatio(IndicatorAbstract):
 
 
 class MaxDrawDown(IndicatorAbstract):
-    def compute(self) -> float:
-        ret = self.data[self.col].pct_change()
-        cum_return = (1 + ret).cumprod()
-        cum_roll_max = cum_return.cummax()
-        drawdown = cum_roll_max - cum_return
-        drawdown_pct = drawdown / cum_roll_max
-        self.result = drawdown_pct.max()
+    def compute(self, context: Optional[ReturnsContext] = None) -> float:
+        context = ReturnsContext(self.data[self.col]) if context is None else context
+        self.result = context.max_drawdown
         return self.result
 
     def plot(self, fig) -> go.Figure:
@@ -47,14 +48,14 @@ class MaxDrawDown(IndicatorAbstract):
 
 
 class Calmar(IndicatorAbstract):
-    def compute(self, annual_granularity: int = AnnualGranularity.D_1.value) -> float:
-        cagr = CAGR(self.data)
-        cagr.compute(annual_granularity)
-
-        mdd = MaxDrawDown(self.data)
-        mdd.compute()
-
-        self.result = round(cagr.result / mdd.result, 2)
+    def compute(self, annual_granularity: int = AnnualGranularity.D_1.value,
+                context: Optional[ReturnsContext] = None) -> float:
+        context = ReturnsContext(self.data[self.col]) if context is None else context
+        cagr = CAGR(self.data, self.col)
+        cagr.compute(annual_granularity, context)
+        max_drawdown = MaxDrawDown(self.data, self.col)
+        max_drawdown.compute(context)
+        self.result = round(cagr.result / max_drawdown.result, 2)
         return self.result
 
     def plot(self, fig) -> go.Figure:
@@ -62,43 +63,9 @@ class Calmar(IndicatorAbstract):
 
 
 class RiskRewardRatio(IndicatorAbstract):
-    def compute(self) -> Dict[str, float]:
-        ratio_risk_reward_list = list()
-        nb_trades = 0
-        is_buying = False
-        is_selling = False
-        for candle in self.data.itertuples():
-            if not is_buying and not is_selling:
-                if candle.action == 1:
-                    is_buying = True
-                    risk = candle.action_price - candle.stop_loss
-                    reward = candle.take_profit - candle.action_price
-                    ratio_risk_reward_list.append(round(reward / risk, 1))
-                elif candle.action == -1:
-                    is_selling = True
-                    risk = candle.stop_loss - candle.action_price
-                    reward = candle.action_price - candle.take_profit
-                    ratio_risk_reward_list.append(round(reward / risk, 1))
-            elif is_buying:
-                if candle.action in (0, -1):
-                    is_buying = False
-                    nb_trades += 1
-                if candle.action == -1:
-                    is_selling = True
-                    risk = candle.stop_loss - candle.action_price
-                    reward = candle.action_price - candle.take_profit
-                    ratio_risk_reward_list.append(round(reward / risk, 1))
-            elif is_selling:
-                if candle.action in (0, 1):
-                    is_selling = False
-                    nb_trades += 1
-                if candle.action == 1:
-                    is_buying = True
-                    risk = candle.action_price - candle.stop_loss
-                    reward = candle.take_profit - candle.action_price
-                    ratio_risk_reward_list.append(round(reward / risk, 1))
-
-        ratio_risk_reward_list = ratio_risk_reward_list[:nb_trades]
+    def compute(self, ledger: Optional[TradeLedger] = None) -> Dict[str, float]:
+        ledger = TradeLedger.from_result(self.data) if ledger is None else ledger
+        ratio_risk_reward_list = [round(x, 1) for x in ledger.risk_reward]
         ratio_risk_reward = round(float(np.mean(ratio_risk_reward_list)), 2)
         breakeven = round(100 / (1 + ratio_risk_reward), 1)
         self.result = {
@@ -110,3 +77,36 @@ class RiskRewardRatio(IndicatorAbstract):
 
     def plot(self, fig) -> go.Figure:
         pass
+
+
+def compute_all(data: pd.DataFrame, col: str = 'return_cumsum', annual_granularity: int = AnnualGranularity.D_1.value,
+                risk_free_cagr: float = 0.005, trade_size: Optional[float] = None) -> Dict[str, Any]:
+    """
+    :param data: data with an equity column, and the trades of a strategy if trade_size is set
+    :param col: the equity column
+    :param annual_granularity: number of candles in a year
+    :param risk_free_cagr: CAGR of a risk free investment, for the Sharpe ratio
+    :param trade_size: size of the trades, if set the indicators of RiskRewardRatio and Expectancy are computed from
+    the trades of data (see TradeLedger.from_result)
+    :return: CAGR, Volatility, SharpeRatio, MaxDrawDown and Calmar, all computed from the same returns, followed by
+    the indicators of RiskRewardRatio and Expectancy, computed from the same trade ledger
+    """
+    context = ReturnsContext(data[col])
+    result = dict()
+    for ind, params in [(CAGR, {'annual_granularity': annual_granularity}),
+                        (Volatility, {'annual_granularity': annual_granularity}),
+                        (SharpeRatio, {'annual_granularity': annual_granularity, 'risk_free_cagr': risk_free_cagr}),
+                        (MaxDrawDown, {}),
+                        (Calmar, {'annual_granularity': annual_granularity})]:
+        instance = ind(data, col)
+        instance.compute(context=context, **params)
+        result[instance.__class__.__name__] = instance.result
+
+    if trade_size is not None:
+        ledger = TradeLedger.from_result(data)
+        for ind, params in [(RiskRewardRatio, {}),
+                            (Expectancy, {'trade_size': trade_size})]:
+            instance = ind(data)
+            instance.compute(ledger=ledger, **params)
+            result.update(instance.result)
+    return result
@@ -0,0 +1,266 @@
+from abc import ABC, abstractmethod
+from collections import deque
+from typing import Any, Mapping, Optional, Tuple
+
+import numpy as np
+
+
+class RollingStats(object):
+    """
+    Mean and sample standard deviation of the last span values, updated with the Welford add / remove formulas. As
+    the removals accumulate rounding errors, the stats are recomputed from the window every span updates, which keeps
+    a constant amortized cost. NaN values are not counted, the stats are NaN until min_periods values are counted.
+    """
+    def __init__(self, span: int, min_periods: Optional[int] = None) -> None:
+        self.span = span
+        self.min_periods = span if min_periods is None else min_periods
+        self.window = deque(maxlen=span)
+        self.nb_valid = 0
+        self._mean = 0.
+        self._m2 = 0.
+        self._nb_updates = 0
+
+    def _add(self, x: float) -> None:
+        self.nb_valid += 1
+        delta = x - self._mean
+        self._mean += delta / self.nb_valid
+        self._m2 += delta * (x - self._mean)
+
+    def _remove(self, x: float) -> None:
+        self.nb_valid -= 1
+        if self.nb_valid == 0:
+            self._mean, self._m2 = 0., 0.
+            return
+        delta = x - self._mean
+        self._mean -= delta / self.nb_valid
+        self._m2 -= delta * (x - self._mean)
+
+    def _resync(self) -> None:
+        values = [x for x in self.window if x == x]
+        self.nb_valid = len(values)
+        self._mean = sum(values) / len(values) if values else 0.
+        self._m2 = sum([(x - self._mean) ** 2 for x in values])
+
+    def update(self, x: float) -> None:
+        if len(self.window) == self.span and not self.window[0] != self.window[0]:
+            self._remove(self.window[0])
+        self.window.append(x)
+        if x == x:
+            self._add(x)
+        self._nb_updates += 1
+        if self._nb_updates % self.span == 0:
+            self._resync()
+
+    @property
+    def mean(self) -> float:
+        return self._mean if self.nb_valid >= self.min_periods and self.nb_valid > 0 else np.NaN
+
+    @property
+    def std(self) -> float:
+        if self.nb_valid < max(self.min_periods, 2):
+            return np.NaN
+        return np.sqrt(max(self._m2, 0.) / (self.nb_valid - 1))
+
+
+class RollingExtremum(object):
+    """
+    Min or max of the last span values with a monotonic deque, NaN until there are span values in the window
+    """
+    def __init__(self, span: int, is_max: bool) -> None:
+        self.span = span
+        self.is_max = is_max
+        self.candidates = deque()
+        self.nb_values = 0
+        self.nan_idx = deque()
+
+    def update(self, x: float) -> None:
+        idx = self.nb_values
+        self.nb_values += 1
+        while self.candidates and self.candidates[0][0] <= idx - self.span:
+            self.candidates.popleft()
+        while self.nan_idx and self.nan_idx[0] <= idx - self.span:
+            self.nan_idx.popleft()
+        if x != x:
+            self.nan_idx.append(idx)
+            return
+        while self.candidates and (self.candidates[-1][1] <= x if self.is_max else self.candidates[-1][1] >= x):
+            self.candidates.pop()
+        self.candidates.append((idx, x))
+
+    @property
+    def value(self) -> float:
+        if self.nb_values < self.span or self.nan_idx or not self.candidates:
+            return np.NaN
+        return self.candidates[0][1]
+
+
+class ExponentialAverage(object):
+    """
+    Same values as pandas ewm(...).mean() given one value at a time, with adjust=True as pandas by default or with
+    adjust=False
+    """
+    def __init__(self, alpha: float, min_periods: int = 0, adjust: bool = True) -> None:
+        self.alpha = alpha
+        self.min_periods = min_periods
+        self.adjust = adjust
+        self.nb_valid = 0
+        self._num = 0.
+        self._den = 0.
+        self._avg = np.NaN
+
+    def update(self, x: float) -> None:
+        if self.adjust:
+            self._num *= 1 - self.alpha
+            self._den *= 1 - self.alpha
+            if x == x:
+                self._num += x
+                self._den += 1
+                self.nb_valid += 1
+            if self._den > 0:
+                self._avg = self._num / self._den
+        elif x == x:
+            self._avg = x if self.nb_valid == 0 else (1 - self.alpha) * self._avg + self.alpha * x
+            self.nb_valid += 1
+
+    @property
+    def value(self) -> float:
+        return self._avg if self.nb_valid >= max(self.min_periods, 1) else np.NaN
+
+
+class StreamingIndicatorAbstract(ABC):
+    """
+    Indicator updated one candle at a time with a state of constant size. After update(candle), value is the value
+    the batch indicator gives for this candle.
+    """
+    def __init__(self, col: str = 'close') -> None:
+        self.col = col
+        self.value = None
+
+    @abstractmethod
+    def update(self, candle: Mapping[str, Any]) -> Any:
+        pass
+
+
+class StreamingExponentialMovingAverage(StreamingIndicatorAbstract):
+    def __init__(self, span: int = 20, col: str = 'close') -> None:
+        super().__init__(col)
+        self.ema = ExponentialAverage(2 / (span + 1), min_periods=span)
+        self.value = np.NaN
+
+    def update(self, candle: Mapping[str, Any]) -> float:
+        self.ema.update(candle[self.col])
+        self.value = self.ema.value
+        return self.value
+
+
+class StreamingRsi(StreamingIndicatorAbstract):
+    """
+    Rsi given one candle at a time: the first average gain and loss are the means of the span first price changes
+    (the first one being null), they are then smoothed with the Wilder recursion
+    """
+    def __init__(self, span: int = 14, col: str = 'close') -> None:
+        super().__init__(col)
+        self.span = span
+        self.nb_values = 0
+        self.prev_value = np.NaN
+        self.avg_gain = 0.
+        self.avg_loss = 0.
+        self.value = np.NaN
+
+    def update(self, candle: Mapping[str, Any]) -> float:
+        x = candle[self.col]
+        delta = x - self.prev_value
+        gain = delta if delta >= 0 else 0.
+        loss = -delta if delta < 0 else 0.
+        self.prev_value = x
+
+        if self.nb_values < self.span:
+            self.avg_gain += gain / self.span
+            self.avg_loss += loss / self.span
+            self.nb_values += 1
+            return self.value
+
+        if self.nb_values > self.span:
+            self.avg_gain = ((self.span - 1) * self.avg_gain + gain) / self.span
+            self.avg_loss = ((self.span - 1) * self.avg_loss + loss) / self.span
+        self.nb_values += 1
+
+        # if avg_loss is null rsi must be equal to 100
+        avg_loss = self.avg_loss if self.avg_loss != 0 else 1e-10
+        self.value = 100 - 100 / (1 + self.avg_gain / avg_loss)
+        return self.value
+
+
+class StreamingAtr(StreamingIndicatorAbstract):
+    """
+    Atr given one candle at a time, value is the average true range and the true range
+    """
+    def __init__(self, span: int = 14, avg_type: str = 'ma', col: str = 'close') -> None:
+        super().__init__(col)
+        if avg_type == 'ma':
+            self.avg = RollingStats(span)
+        elif avg_type == 'ewm':
+            self.avg = ExponentialAverage(2 / (span + 1), min_periods=span)
+        elif avg_type == 'wws':
+            self.avg = ExponentialAverage(1 / span, min_periods=span, adjust=False)
+        else:
+            raise ValueError(f"Unknown average type {avg_type}")
+        self.prev_close = np.NaN
+        self.value = (np.NaN, np.NaN)
+
+    def update(self, candle: Mapping[str, Any]) -> Tuple[float, float]:
+        high, low = candle['high'], candle['low']
+        tr = high - low
+        if self.prev_close == self.prev_close:
+            tr = max(tr, abs(high - self.prev_close), abs(low - self.prev_close))
+        self.prev_close = candle['close']
+        self.avg.update(tr)
+        self.value = (self.avg.mean if isinstance(self.avg, RollingStats) else self.avg.value, tr)
+        return self.value
+
+
+class StreamingBollingerBands(StreamingIndicatorAbstract):
+    def __init__(self, span: int = 20, nb_std: int = 2, col: str = 'close') -> None:
+        super().__init__(col)
+        self.nb_std = nb_std
+        self.stats = RollingStats(span)
+        self.value = (np.NaN, np.NaN, np.NaN)
+
+    def update(self, candle: Mapping[str, Any]) -> Tuple[float, float, float]:
+        self.stats.update(candle[self.col])
+        ma, std = self.stats.mean, self.stats.std
+        self.value = (ma, ma + self.nb_std * std, ma - self.nb_std * std)
+        return self.value
+
+
+class StreamingStochastic(StreamingIndicatorAbstract):
+    """
+    Stochastic given one candle at a time, value is the stochastic, its moving average and their difference
+    """
+    def __init__(self, span_fast: int = 14, span_slow: int = 3, slow: bool = False, col: str = 'close') -> None:
+        super().__init__(col)
+        self.slow = slow
+        self.low = RollingExtremum(span_fast, is_max=False)
+        self.high = RollingExtremum(span_fast, is_max=True)
+        self.stoch_ma = RollingStats(span_slow)
+        self.stoch_ma_slow = RollingStats(span_slow) if slow else None
+        self.value = (np.NaN, np.NaN, np.NaN)
+
+    def update(self, candle: Mapping[str, Any]) -> Tuple[float, float, float]:
+        self.low.update(candle['low'])
+        self.high.update(candle['high'])
+        low, high = self.low.value, self.high.value
+        num, den = 100 * (candle['close'] - low), high - low
+        if den != 0:
+            stoch = num / den
+        else:
+            # division by zero as in numpy, the market being flat over span_fast candles
+            stoch = np.NaN if num == 0 or num != num else np.copysign(np.inf, num)
+        self.stoch_ma.update(stoch)
+        stoch_ma = self.stoch_ma.mean
+        if self.slow:
+            stoch = stoch_ma
+            self.stoch_ma_slow.update(stoch)
+            stoch_ma = self.stoch_ma_slow.mean
+        self.value = (stoch, stoch_ma, stoch - stoch_ma)
+        return self.value
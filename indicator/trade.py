@@ -0,0 +1,58 @@
+import numpy as np
+import pandas as pd
+
+
+class TradeLedger(object):
+    """
+    Closed trades of a strategy result, stored as one array per field. A trade is a run of consecutive candles with
+    the same non null action, a trade still open on the last candle is not in the ledger.
+    - entry_idx / exit_idx: index labels of the first and the last candle of the trade
+    - side: 1 for a buy, -1 for a sell
+    - entry_price / exit_price: action price of the first and the last candle of the trade
+    - stop_loss / take_profit: values set when the trade is taken
+    """
+    def __init__(self, entry_idx: np.ndarray, exit_idx: np.ndarray, side: np.ndarray, entry_price: np.ndarray,
+                 exit_price: np.ndarray, stop_loss: np.ndarray, take_profit: np.ndarray) -> None:
+        self.entry_idx = entry_idx
+        self.exit_idx = exit_idx
+        self.side = side
+        self.entry_price = entry_price
+        self.exit_price = exit_price
+        self.stop_loss = stop_loss
+        self.take_profit = take_profit
+
+    @classmethod
+    def from_result(cls, data: pd.DataFrame) -> 'TradeLedger':
+        """
+        :param data: strategy result with the columns action, action_price, stop_loss and take_profit
+        """
+        action = data['action'].to_numpy()
+        nb_candles = len(action)
+        run_starts = np.flatnonzero(np.diff(action) != 0) + 1
+        starts = np.concatenate([[0], run_starts]).astype(int)
+        ends = np.concatenate([run_starts - 1, [nb_candles - 1]]).astype(int)
+        is_trade = (action[starts] != 0) & (ends < nb_candles - 1) if nb_candles else np.array([], dtype=bool)
+        starts, ends = starts[is_trade], ends[is_trade]
+
+        action_price = data['action_price'].to_numpy(dtype=float)
+        return cls(entry_idx=data.index.values[starts],
+                   exit_idx=data.index.values[ends],
+                   side=action[starts].astype(int),
+                   entry_price=action_price[starts],
+                   exit_price=action_price[ends],
+                   stop_loss=data['stop_loss'].to_numpy(dtype=float)[starts],
+                   take_profit=data['take_profit'].to_numpy(dtype=float)[starts])
+
+    def __len__(self) -> int:
+        return len(self.side)
+
+    @property
+    def pnl(self) -> np.ndarray:
+        # price difference won by each trade, negative or null for a losing trade
+        return np.where(self.side == 1, self.exit_price - self.entry_price, self.entry_price - self.exit_price)
+
+    @property
+    def risk_reward(self) -> np.ndarray:
+        risk = np.where(self.side == 1, self.entry_price - self.stop_loss, self.stop_loss - self.entry_price)
+        reward = np.where(self.side == 1, self.take_profit - self.entry_price, self.entry_price - self.take_profit)
+        return reward / risk
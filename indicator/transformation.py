@@ -6,6 +6,8 @@ from indicator.indicator import IndicatorAbstract
 
 
 class Fisher(IndicatorAbstract):
+    extra_cols = ()
+
     def compute(self, span: int = 55) -> Tuple[np.ndarray, np.ndarray]:
         min_col = self.data[self.col].rolling(span, min_periods=span).min()
         max_col = self.data[self.col].rolling(span, min_periods=span).max()
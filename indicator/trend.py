@@ -1,13 +1,15 @@
 from typing import Tuple
 import plotly.graph_objects as go
 import numpy as np
-from sklearn.linear_model import LinearRegression
 
 from indicator.indicator import IndicatorAbstract
 from indicator.oscillator import Atr
+from utils.utils import compute_wilder_smoothing, compute_rolling_slope
 
 
 class MovingAverage(IndicatorAbstract):
+    extra_cols = ()
+
     def compute(self, span: int = 20) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
         ma = self.data[self.col].rolling(span, min_periods=span).mean()
         self.result = ma.values
@@ -29,6 +31,8 @@ class MovingAverage(IndicatorAbstract):
 
 
 class ExponentialMovingAverage(IndicatorAbstract):
+    extra_cols = ()
+
     def compute(self, span: int = 20) -> np.ndarray:
         ema = self.data[self.col].ewm(span=span, min_periods=span).mean()
         self.result = ema.values
@@ -49,12 +53,28 @@ class ExponentialMovingAverage(IndicatorAbstract):
         return fig
 
 
+def compute_weighted_moving_average(values: np.ndarray, span: int) -> np.ndarray:
+    """
+    :param values: values to average
+    :param span: number of values of each window, the last one having a weight of span and the first one of 1
+    :return: the weighted moving average of each window given at its last index, NaN when the window is not full or
+    contains a NaN
+    """
+    values = np.asarray(values, dtype=float)
+    wma = np.full(len(values), np.NaN)
+    if len(values) < span:
+        return wma
+    weights = np.arange(1, span + 1)
+    # convolution flips the kernel, so the weights are given in reverse order
+    wma[span - 1:] = np.convolve(values, weights[::-1], mode='valid') / weights.sum()
+    return wma
+
+
 class WeightedMovingAverage(IndicatorAbstract):
+    extra_cols = ()
+
     def compute(self, span: int = 20) -> np.ndarray:
-        weights = np.arange(1, span + 1)
-        weights_sum = weights.sum()
-        wma = self.data[self.col].rolling(window=span).apply(lambda x: (x * weights).sum() / weights_sum, raw=True)
-        self.result = wma.values
+        self.result = compute_weighted_moving_average(self.data[self.col].values, span)
         return self.result
 
     def plot(self, fig: go.Figure, name: str, color: str = 'rgba(46, 134, 193, 0.5)') -> go.Figure:
@@ -73,13 +93,13 @@ class WeightedMovingAverage(IndicatorAbstract):
 
 
 class HullMovingAverage(IndicatorAbstract):
+    extra_cols = ()
+
     def compute(self, span: int = 20) -> np.ndarray:
-        wma = WeightedMovingAverage(self.data, col=self.col)
-        self.data['wma_span1'] = wma.compute(span)
-        self.data['wma_span2'] = wma.compute(span // 2)
-        self.data['diff_wma'] = self.data['wma_span2'] * 2 - self.data['wma_span1']
-        wma_sqrt = WeightedMovingAverage(self.data, col='diff_wma')
-        wma = wma_sqrt.compute(int(np.sqrt(span)))
+        values = self.data[self.col].values
+        diff_wma = 2 * compute_weighted_moving_average(values, span // 2) - \
+            compute_weighted_moving_average(values, span)
+        wma = compute_weighted_moving_average(diff_wma, int(np.sqrt(span)))
         self.result = wma
         return self.result
 
@@ -98,6 +118,8 @@ class HullMovingAverage(IndicatorAbstract):
         return fig
 
 class BollingerBands(IndicatorAbstract):
+    extra_cols = ()
+
     def compute(self, span: int = 20, nb_std: int = 2) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
         ma = self.data[self.col].rolling(span, min_periods=span).mean()
         bb_up = ma + nb_std * self.data[self.col].rolling(span, min_periods=span).std()
@@ -141,6 +163,8 @@ class BollingerBands(IndicatorAbstract):
 
 
 class Adx(IndicatorAbstract):
+    extra_cols = ('high', 'low', 'close')
+
     def compute(self, span=14) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
         # compute true range
         atr = Atr(self.data, self.col)
@@ -158,25 +182,11 @@ class Adx(IndicatorAbstract):
         dm_minus = np.where(dm_minus > 0, dm_minus, 0)
 
         # compute smoothed values
-        tr_max_n = list()
-        dm_plus_n = list()
-        dm_minus_n = list()
-        for i in range(len(self.data)):
-            if i < span:
-                tr_max_n.append(np.NaN)
-                dm_plus_n.append(np.NaN)
-                dm_minus_n.append(np.NaN)
-            elif i == span:
-                tr_max_n.append(np.sum(tr_max[1: span + 1]))
-                dm_plus_n.append(np.sum(dm_plus[1: span + 1]))
-                dm_minus_n.append(np.sum(dm_minus[1: span + 1]))
-            else:
-                tr_max_n.append(tr_max_n[-1] - (tr_max_n[-1] / span) + tr_max[i])
-                dm_plus_n.append(dm_plus_n[-1] - (dm_plus_n[-1] / span) + dm_plus[i])
-                dm_minus_n.append(dm_minus_n[-1] - (dm_minus_n[-1] / span) + dm_minus[i])
-        tr_max_n = np.array(tr_max_n)
-        dm_plus_n = np.array(dm_plus_n)
-        dm_minus_n = np.array(dm_minus_n)
+        # the sum over span values smoothed with sum[i] = sum[i - 1] - sum[i - 1] / span + value[i] is span times
+        # the Wilder smoothing of the values
+        tr_max_n = span * compute_wilder_smoothing(tr_max, span, span, np.sum(tr_max[1: span + 1]) / span)
+        dm_plus_n = span * compute_wilder_smoothing(dm_plus, span, span, np.sum(dm_plus[1: span + 1]) / span)
+        dm_minus_n = span * compute_wilder_smoothing(dm_minus, span, span, np.sum(dm_minus[1: span + 1]) / span)
 
         # normalisation
         dm_plus_norm = 100 * dm_plus_n / tr_max_n
@@ -185,16 +195,9 @@ class Adx(IndicatorAbstract):
         # compute average directional index
         dx = 100 * (np.abs(dm_plus_norm - dm_minus_norm)) / (dm_plus_norm + dm_minus_norm)
 
-        adx = list()
-        for i in range(len(self.data)):
-            if i < 2 * span - 1:
-                adx.append(np.NaN)
-            elif i == 2 * span - 1:
-                adx.append(np.mean(dx[span: 2 * span]))
-            else:
-                adx.append(((span - 1) * adx[-1] + dx[i]) / span)
+        adx = compute_wilder_smoothing(dx, span, 2 * span - 1, np.mean(dx[span: 2 * span]))
 
-        self.result = (dm_plus_norm, dm_minus_norm, np.array(adx))
+        self.result = (dm_plus_norm, dm_minus_norm, adx)
         return self.result
 
     def plot(self, fig: go.Figure) -> go.Figure:
@@ -234,22 +237,12 @@ class Adx(IndicatorAbstract):
 
 
 class Slope(IndicatorAbstract):
+    extra_cols = ()
+
     def compute(self, span: int = 5) -> np.ndarray:
-        data = self.data[self.col].reset_index(drop=True)
-        slopes = [0] * (span - 1)
-        for i in range(span - 1, len(data)):
-            y = data.loc[i - span + 1: i]
-            x = np.arange(span).reshape((span, 1))
-            y_scaled = (y - y.min()) / (y.max() - y.min())
-            if len(y_scaled[y_scaled.isnull()]):
-                slopes.append(np.NaN)
-                continue
-            x_scaled = (x - x.min()) / (x.max() - x.min())
-            lr = LinearRegression()
-            lr.fit(x_scaled, y_scaled)
-            slopes.append(lr.coef_[0])
-
-        self.result = np.array([np.rad2deg(np.arctan(s)) for s in slopes])
+        slopes = compute_rolling_slope(self.data[self.col], span)
+        slopes[:span - 1] = 0
+        self.result = slopes
         return self.result
 
     def plot(self, fig: go.Figure) -> go.Figure:
@@ -269,6 +262,8 @@ class Slope(IndicatorAbstract):
 
 
 class Renko(IndicatorAbstract):
+    extra_cols = ('date',)
+
     def compute(self, box_size: float = 1e-3) -> Tuple[np.ndarray, np.ndarray]:
         data = self.data[self.col].tolist()
         dates = self.data['date'].tolist()
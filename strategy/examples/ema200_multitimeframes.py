@@ -1,8 +1,9 @@
+import numpy as np
 import pandas as pd
 
 from strategy.strategy import StrategyAbstract, StrategyAction
 from indicator.trend import ExponentialMovingAverage
-from utils.utils import decompose_date, compute_slope
+from utils.utils import decompose_date, compute_rolling_slope
 
 
 class Ema200MultiTimeframes(StrategyAbstract):
@@ -31,6 +32,8 @@ class Ema200MultiTimeframes(StrategyAbstract):
 
         self.data.dropna(axis=0, inplace=True)
         self.data.reset_index(drop=True, inplace=True)
+        # slope of the 5 last ema200_1h, 0 when it can not be computed as in compute_slope
+        self.data['slope_ema200_1h'] = np.nan_to_num(compute_rolling_slope(self.data['ema200_1h'], span=5))
 
         self._reinit_data()
         self.stop_loss.data = self.data
@@ -47,7 +50,7 @@ class Ema200MultiTimeframes(StrategyAbstract):
                         and prev_row[0].ema200_1h > prev_row[0].low and prev_row[1].ema200_1h < prev_row[1].high \
                         and prev_row[1].close > prev_row[1].open \
                         and row.high > prev_row[1].high + enter_pips:
-                    slope = compute_slope(self.data, prev_row[1].Index, col='ema200_1h')
+                    slope = prev_row[1].slope_ema200_1h
                     if slope > 10:
                         stop_loss, take_profit = self.stop_loss.compute(row.Index, row.close, buy_action=True)
                         self._take_buy(row, prev_row[1].high + enter_pips, stop_loss, take_profit)
@@ -58,7 +61,7 @@ class Ema200MultiTimeframes(StrategyAbstract):
                         and prev_row[0].ema200_1h < prev_row[0].high and prev_row[1].ema200_1h > prev_row[1].low \
                         and prev_row[1].close < prev_row[1].open \
                         and row.low < prev_row[1].low - enter_pips:
-                    slope = compute_slope(self.data, prev_row[1].Index, col='ema200_1h')
+                    slope = prev_row[1].slope_ema200_1h
                     if slope < -10:
                         stop_loss, take_profit = self.stop_loss.compute(row.Index, row.close, buy_action=False)
                         self._take_sell(row, prev_row[1].low - enter_pips, stop_loss, take_profit)
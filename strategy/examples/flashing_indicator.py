@@ -1,4 +1,5 @@
 from strategy.strategy import StrategyAbstract
+from strategy.signals import col, crosses_below, crosses_above
 from indicator.trend import BollingerBands
 
 
@@ -12,47 +13,13 @@ class FlashingIndicator(StrategyAbstract):
         self.data.dropna(axis=0, inplace=True)
         self.data.reset_index(drop=True, inplace=True)
 
-        self._reinit_data()
-        self.stop_loss.data = self.data
-
         nb_prev = 3
-        self.prev_rows = nb_prev * [None]
-
-        stop_loss, take_profit = 0, 0
-
-        for row in self.data.itertuples(index=True):
-            if row.Index < max(self.stop_loss.min_rows + 1, nb_prev, correl_span):
-                self._do_nothing(row, 0, 0)
-                self._do_common_processes(row, nb_prev, first_rows=True)
-                continue
-
-            if all([x.pct_col > x.bb_down for x in self.prev_rows]) and row.pct_col < row.bb_down:
-                if not use_correl:
-                    self.buy_signal = True
-                else:
-                    auto_corr_value = self.data.loc[row.Index - correl_span + 1: row.Index, 'close'].autocorr(lag=1)
-                    if auto_corr_value > 0.95:
-                        self.buy_signal = True
-                    else:
-                        self.buy_signal = False
-
-            else:
-                self.buy_signal = False
-
-            if all([x.pct_col < x.bb_up for x in self.prev_rows]) and row.pct_col > row.bb_up:
-                if not use_correl:
-                    self.sell_signal = True
-                else:
-                    auto_corr_value = self.data.loc[row.Index - correl_span + 1: row.Index, 'close'].autocorr(lag=1)
-                    if auto_corr_value > 0.95:
-                        self.sell_signal = True
-                    else:
-                        self.sell_signal = False
-            else:
-                self.sell_signal = False
-
-            stop_loss, take_profit = self.make_decision(row, stop_loss, take_profit)
-            self._do_common_processes(row, nb_prev, first_rows=False)
-
-        self._save_strategy_result()
+        buy_signal = crosses_below('pct_col', 'bb_down', nb_prev)
+        sell_signal = crosses_above('pct_col', 'bb_up', nb_prev)
+        if use_correl:
+            # autocorrelation with lag 1 of the close on the correl_span candles ending at each candle
+            self.data['auto_corr'] = self.data['close'].rolling(correl_span - 1).corr(self.data['close'].shift(1))
+            buy_signal = buy_signal & (col('auto_corr') > 0.95)
+            sell_signal = sell_signal & (col('auto_corr') > 0.95)
+        self.apply_signals(buy_signal, sell_signal, nb_prev, start=correl_span)
 
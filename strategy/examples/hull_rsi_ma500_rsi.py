@@ -1,6 +1,7 @@
 import numpy as np
 
 from strategy.strategy import StrategyAbstract
+from strategy.signals import crosses_below, crosses_above, lag, starting_at, within_k_bars
 from indicator.trend import HullMovingAverage
 from indicator.trend import BollingerBands
 from indicator.oscillator import Rsi
@@ -25,61 +26,15 @@ class HullRSIMA500RSI(StrategyAbstract):
         self.data.dropna(axis=0, inplace=True)
         self.data.reset_index(drop=True, inplace=True)
 
-        self._reinit_data()
-        self.stop_loss.data = self.data
-
         nb_prev = 2
-        self.prev_rows = nb_prev * [None]
-
-        stop_loss, take_profit = 0, 0
-        prev_buy_signal_hull = False
-        prev_sell_signal_hull = False
-        prev_buy_signal_ma = False
-        prev_sell_signal_ma = False
-        buy_signal_hull = False
-        sell_signal_hull = False
-        buy_signal_ma = False
-        sell_signal_ma = False
-        for row in self.data.itertuples(index=True):
-            if row.Index < max(self.stop_loss.min_rows + 1, nb_prev):
-                self._do_nothing(row, 0, 0)
-                self._do_common_processes(row, nb_prev, first_rows=True)
-                continue
-
-            if all([x.hull_rsi > 10 for x in self.prev_rows]) and row.hull_rsi < 10:
-                buy_signal_hull = True
-            else:
-                buy_signal_hull = False
-            if all([x.hull_rsi < 90 for x in self.prev_rows]) and row.hull_rsi > 90:
-                sell_signal_hull = True
-            else:
-                sell_signal_hull = False
-
-            if all([x.rsi > x.ma_rsi_down for x in self.prev_rows]) and row.rsi < row.ma_rsi_down:
-                buy_signal_ma = True
-            else:
-                buy_signal_ma = False
-            if all([x.rsi < x.ma_rsi_up for x in self.prev_rows]) and row.rsi > row.ma_rsi_up:
-                sell_signal_ma = True
-            else:
-                sell_signal_ma = False
-
-            if (buy_signal_hull and buy_signal_ma) or (buy_signal_hull and prev_buy_signal_ma) or (prev_buy_signal_hull and buy_signal_ma):
-                self.buy_signal = True
-            else:
-                self.buy_signal = False
-
-            if (sell_signal_hull and sell_signal_ma) or (sell_signal_hull and prev_sell_signal_ma) or (prev_sell_signal_hull and sell_signal_ma):
-                self.sell_signal = True
-            else:
-                self.sell_signal = False
-
-            stop_loss, take_profit = self.make_decision(row, stop_loss, take_profit, spread)
-            self._do_common_processes(row, nb_prev, first_rows=False)
-            prev_buy_signal_hull = buy_signal_hull
-            prev_sell_signal_hull = sell_signal_hull
-            prev_buy_signal_ma = buy_signal_ma
-            prev_sell_signal_ma = sell_signal_ma
-
-        self._save_strategy_result()
+        start = max(self.stop_loss.min_rows + 1, nb_prev)
+        # signals of the previous row are only taken into account once the signals are computed
+        buy_signal_hull = starting_at(crosses_below('hull_rsi', 10, nb_prev), start)
+        sell_signal_hull = starting_at(crosses_above('hull_rsi', 90, nb_prev), start)
+        buy_signal_ma = starting_at(crosses_below('rsi', 'ma_rsi_down', nb_prev), start)
+        sell_signal_ma = starting_at(crosses_above('rsi', 'ma_rsi_up', nb_prev), start)
+
+        buy_signal = (buy_signal_hull & within_k_bars(buy_signal_ma, 1)) | (buy_signal_ma & lag(buy_signal_hull))
+        sell_signal = (sell_signal_hull & within_k_bars(sell_signal_ma, 1)) | (sell_signal_ma & lag(sell_signal_hull))
+        self.apply_signals(buy_signal, sell_signal, nb_prev, spread)
 
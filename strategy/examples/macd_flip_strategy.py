@@ -1,4 +1,5 @@
 from strategy.strategy import StrategyAbstract
+from strategy.signals import crosses_below, crosses_above
 from indicator.oscillator import Macd
 from indicator.transformation import Fisher
 
@@ -12,32 +13,8 @@ class MACDFlipStrategy(StrategyAbstract):
         self.data.dropna(axis=0, inplace=True)
         self.data.reset_index(drop=True, inplace=True)
 
-        self._reinit_data()
-        self.stop_loss.data = self.data
-
         nb_prev = 5
-        self.prev_rows = nb_prev * [None]
-
-        stop_loss, take_profit = 0, 0
-
-        for row in self.data.itertuples(index=True):
-            if row.Index < max(self.stop_loss.min_rows + 1, nb_prev):
-                self._do_nothing(row, 0, 0)
-                self._do_common_processes(row, nb_prev, first_rows=True)
-                continue
-
-            if all([x.macd_line < 0 for x in self.prev_rows]) and row.macd_line > 0:
-                self.buy_signal = True
-            else:
-                self.buy_signal = False
-
-            if all([x.macd_line > 0 for x in self.prev_rows]) and row.macd_line < 0:
-                self.sell_signal = True
-            else:
-                self.sell_signal = False
-
-            stop_loss, take_profit = self.make_decision(row, stop_loss, take_profit)
-            self._do_common_processes(row, nb_prev, first_rows=False)
-
-        self._save_strategy_result()
+        buy_signal = crosses_above('macd_line', 0, nb_prev)
+        sell_signal = crosses_below('macd_line', 0, nb_prev)
+        self.apply_signals(buy_signal, sell_signal, nb_prev)
 
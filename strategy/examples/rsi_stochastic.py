@@ -1,5 +1,15 @@
+from typing import Any, Dict, Iterable, Mapping, Optional, Tuple
+
 from strategy.strategy import StrategyAbstract
+from strategy.streaming import StreamingStrategyAbstract
 from indicator.oscillator import Stochastic, Rsi
+from indicator.streaming import StreamingStochastic, StreamingRsi
+
+
+def get_signals(row: Any, prev_rows: Iterable[Any]) -> Tuple[bool, bool]:
+    buy_signal = all([x.stoch_ma > 25 for x in prev_rows]) and row.stoch_ma < 25
+    sell_signal = all([x.stoch_ma < 75 for x in prev_rows]) and row.stoch_ma > 75
+    return bool(buy_signal), bool(sell_signal)
 
 
 class RSIStochastic(StrategyAbstract):
@@ -29,17 +39,28 @@ class RSIStochastic(StrategyAbstract):
                 self._do_common_processes(row, nb_prev, first_rows=True)
                 continue
 
-            if all([x.stoch_ma > 25 for x in self.prev_rows]) and row.stoch_ma < 25:
-                self.buy_signal = True
-            else:
-                self.buy_signal = False
-            if all([x.stoch_ma < 75 for x in self.prev_rows]) and row.stoch_ma > 75:
-                self.sell_signal = True
-            else:
-                self.sell_signal = False
+            self.buy_signal, self.sell_signal = get_signals(row, self.prev_rows)
 
             stop_loss, take_profit = self.make_decision(row, stop_loss, take_profit, spread)
             self._do_common_processes(row, nb_prev, first_rows=False)
 
         self._save_strategy_result()
 
+
+class StreamingRSIStochastic(StreamingStrategyAbstract):
+    nb_prev = 2
+
+    def init_indicators(self, span_fast=14, span_slow=3, slow=False, span_rsi=5):
+        self.stoch = StreamingStochastic(span_fast, span_slow, slow)
+        self.rsi = StreamingRsi(span_rsi, col='stoch_ma')
+
+    def update_indicators(self, candle: Mapping[str, Any]) -> Optional[Dict[str, Any]]:
+        row = dict(candle)
+        row['stoch'], row['stoch_ma'], row['stoch_hist'] = self.stoch.update(candle)
+        if any(x != x for x in [row['stoch'], row['stoch_ma'], row['stoch_hist']]):
+            return None
+        row['rsi_stoch'] = self.rsi.update(row)
+        return row
+
+    def get_signals(self, row: Any) -> Tuple[bool, bool]:
+        return get_signals(row, self.prev_rows)
@@ -1,5 +1,15 @@
+from typing import Any, Dict, Iterable, Mapping, Optional, Tuple
+
 from strategy.strategy import StrategyAbstract, StrategyAction
+from strategy.streaming import StreamingStrategyAbstract
 from indicator.oscillator import Rsi
+from indicator.streaming import StreamingRsi
+
+
+def get_signals(row: Any, prev_rows: Iterable[Any]) -> Tuple[bool, bool]:
+    buy_signal = all([x.rsi_3 > 30 for x in prev_rows]) and row.rsi_3 < 30
+    sell_signal = all([x.rsi_3 < 70 for x in prev_rows]) and row.rsi_3 > 70
+    return bool(buy_signal), bool(sell_signal)
 
 
 class TriRSI(StrategyAbstract):
@@ -33,17 +43,28 @@ class TriRSI(StrategyAbstract):
                 self._do_common_processes(row, nb_prev, first_rows=True)
                 continue
 
-            if all([x.rsi_3 > 30 for x in self.prev_rows]) and row.rsi_3 < 30:
-                self.buy_signal = True
-            else:
-                self.buy_signal = False
-            if all([x.rsi_3 < 70 for x in self.prev_rows]) and row.rsi_3 > 70:
-                self.sell_signal = True
-            else:
-                self.sell_signal = False
+            self.buy_signal, self.sell_signal = get_signals(row, self.prev_rows)
 
             stop_loss, take_profit = self.make_decision(row, stop_loss, take_profit, spread)
             self._do_common_processes(row, nb_prev, first_rows=False)
 
         self._save_strategy_result()
 
+
+class StreamingTriRSI(StreamingStrategyAbstract):
+    nb_prev = 3
+
+    def init_indicators(self, span=5):
+        self.rsi = [StreamingRsi(span, col) for col in ['close', 'rsi_1', 'rsi_2']]
+
+    def update_indicators(self, candle: Mapping[str, Any]) -> Optional[Dict[str, Any]]:
+        row = dict(candle)
+        # each rsi is only given the rows where the previous one is defined, as after dropna in the batch run
+        for i, rsi in enumerate(self.rsi):
+            row[f'rsi_{i + 1}'] = rsi.update(row)
+            if row[f'rsi_{i + 1}'] != row[f'rsi_{i + 1}']:
+                return None
+        return row
+
+    def get_signals(self, row: Any) -> Tuple[bool, bool]:
+        return get_signals(row, self.prev_rows)
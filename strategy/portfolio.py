@@ -0,0 +1,205 @@
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import shared_memory
+from typing import Any, Dict, List, Optional, Type
+
+import numpy as np
+import pandas as pd
+
+from indicator.risk import compute_all
+from strategy.strategy import StrategyAbstract
+from strategy.stop_loss import StopLoss
+
+logger = logging.getLogger(__name__)
+
+
+class SharedCandles(object):
+    """
+    Candles of several symbols, in long format, copied once into shared memory blocks, one block per column, sorted
+    by symbol and date. Only the names of the blocks and the rows of each symbol are pickled, so a worker process
+    reads the candles of its symbol from the blocks instead of receiving a pickled frame. The process creating the
+    blocks must call close once the workers are done.
+    """
+    def __init__(self, candles: pd.DataFrame) -> None:
+        if 'symbol' not in candles.columns or 'date' not in candles.columns:
+            raise ValueError('The candles must have a symbol and a date column')
+        candles = candles.sort_values(['symbol', 'date'], kind='mergesort')
+        symbols, starts = np.unique(candles['symbol'].to_numpy(), return_index=True)
+        ends = np.append(starts[1:], len(candles))
+        self.rows = {symbol: (int(start), int(end)) for symbol, start, end in zip(symbols, starts, ends)}
+
+        # only the columns with a fixed size dtype can be shared, the symbol is given by the rows. Prices read from
+        # the NUMERIC columns of the database are Decimal objects, they are cast to float64.
+        self.columns = list()
+        self._blocks = list()
+        for col in candles.columns:
+            if col == 'symbol':
+                continue
+            values = candles[col].to_numpy()
+            if values.dtype.kind == 'O':
+                try:
+                    values = values.astype(np.float64)
+                except (TypeError, ValueError):
+                    self.close()
+                    raise ValueError(f'Column {col} can not be shared, its values are not numbers, drop it from the '
+                                     f'candles')
+            elif values.dtype.kind not in 'biufM':
+                self.close()
+                raise ValueError(f'Column {col} of dtype {values.dtype} can not be shared, drop it from the candles')
+            block = shared_memory.SharedMemory(create=True, size=max(values.nbytes, 1))
+            np.ndarray(values.shape, dtype=values.dtype, buffer=block.buf)[:] = values
+            self._blocks.append(block)
+            self.columns.append((col, values.dtype.str, block.name))
+
+    def __getstate__(self) -> Dict[str, Any]:
+        return {'rows': self.rows, 'columns': self.columns, '_blocks': list()}
+
+    @property
+    def symbols(self) -> List[str]:
+        return list(self.rows.keys())
+
+    def get(self, symbol: str) -> pd.DataFrame:
+        """
+        :return: copy of the candles of the symbol, without the symbol column
+        """
+        start, end = self.rows[symbol]
+        data = dict()
+        for col, dtype, name in self.columns:
+            block = shared_memory.SharedMemory(name=name)
+            dtype = np.dtype(dtype)
+            view = np.ndarray((end - start,), dtype=dtype, buffer=block.buf, offset=start * dtype.itemsize)
+            data[col] = view.copy()
+            # the block can't be closed while a view on it exists
+            del view
+            block.close()
+        return pd.DataFrame(data)
+
+    def close(self) -> None:
+        for block in self._blocks:
+            block.close()
+            block.unlink()
+        self._blocks = list()
+
+
+class PortfolioResult(object):
+    """
+    - equity: common timeline of the symbols with the pnl of each symbol at each date (0 when the symbol has no
+    result at this date), the return and return_cumsum columns of the portfolio
+    - indicators: indicators of compute_all on the portfolio equity
+    - symbols: one row per symbol with its number of candles, its pnl, its contribution to the portfolio return, the
+    scalar indicators of its own compute_performance and the error of its run
+    """
+    def __init__(self, equity: pd.DataFrame, indicators: Dict[str, Any], symbols: pd.DataFrame) -> None:
+        self.equity = equity
+        self.indicators = indicators
+        self.symbols = symbols
+
+
+def run_symbol(strategy_class: Type[StrategyAbstract], stop_loss_class: Type[StopLoss], granularity: int,
+               strategy_params: Dict[str, Any], stop_loss_params: Dict[str, Any], init_investment: int,
+               trade_size: float, candles: SharedCandles, symbol: str) -> Dict[str, Any]:
+    """
+    Run the strategy on the candles of one symbol
+    :return: the dates of the result and the pnl at each of them, the scalar indicators of compute_performance
+    """
+    result = {'symbol': symbol}
+    try:
+        data = candles.get(symbol)
+        result['nb_candles'] = len(data)
+        strategy = strategy_class(data, granularity, stop_loss_class(**stop_loss_params), init_investment,
+                                  trade_size)
+        strategy.apply_strategy(**strategy_params)
+        strategy.compute_return()
+        strategy.compute_performance()
+        result.update({k: v for k, v in strategy.indicators.items() if np.isscalar(v)})
+
+        # the first return is the investment, as in compute_return its ret is not counted
+        pnl = strategy.data['ret'].to_numpy(dtype=float) * strategy.trade_size
+        pnl[:1] = 0
+        result['dates'] = strategy.data['date'].to_numpy()
+        result['pnl'] = pnl
+        result['error'] = None
+    except Exception as error:
+        result['error'] = f'{type(error).__name__}: {error}'
+    return result
+
+
+def align_pnl(runs: List[Dict[str, Any]]) -> pd.DataFrame:
+    """
+    :param runs: results of run_symbol
+    :return: the union of the dates of the runs, with the pnl of each symbol at each date, 0 when it has no result
+    """
+    timeline, inverse = np.unique(np.concatenate([run['dates'] for run in runs]), return_inverse=True)
+    pnl = np.zeros((len(timeline), len(runs)))
+    start = 0
+    for i, run in enumerate(runs):
+        end = start + len(run['dates'])
+        pnl[inverse[start: end], i] = run['pnl']
+        start = end
+    result = pd.DataFrame(pnl, columns=[run['symbol'] for run in runs])
+    result.insert(0, 'date', timeline)
+    return result
+
+
+def run_portfolio(strategy_class: Type[StrategyAbstract], candles: pd.DataFrame, granularity: int,
+                  stop_loss_class: Type[StopLoss], strategy_params: Optional[Dict[str, Any]] = None,
+                  stop_loss_params: Optional[Dict[str, Any]] = None, symbols: Optional[List[str]] = None,
+                  init_investment: int = 10000, trade_size: float = 0.1, nb_workers: Optional[int] = None) -> \
+        PortfolioResult:
+    """
+    Run the same strategy on each symbol in a process pool, then add the pnl of the symbols on their common timeline.
+    The pnl of each symbol is in its quote currency, as in compute_return, and is added without conversion.
+    :param strategy_class: class of the strategy to run
+    :param candles: candles of all the symbols in long format, with a symbol and a date column
+    :param granularity: annual granularity of the candles (see AnnualGranularity)
+    :param stop_loss_class: class of the stop loss given to the strategy
+    :param strategy_params: parameters of apply_strategy
+    :param stop_loss_params: parameters of the stop loss class
+    :param symbols: symbols to run, all the symbols of the candles if None
+    :param init_investment: investment of the portfolio, the strategy of each symbol trades trade_size from it
+    :param trade_size: size of the trades of each symbol, in lots
+    :param nb_workers: number of processes, as many as the symbols, up to the number of cores, if None
+    """
+    strategy_params = strategy_params or dict()
+    stop_loss_params = stop_loss_params or dict()
+    if symbols is not None:
+        candles = candles[candles['symbol'].isin(symbols)]
+    shared_candles = SharedCandles(candles)
+    if len(shared_candles.symbols) == 0:
+        shared_candles.close()
+        raise ValueError('No candle to run the strategy on')
+
+    runs = list()
+    try:
+        nb_workers = nb_workers or min(len(shared_candles.symbols), os.cpu_count() or 1)
+        with ProcessPoolExecutor(max_workers=nb_workers) as executor:
+            futures = [executor.submit(run_symbol, strategy_class, stop_loss_class, granularity, strategy_params,
+                                       stop_loss_params, init_investment, trade_size, shared_candles, symbol)
+                       for symbol in shared_candles.symbols]
+            for future in as_completed(futures):
+                runs.append(future.result())
+    finally:
+        shared_candles.close()
+
+    # the columns of the result do not depend on the order the runs are done
+    runs.sort(key=lambda x: x['symbol'])
+    for run in runs:
+        if run['error'] is not None:
+            logger.warning(f"Run of {run['symbol']} failed with {run['error']}")
+    succeeded = [run for run in runs if run['error'] is None]
+    if len(succeeded) == 0:
+        raise RuntimeError('The strategy failed on every symbol')
+
+    equity = align_pnl(succeeded)
+    equity['return'] = equity[[run['symbol'] for run in succeeded]].sum(axis=1)
+    equity.loc[0, 'return'] += init_investment
+    equity['return_cumsum'] = equity['return'].cumsum()
+    indicators = compute_all(equity, 'return_cumsum', granularity)
+
+    summary = pd.DataFrame([{k: v for k, v in run.items() if k not in ['dates', 'pnl']} for run in runs])
+    summary = summary.set_index('symbol')
+    summary.insert(1, 'pnl', pd.Series({run['symbol']: run['pnl'].sum() for run in succeeded}, dtype=float))
+    summary.insert(2, 'contribution', summary['pnl'] / init_investment)
+    logger.info(f'{len(succeeded)} symbols out of {len(runs)}, portfolio indicators: {indicators}')
+    return PortfolioResult(equity, indicators, summary)
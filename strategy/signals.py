@@ -0,0 +1,222 @@
+import operator
+from abc import ABC, abstractmethod
+from typing import Callable, Union
+
+import numpy as np
+import pandas as pd
+
+
+class Expression(ABC):
+    """
+    Expression over the columns of a data frame, evaluated for all its rows at once into a numpy array. Expressions
+    are combined with the comparison operators, & (and), | (or) and ~ (not).
+    """
+    @abstractmethod
+    def evaluate(self, data: pd.DataFrame) -> np.ndarray:
+        pass
+
+    def lag(self, n: int = 1) -> 'Expression':
+        return Lag(self, n)
+
+    def _compare(self, other, op: Callable) -> 'Expression':
+        return Comparison(self, to_expression(other), op)
+
+    def __lt__(self, other) -> 'Expression':
+        return self._compare(other, operator.lt)
+
+    def __le__(self, other) -> 'Expression':
+        return self._compare(other, operator.le)
+
+    def __gt__(self, other) -> 'Expression':
+        return self._compare(other, operator.gt)
+
+    def __ge__(self, other) -> 'Expression':
+        return self._compare(other, operator.ge)
+
+    def __eq__(self, other) -> 'Expression':
+        return self._compare(other, operator.eq)
+
+    def __ne__(self, other) -> 'Expression':
+        return self._compare(other, operator.ne)
+
+    __hash__ = object.__hash__
+
+    def __and__(self, other) -> 'Expression':
+        return Logical(self, to_expression(other), np.logical_and)
+
+    def __or__(self, other) -> 'Expression':
+        return Logical(self, to_expression(other), np.logical_or)
+
+    def __invert__(self) -> 'Expression':
+        return Not(self)
+
+
+class Column(Expression):
+    def __init__(self, name: str) -> None:
+        self.name = name
+
+    def evaluate(self, data: pd.DataFrame) -> np.ndarray:
+        return data[self.name].to_numpy()
+
+
+class Constant(Expression):
+    def __init__(self, value: Union[float, bool]) -> None:
+        self.value = value
+
+    def evaluate(self, data: pd.DataFrame) -> np.ndarray:
+        return np.full(len(data), self.value)
+
+
+class Comparison(Expression):
+    def __init__(self, left: Expression, right: Expression, op: Callable) -> None:
+        self.left = left
+        self.right = right
+        self.op = op
+
+    def evaluate(self, data: pd.DataFrame) -> np.ndarray:
+        # comparisons with NaN are False, as in the candle loops
+        with np.errstate(invalid='ignore'):
+            return self.op(self.left.evaluate(data), self.right.evaluate(data))
+
+
+class Logical(Expression):
+    def __init__(self, left: Expression, right: Expression, op: Callable) -> None:
+        self.left = left
+        self.right = right
+        self.op = op
+
+    def evaluate(self, data: pd.DataFrame) -> np.ndarray:
+        return self.op(self.left.evaluate(data).astype(bool), self.right.evaluate(data).astype(bool))
+
+
+class Not(Expression):
+    def __init__(self, expression: Expression) -> None:
+        self.expression = expression
+
+    def evaluate(self, data: pd.DataFrame) -> np.ndarray:
+        return ~self.expression.evaluate(data).astype(bool)
+
+
+class Lag(Expression):
+    """
+    Value of the expression n rows before, False or NaN on the first n rows
+    """
+    def __init__(self, expression: Expression, n: int = 1) -> None:
+        self.expression = expression
+        self.n = n
+
+    def evaluate(self, data: pd.DataFrame) -> np.ndarray:
+        values = self.expression.evaluate(data)
+        if values.dtype == bool:
+            result = np.zeros(len(values), dtype=bool)
+        else:
+            result = np.full(len(values), np.NaN)
+        if self.n < len(values):
+            result[self.n:] = values[:len(values) - self.n]
+        return result
+
+
+def _count_in_window(condition: np.ndarray, n: int) -> np.ndarray:
+    """
+    :return: number of True values of condition on the n rows ending at each row
+    """
+    cumsum = np.concatenate([[0], np.cumsum(condition, dtype=np.int64)])
+    start = np.maximum(np.arange(1, len(condition) + 1) - n, 0)
+    return cumsum[1:] - cumsum[start]
+
+
+class HeldFor(Expression):
+    """
+    True where the condition is True on the n rows ending at this row
+    """
+    def __init__(self, condition: Expression, n: int) -> None:
+        self.condition = condition
+        self.n = n
+
+    def evaluate(self, data: pd.DataFrame) -> np.ndarray:
+        return _count_in_window(self.condition.evaluate(data).astype(bool), self.n) == self.n
+
+
+class WithinKBars(Expression):
+    """
+    True where the condition is True on this row or on one of the k previous rows
+    """
+    def __init__(self, condition: Expression, k: int) -> None:
+        self.condition = condition
+        self.k = k
+
+    def evaluate(self, data: pd.DataFrame) -> np.ndarray:
+        return _count_in_window(self.condition.evaluate(data).astype(bool), self.k + 1) > 0
+
+
+class StartingAt(Expression):
+    """
+    Condition forced to False before the row start
+    """
+    def __init__(self, condition: Expression, start: int) -> None:
+        self.condition = condition
+        self.start = start
+
+    def evaluate(self, data: pd.DataFrame) -> np.ndarray:
+        result = self.condition.evaluate(data).astype(bool)
+        result[:self.start] = False
+        return result
+
+
+def to_expression(value: Union[Expression, str, float, bool]) -> Expression:
+    """
+    :param value: an expression, a constant, or a column name
+    """
+    if isinstance(value, Expression):
+        return value
+    if isinstance(value, str):
+        return Column(value)
+    return Constant(value)
+
+
+def col(name: str) -> Expression:
+    return Column(name)
+
+
+def lag(expression: Union[Expression, str], n: int = 1) -> Expression:
+    return Lag(to_expression(expression), n)
+
+
+def held_for_n(condition: Expression, n: int) -> Expression:
+    return HeldFor(condition, n)
+
+
+def within_k_bars(condition: Expression, k: int) -> Expression:
+    return WithinKBars(condition, k)
+
+
+def starting_at(condition: Expression, start: int) -> Expression:
+    return StartingAt(condition, start)
+
+
+def crosses_below(left: Union[Expression, str], right: Union[Expression, str, float], nb_prev: int = 1) -> \
+        Expression:
+    """
+    all([x.left > x.right for x in prev_rows]) and row.left < row.right, for the nb_prev previous rows
+    """
+    left, right = to_expression(left), to_expression(right)
+    return held_for_n(left > right, nb_prev).lag(1) & (left < right)
+
+
+def crosses_above(left: Union[Expression, str], right: Union[Expression, str, float], nb_prev: int = 1) -> \
+        Expression:
+    """
+    all([x.left < x.right for x in prev_rows]) and row.left > row.right, for the nb_prev previous rows
+    """
+    left, right = to_expression(left), to_expression(right)
+    return held_for_n(left < right, nb_prev).lag(1) & (left > right)
+
+
+def evaluate(signal: Union[Expression, np.ndarray], data: pd.DataFrame) -> np.ndarray:
+    """
+    :param signal: an expression, or a boolean array already computed
+    :return: boolean mask of the rows of data where the signal is True
+    """
+    if isinstance(signal, Expression):
+        return signal.evaluate(data).astype(bool)
+    return np.array(signal, dtype=bool)
@@ -1,7 +1,61 @@
-from typing import Tuple, Optional
+from collections import deque
+from typing import Tuple, Optional, Any, Sequence
 from abc import ABC, abstractmethod
 
-from indicator.oscillator import Atr
+import numpy as np
+import pandas as pd
+
+
+def _windowed_ewm(first_values: np.ndarray, values: np.ndarray, span: int, window: int) -> np.ndarray:
+    """
+    For every index i, last value of the exponential moving average (pandas ewm with span and min_periods=span)
+    computed only on values[max(0, i - window): i + 1], the first value of each window being taken from
+    first_values. The pandas recursion is applied to all the windows at once, one window position at a time.
+    """
+    nb_values = len(values)
+    alpha = 1. / (1. + (span - 1) / 2.)
+    old_wt_factor = 1. - alpha
+    ends = np.arange(nb_values)
+    starts = np.maximum(0, ends - window)
+
+    weighted = first_values[starts].astype(float)
+    nobs = (weighted == weighted).astype(int)
+    old_wt = np.ones(nb_values)
+    for k in range(1, window + 1):
+        in_window = starts + k <= ends
+        cur = values[np.minimum(starts + k, nb_values - 1)]
+        is_obs = in_window & (cur == cur)
+        nobs += is_obs
+        has_weighted = in_window & (weighted == weighted)
+        old_wt = np.where(has_weighted, old_wt * old_wt_factor, old_wt)
+        weighted = np.where(has_weighted & is_obs & (weighted != cur), (old_wt * weighted + cur) / (old_wt + 1.),
+                            weighted)
+        old_wt = np.where(has_weighted & is_obs, old_wt + 1., old_wt)
+        weighted = np.where(in_window & ~has_weighted & is_obs, cur, weighted)
+
+    return np.where(nobs >= span, weighted, np.NaN)
+
+
+def _last_ewm(first_value: float, values: Sequence[float], span: int) -> float:
+    """
+    Last value of _windowed_ewm for a single window, made of first_value followed by values
+    """
+    alpha = 1. / (1. + (span - 1) / 2.)
+    weighted = first_value
+    nobs = int(weighted == weighted)
+    old_wt = 1.
+    for cur in values:
+        is_obs = cur == cur
+        nobs += is_obs
+        if weighted == weighted:
+            old_wt *= 1. - alpha
+            if is_obs:
+                if weighted != cur:
+                    weighted = (old_wt * weighted + cur) / (old_wt + 1.)
+                old_wt += 1.
+        elif is_obs:
+            weighted = cur
+    return weighted if nobs >= span else np.NaN
 
 
 class StopLoss(ABC):
@@ -11,6 +65,35 @@ class StopLoss(ABC):
         self.min_rows = min_rows
         self.update = update
 
+    @property
+    def data(self) -> Optional[pd.DataFrame]:
+        return self._data
+
+    @data.setter
+    def data(self, data: Optional[pd.DataFrame]) -> None:
+        self._data = data
+        if data is not None:
+            self.prepare()
+
+    def prepare(self) -> None:
+        """
+        Called each time data is assigned, to compute once for all the candles what compute needs
+        """
+        pass
+
+    def start(self) -> None:
+        """
+        Start a stream of candles: data is dropped, each candle is then given to on_candle before compute is called
+        for it
+        """
+        self.data = None
+
+    def on_candle(self, candle: Any) -> None:
+        """
+        :param candle: new candle of the stream, with the columns as attributes
+        """
+        pass
+
     @abstractmethod
     def compute(self, index: int, price: float, buy_action: bool = True, spread: float = 0):
         pass
@@ -37,10 +120,14 @@ class StopLossWithConstraint(StopLoss):
     def __init__(self, stop: float = 5e-4, profit: float = 5e-3, column: str = 'close', min_rows: int = 0):
         self.stop = stop
         self.profit = profit
+        self.constraint = None
         super().__init__(column, min_rows)
 
+    def on_candle(self, candle: Any) -> None:
+        self.constraint = float(getattr(candle, self.column))
+
     def compute(self, index: int, price: float, buy_action: bool = True) -> Tuple[float, float]:
-        constraint = float(self.data.loc[index, self.column])
+        constraint = float(self.data.loc[index, self.column]) if self.data is not None else self.constraint
         if buy_action:
             stop_loss = min(price - self.stop, constraint)
             take_profit = price + self.profit
@@ -56,14 +143,43 @@ class StopLossATR(StopLoss):
         self.span = span
         self.stop = stop
         self.profit = profit
+        self.atr = None
+        self.window = None
+        self.prev_close = None
+        self.last_atr = None
         super().__init__(column, span, update)
 
+    def prepare(self) -> None:
+        # ATR of each candle computed, as before, with an ewm on the 2 * span previous candles only. The first true
+        # range of each window is high - low since there is no previous close in the window.
+        high_low = self.data['high'] - self.data['low']
+        tr = pd.DataFrame()
+        tr['HL'] = high_low
+        tr['HC'] = (self.data['high'] - self.data.shift(1)['close']).abs()
+        tr['LC'] = (self.data['low'] - self.data.shift(1)['close']).abs()
+        tr_max = tr.max(axis=1).to_numpy(dtype=float)
+        self.atr = _windowed_ewm(high_low.to_numpy(dtype=float), tr_max, self.span, 2 * self.span)
+
+    def start(self) -> None:
+        super().start()
+        # high - low and true range of the candles of the current window
+        self.window = deque(maxlen=2 * self.span + 1)
+        self.prev_close = None
+        self.last_atr = np.NaN
+
+    def on_candle(self, candle: Any) -> None:
+        high_low = candle.high - candle.low
+        tr = high_low
+        if self.prev_close is not None:
+            tr = max([x for x in [high_low, abs(candle.high - self.prev_close), abs(candle.low - self.prev_close)]
+                      if x == x], default=np.NaN)
+        self.prev_close = candle.close
+        self.window.append((high_low, tr))
+        self.last_atr = _last_ewm(self.window[0][0], [x[1] for x in list(self.window)[1:]], self.span)
+
     def compute(self, index: int, price: float, buy_action: bool = True, spread: float = 0) -> \
             Tuple[Optional[float], Optional[float]]:
-        tmp_data = self.data.loc[index - 2 * self.span: index, :]
-        atr = Atr(tmp_data, self.column)
-        atr.compute(self.span, avg_type='ewm')
-        atr_val = atr.result[0][-1]
+        atr_val = self.atr[index] if self.data is not None else self.last_atr
         if buy_action:
             stop_loss = price - self.stop * atr_val + spread
             if stop_loss > price:
@@ -1,12 +1,13 @@
 from abc import ABC, abstractmethod
 from enum import Enum
-from typing import Tuple, Optional
+from typing import Tuple, Optional, Callable, Union, Dict
 
+import numpy as np
 import pandas as pd
 
-from indicator.performance import CAGR, Expectancy
 from strategy.stop_loss import StopLoss
-from indicator.risk import SharpeRatio, Calmar, Volatility, RiskRewardRatio
+from strategy.signals import Expression, evaluate
+from indicator.risk import compute_all
 
 
 class StrategyAction(Enum):
@@ -15,6 +16,24 @@ class StrategyAction(Enum):
     SELL = -1
 
 
+def _find_first(condition: Callable[[slice], np.ndarray], start: int, end: int, block: int = 256) -> int:
+    """
+    :param condition: function returning a boolean array for a slice of candles
+    :param start: first index to look at
+    :param end: index after the last one to look at
+    :param block: size of the first slice evaluated, it is doubled after each slice without match
+    :return: the first index between start and end where condition is True, end if there is none
+    """
+    while start < end:
+        stop = min(start + block, end)
+        hits = np.flatnonzero(condition(slice(start, stop)))
+        if len(hits):
+            return start + int(hits[0])
+        start = stop
+        block *= 2
+    return end
+
+
 class StrategyAbstract(ABC):
     def __init__(self, data: pd.DataFrame, granularity: int, stop_loss: StopLoss, init_investment: int = 10000,
                  trade_size: float = 0.1) -> None:
@@ -49,23 +68,7 @@ class StrategyAbstract(ABC):
         return None
 
     def compute_performance(self) -> None:
-        for ind in [CAGR, Volatility, SharpeRatio, Calmar]:
-            instance = ind(self.data, 'return_cumsum')
-            instance.compute(self.granularity)
-            self.indicators[instance.__class__.__name__] = instance.result
-
-        for ind in [RiskRewardRatio]:
-            instance = ind(self.data)
-            instance.compute()
-            for ind_name, val in instance.result.items():
-                self.indicators[ind_name] = val
-
-        for ind in [Expectancy]:
-            instance = ind(self.data)
-            instance.compute(self.trade_size)
-            for ind_name, val in instance.result.items():
-                self.indicators[ind_name] = val
-
+        self.indicators.update(compute_all(self.data, 'return_cumsum', self.granularity, trade_size=self.trade_size))
         return None
 
     def _do_common_processes(self, candle: pd.DataFrame, nb_prev: int, first_rows: bool = False) -> None:
@@ -182,8 +185,8 @@ class StrategyAbstract(ABC):
         self.data['current_returns'] = self.current_returns
         return
 
-    def make_decision(self, candle: pd.DataFrame, stop_loss: float, take_profit: float, spread: float) -> Tuple[float,
-                                                                                                                float]:
+    def make_decision(self, candle: pd.DataFrame, stop_loss: float, take_profit: float, spread: float = 0) -> \
+            Tuple[float, float]:
         if self.position == StrategyAction.DO_NOTHING.value and self.buy_signal:
             stop_loss, take_profit = self.stop_loss.compute(candle.Index, candle.close, buy_action=True, spread=spread)
             if stop_loss is None:
@@ -213,3 +216,170 @@ class StrategyAbstract(ABC):
             self._do_nothing(candle, take_profit, stop_loss)
 
         return stop_loss, take_profit
+
+    def run_backtest(self, buy_signals: np.ndarray, sell_signals: np.ndarray, spread: float = 0) -> None:
+        """
+        Array-backed equivalent of calling make_decision on each candle of self.data. The buy and sell signals are
+        given for the whole data, so that the state machine only stops on candles where something can happen:
+        a signal while no position is taken, an exit while a position is held (or every held candle when the stop
+        loss is updated). The result is saved in the same columns as _save_strategy_result.
+        :param buy_signals: boolean array, one value per candle of self.data
+        :param sell_signals: boolean array, one value per candle of self.data
+        :param spread: spread applied when a position is taken
+        """
+        for col, values in self.backtest(buy_signals, sell_signals, spread).items():
+            self.data[col] = values
+        return
+
+    def backtest(self, buy_signals: np.ndarray, sell_signals: np.ndarray, spread: float = 0, start: int = 0) -> \
+            Dict[str, np.ndarray]:
+        """
+        State machine of run_backtest on a window of self.data, starting at row start with as many rows as there
+        are signals. The candles are read through views of the columns and the stop loss is prepared on the whole
+        data, so that a window of a longer run is backtested without copying it, with the warmup of the full run.
+        A position still held on the last row of the window is not closed.
+        :param buy_signals: boolean array, one value per candle of the window
+        :param sell_signals: boolean array, one value per candle of the window
+        :param spread: spread applied when a position is taken
+        :param start: index of the first row of the window in self.data
+        :return: result columns of run_backtest, one value per candle of the window
+        """
+        buy_signals = np.asarray(buy_signals, dtype=bool)
+        sell_signals = np.asarray(sell_signals, dtype=bool)
+        end = start + len(buy_signals)
+        open_ = self.data['open'].to_numpy(dtype=float)[start:end]
+        close = self.data['close'].to_numpy(dtype=float)[start:end]
+        low = self.data['low'].to_numpy(dtype=float)[start:end]
+        high = self.data['high'].to_numpy(dtype=float)[start:end]
+        nb_candles = len(close)
+
+        actions = np.full(nb_candles, StrategyAction.DO_NOTHING.value, dtype=int)
+        actions_price = close.copy()
+        ret = np.zeros(nb_candles)
+        stop_loss_list = np.zeros(nb_candles)
+        take_profit_list = np.zeros(nb_candles)
+        current_returns = np.zeros(nb_candles)
+
+        if self.stop_loss.data is not self.data:
+            self.stop_loss.data = self.data
+        self.position = StrategyAction.DO_NOTHING.value
+        signals_idx = np.flatnonzero(buy_signals | sell_signals)
+        idx = 0
+        while True:
+            # next candle with a signal while no position is taken
+            next_signal = np.searchsorted(signals_idx, idx)
+            if next_signal == len(signals_idx):
+                break
+            idx = int(signals_idx[next_signal])
+
+            buy_action = bool(buy_signals[idx])
+            stop_loss, take_profit = self.stop_loss.compute(start + idx, close[idx], buy_action=buy_action,
+                                                            spread=spread)
+            if stop_loss is None:
+                idx += 1
+                continue
+
+            if buy_action:
+                self.position = StrategyAction.BUY.value
+                price = close[idx] + spread
+                ret[idx] = close[idx] - price
+            else:
+                self.position = StrategyAction.SELL.value
+                price = close[idx] - spread
+                ret[idx] = price - close[idx]
+            actions[idx] = self.position
+            actions_price[idx] = price
+            stop_loss_list[idx] = stop_loss
+            take_profit_list[idx] = take_profit
+
+            exit_idx = self._run_position(idx, stop_loss, take_profit, open_, close, low, high, buy_signals,
+                                          sell_signals, stop_loss_list, start)
+            held = slice(idx + 1, exit_idx)
+            actions[held] = self.position
+            take_profit_list[held] = take_profit
+            if buy_action:
+                ret[held] = close[held] - open_[held]
+            else:
+                ret[held] = open_[held] - close[held]
+
+            if exit_idx < nb_candles:
+                actions[exit_idx] = self.position
+                take_profit_list[exit_idx] = take_profit
+                stop_loss = stop_loss_list[exit_idx]
+                if buy_action:
+                    action_price = stop_loss if low[exit_idx] < stop_loss else close[exit_idx]
+                    ret[exit_idx] = action_price - open_[exit_idx]
+                else:
+                    action_price = stop_loss if high[exit_idx] > stop_loss else close[exit_idx]
+                    ret[exit_idx] = open_[exit_idx] - action_price
+                actions_price[exit_idx] = action_price
+                self.position = StrategyAction.DO_NOTHING.value
+
+            trade = slice(idx, min(exit_idx + 1, nb_candles))
+            current_returns[trade] = np.add.accumulate(ret[trade])
+            idx = exit_idx + 1
+
+        return {'action': actions,
+                'buy_signal': buy_signals,
+                'sell_signal': sell_signals,
+                'action_price': actions_price,
+                'ret': ret,
+                'stop_loss': stop_loss_list,
+                'take_profit': take_profit_list,
+                'current_returns': current_returns}
+
+    def apply_signals(self, buy_signal: Union[Expression, np.ndarray], sell_signal: Union[Expression, np.ndarray],
+                      nb_prev: int = 1, spread: float = 0, start: int = 0) -> None:
+        """
+        Vectorized equivalent of the candle loop of the example strategies: the signals are evaluated over self.data
+        and given to run_backtest, after being set to False on the first rows, where the loop does nothing.
+        :param buy_signal: expression of strategy.signals, or boolean array, one value per candle of self.data
+        :param sell_signal: expression of strategy.signals, or boolean array, one value per candle of self.data
+        :param nb_prev: number of previous rows the signals are computed with
+        :param spread: spread applied when a position is taken
+        :param start: first row where the signals can be True, if after the rows needed by nb_prev and the stop loss
+        """
+        start = max(self.stop_loss.min_rows + 1, nb_prev, start)
+        buy_signals = evaluate(buy_signal, self.data)
+        sell_signals = evaluate(sell_signal, self.data)
+        buy_signals[:start] = False
+        sell_signals[:start] = False
+        self.run_backtest(buy_signals, sell_signals, spread)
+        return
+
+    def _run_position(self, entry_idx: int, stop_loss: float, take_profit: float, open_: np.ndarray,
+                      close: np.ndarray, low: np.ndarray, high: np.ndarray, buy_signals: np.ndarray,
+                      sell_signals: np.ndarray, stop_loss_list: np.ndarray, offset: int = 0) -> int:
+        """
+        Follow a position taken at entry_idx and fill stop_loss_list for each candle it is held.
+        :param offset: index in self.data of the first candle of the arrays
+        :return: index of the candle where the position is quit, len(close) if it is still held at the end
+        """
+        nb_candles = len(close)
+        buy_action = self.position == StrategyAction.BUY.value
+
+        if not self.stop_loss.update:
+            if buy_action:
+                exit_idx = _find_first(lambda s: sell_signals[s] | (low[s] < stop_loss) | (high[s] > take_profit),
+                                       entry_idx + 1, nb_candles)
+            else:
+                exit_idx = _find_first(lambda s: buy_signals[s] | (high[s] > stop_loss) | (low[s] < take_profit),
+                                       entry_idx + 1, nb_candles)
+            stop_loss_list[entry_idx + 1: exit_idx + 1] = stop_loss
+            return exit_idx
+
+        # the stop loss can move on each held candle, so we have to go through them one by one
+        idx = entry_idx + 1
+        while idx < nb_candles:
+            if buy_action and (sell_signals[idx] or low[idx] < stop_loss or high[idx] > take_profit):
+                break
+            if not buy_action and (buy_signals[idx] or high[idx] > stop_loss or low[idx] < take_profit):
+                break
+            new_stop_loss, _ = self.stop_loss.compute(offset + idx, close[idx], buy_action)
+            if buy_action and new_stop_loss > stop_loss or not buy_action and new_stop_loss < stop_loss:
+                stop_loss = new_stop_loss
+            stop_loss_list[idx] = stop_loss
+            idx += 1
+        if idx < nb_candles:
+            stop_loss_list[idx] = stop_loss
+        return idx
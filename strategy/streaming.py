@@ -0,0 +1,204 @@
+import logging
+from abc import abstractmethod
+from time import perf_counter
+from types import SimpleNamespace
+from typing import Any, Dict, Iterator, Mapping, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from strategy.strategy import StrategyAbstract
+from strategy.stop_loss import StopLoss
+
+logger = logging.getLogger(__name__)
+
+RESULT_COLS = ['action', 'buy_signal', 'sell_signal', 'action_price', 'ret', 'stop_loss', 'take_profit',
+               'current_returns']
+
+
+class RingBuffer(object):
+    """
+    Last size items appended, iterated from the oldest to the newest
+    """
+    def __init__(self, size: int) -> None:
+        self.size = size
+        self._items = size * [None]
+        self._start = 0
+        self._nb_items = 0
+
+    def append(self, item: Any) -> None:
+        if self.size == 0:
+            return
+        if self._nb_items < self.size:
+            self._items[self._nb_items] = item
+            self._nb_items += 1
+        else:
+            self._items[self._start] = item
+            self._start = (self._start + 1) % self.size
+
+    def __len__(self) -> int:
+        return self._nb_items
+
+    def __getitem__(self, i: int) -> Any:
+        if not -self._nb_items <= i < self._nb_items:
+            raise IndexError('ring buffer index out of range')
+        return self._items[(self._start + i % self._nb_items) % self.size]
+
+    def __iter__(self) -> Iterator[Any]:
+        for i in range(self._nb_items):
+            yield self._items[(self._start + i) % self.size]
+
+
+def _has_nan(values) -> bool:
+    return any(x != x for x in values if x is not None)
+
+
+class StreamingStrategyAbstract(StrategyAbstract):
+    """
+    Strategy fed with one candle at a time. Indicators are updated with each candle instead of being computed over
+    the whole data, and the candles where one of them is not defined yet are skipped, as the batch strategies drop
+    them. The decision on each remaining candle is taken by make_decision, so the results are the ones of the batch
+    run, but they are given back candle by candle instead of being accumulated.
+    """
+    # number of previous rows the signals are computed with
+    nb_prev = 1
+
+    def __init__(self, data: Optional[pd.DataFrame], granularity: int, stop_loss: StopLoss,
+                 init_investment: int = 10000, trade_size: float = 0.1) -> None:
+        super().__init__(data if data is not None else pd.DataFrame(), granularity, stop_loss, init_investment,
+                         trade_size)
+        self.spread = 0
+        self.nb_rows = 0
+        self.prev_rows = RingBuffer(self.nb_prev)
+        self.current_stop_loss = 0
+        self.current_take_profit = 0
+
+    @abstractmethod
+    def init_indicators(self, **kwargs) -> None:
+        """
+        Create the streaming indicators, kwargs being the parameters of apply_strategy
+        """
+        pass
+
+    @abstractmethod
+    def update_indicators(self, candle: Mapping[str, Any]) -> Optional[Dict[str, Any]]:
+        """
+        :param candle: new candle
+        :return: the candle with the values of the indicators, None if one of them is not defined yet
+        """
+        pass
+
+    @abstractmethod
+    def get_signals(self, row: Any) -> Tuple[bool, bool]:
+        """
+        :param row: current row, the previous ones being in self.prev_rows
+        :return: buy signal and sell signal
+        """
+        pass
+
+    def start(self, spread: float = 0, **kwargs) -> None:
+        """
+        Reset the state of the strategy before a new stream of candles
+        :param kwargs: parameters of the strategy, as given to apply_strategy
+        """
+        self._reinit_data()
+        self.spread = spread
+        self.nb_rows = 0
+        self.prev_rows = RingBuffer(self.nb_prev)
+        self.buy_signal = False
+        self.sell_signal = False
+        self.current_return = 0
+        self.current_returns = list()
+        self.current_stop_loss = 0
+        self.current_take_profit = 0
+        self.stop_loss.start()
+        self.init_indicators(**kwargs)
+
+    def on_candle(self, candle: Mapping[str, Any]) -> Optional[Dict[str, Any]]:
+        """
+        :param candle: new candle, with at least open, close, low and high
+        :return: the row of the candle with the columns of the batch result, None if the candle is skipped
+        """
+        row = self.update_indicators(candle)
+        if row is None or _has_nan(row.values()):
+            return None
+        row = SimpleNamespace(Index=self.nb_rows, **row)
+        self.nb_rows += 1
+        self.stop_loss.on_candle(row)
+
+        if row.Index < max(self.stop_loss.min_rows + 1, self.nb_prev):
+            self._do_nothing(row, 0, 0)
+        else:
+            self.buy_signal, self.sell_signal = self.get_signals(row)
+            self.current_stop_loss, self.current_take_profit = self.make_decision(
+                row, self.current_stop_loss, self.current_take_profit, self.spread)
+        self.prev_rows.append(row)
+
+        result = vars(row).copy()
+        del result['Index']
+        result.update({'action': self.actions[-1],
+                       'buy_signal': self.buy_signal,
+                       'sell_signal': self.sell_signal,
+                       'action_price': self.actions_price[-1],
+                       'ret': self.ret[-1],
+                       'stop_loss': self.stop_loss_list[-1],
+                       'take_profit': self.take_profit_list[-1],
+                       'current_returns': self.current_returns[-1]})
+        self._clear_results()
+        return result
+
+    def _clear_results(self) -> None:
+        # the results are given back, not accumulated
+        for results in [self.actions, self.actions_price, self.ret, self.stop_loss_list, self.take_profit_list,
+                        self.current_returns]:
+            results.clear()
+
+    def apply_strategy(self, **kwargs) -> None:
+        """
+        Feed the candles of self.data one at a time, the result is saved in self.data as by the batch strategies
+        """
+        self.start(**kwargs)
+        results = [self.on_candle(candle) for candle in self.data.to_dict('records')]
+        results = [x for x in results if x is not None]
+        self.data = pd.DataFrame(results) if results else self.data.iloc[:0].reindex(
+            columns=list(self.data.columns) + RESULT_COLS)
+        return
+
+
+def replay(batch_strategy: StrategyAbstract, streaming_strategy: StreamingStrategyAbstract, **kwargs) -> \
+        Tuple[pd.DataFrame, Dict[str, float]]:
+    """
+    Run the batch strategy on its data, then feed the same candles one at a time to the streaming strategy
+    :param kwargs: parameters of the strategies, given to apply_strategy and start
+    :return: rows of the batch result where the streaming result differs, none if the runs give the same actions,
+    and the latency of the streaming strategy per candle in microseconds
+    """
+    candles = batch_strategy.data.to_dict('records')
+    batch_strategy.apply_strategy(**kwargs)
+    batch_result = batch_strategy.data.reset_index(drop=True)
+
+    streaming_strategy.start(**kwargs)
+    results, latencies = list(), list()
+    for candle in candles:
+        start = perf_counter()
+        result = streaming_strategy.on_candle(candle)
+        latencies.append(perf_counter() - start)
+        if result is not None:
+            results.append(result)
+    streaming_result = pd.DataFrame(results, columns=batch_result.columns)
+
+    nb_rows = max(len(batch_result), len(streaming_result))
+    batch_values = batch_result.reindex(range(nb_rows))
+    streaming_values = streaming_result.reindex(range(nb_rows))
+    differ = np.zeros(nb_rows, dtype=bool)
+    for col in RESULT_COLS:
+        differ |= ~np.isclose(batch_values[col].to_numpy(dtype=float), streaming_values[col].to_numpy(dtype=float),
+                              rtol=1e-9, atol=1e-12, equal_nan=True)
+
+    latencies = 1e6 * np.array(latencies)
+    latency = {'mean_us': float(latencies.mean()) if len(latencies) else 0.,
+               'p99_us': float(np.percentile(latencies, 99)) if len(latencies) else 0.,
+               'max_us': float(latencies.max()) if len(latencies) else 0.}
+    logger.info(f'{len(candles)} candles replayed, {differ.sum()} rows differ from the batch run, latency per '
+                f'candle {latency}')
+    return batch_values[differ], latency
@@ -0,0 +1,138 @@
+import json
+import logging
+import itertools
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+from typing import Dict, List, Optional, Type, Any, Tuple
+
+import numpy as np
+import pandas as pd
+
+from indicator.cache import IndicatorCache, set_indicator_cache
+from strategy.strategy import StrategyAbstract
+from strategy.stop_loss import StopLoss
+
+logger = logging.getLogger(__name__)
+
+STOP_LOSS_PREFIX = 'stop_loss_'
+
+# Candles given to each worker process once, by the pool initializer, instead of with every run
+_worker_data = None
+
+
+def init_worker(data: pd.DataFrame, indicator_cache_bytes: Optional[int]) -> None:
+    """
+    Initializer of the worker processes of a pool running strategies on the same candles
+    :param data: candles given to the strategies, read with get_worker_data
+    :param indicator_cache_bytes: memory bound of the indicator cache of the worker, None to disable it
+    """
+    global _worker_data
+    _worker_data = data
+    if indicator_cache_bytes:
+        set_indicator_cache(IndicatorCache(max_bytes=indicator_cache_bytes))
+
+
+def get_worker_data() -> pd.DataFrame:
+    """
+    :return: candles given to the worker process by init_worker
+    """
+    if _worker_data is None:
+        raise RuntimeError('The process was not initialized with init_worker')
+    return _worker_data
+
+
+def get_run_id(strategy_params: Dict[str, Any], stop_loss_params: Dict[str, Any]) -> str:
+    return json.dumps({'strategy': strategy_params, 'stop_loss': stop_loss_params}, sort_keys=True, default=str)
+
+
+def build_search_space(strategy_grid: Dict[str, List], stop_loss_grid: Dict[str, List],
+                       nb_samples: Optional[int] = None, seed: int = 0) -> List[Tuple[Dict, Dict]]:
+    """
+    :param strategy_grid: values to try for each parameter of apply_strategy
+    :param stop_loss_grid: values to try for each parameter of the stop loss class
+    :param nb_samples: if set, random search of nb_samples parameter sets taken from the grid, else full grid
+    :param seed: seed of the random search
+    :return: list of (strategy parameters, stop loss parameters)
+    """
+    names = list(strategy_grid.keys()) + [STOP_LOSS_PREFIX + x for x in stop_loss_grid.keys()]
+    values = list(strategy_grid.values()) + list(stop_loss_grid.values())
+    combinations = list(itertools.product(*values))
+    if nb_samples is not None and nb_samples < len(combinations):
+        rng = np.random.RandomState(seed)
+        combinations = [combinations[i] for i in sorted(rng.choice(len(combinations), nb_samples, replace=False))]
+
+    search_space = list()
+    for combination in combinations:
+        params = dict(zip(names, combination))
+        strategy_params = {k: v for k, v in params.items() if not k.startswith(STOP_LOSS_PREFIX)}
+        stop_loss_params = {k[len(STOP_LOSS_PREFIX):]: v for k, v in params.items() if k.startswith(STOP_LOSS_PREFIX)}
+        search_space.append((strategy_params, stop_loss_params))
+    return search_space
+
+
+def run_one(strategy_class: Type[StrategyAbstract], stop_loss_class: Type[StopLoss], granularity: int,
+            strategy_params: Dict[str, Any], stop_loss_params: Dict[str, Any]) -> Dict[str, Any]:
+    result = {STOP_LOSS_PREFIX + k: v for k, v in stop_loss_params.items()}
+    result.update(strategy_params)
+    result['run_id'] = get_run_id(strategy_params, stop_loss_params)
+    try:
+        strategy = strategy_class(get_worker_data(), granularity, stop_loss_class(**stop_loss_params))
+        strategy.apply_strategy(**strategy_params)
+        strategy.compute_return()
+        strategy.compute_performance()
+        # trade indexes are lists, we only keep scalar indicators in the results table
+        result.update({k: v for k, v in strategy.indicators.items() if np.isscalar(v)})
+        result['error'] = None
+    except Exception as error:
+        result['error'] = f'{type(error).__name__}: {error}'
+    return result
+
+
+def sweep_strategy(strategy_class: Type[StrategyAbstract], data: pd.DataFrame, granularity: int,
+                   stop_loss_class: Type[StopLoss], strategy_grid: Dict[str, List],
+                   stop_loss_grid: Optional[Dict[str, List]] = None, nb_samples: Optional[int] = None, seed: int = 0,
+                   nb_workers: Optional[int] = None, result_path: Optional[str] = None,
+                   indicator_cache_bytes: Optional[int] = 2**27) -> pd.DataFrame:
+    """
+    Run a strategy on every parameter set of a grid (or of a random search in that grid) using a process pool.
+    :param strategy_class: class of the strategy to run
+    :param data: candles given to the strategy
+    :param granularity: annual granularity of the candles (see AnnualGranularity)
+    :param stop_loss_class: class of the stop loss given to the strategy
+    :param strategy_grid: values to try for each parameter of apply_strategy
+    :param stop_loss_grid: values to try for each parameter of the stop loss class
+    :param nb_samples: number of parameter sets of the random search, the full grid is run if None
+    :param seed: seed of the random search
+    :param nb_workers: number of processes, all the cores if None
+    :param result_path: json lines file where each run is appended as soon as it is done. If the file exists, the
+    runs already in it are not run again, so that an interrupted sweep can be resumed
+    :param indicator_cache_bytes: memory bound of the indicator cache of each worker, so that runs differing only by
+    parameters which are not used by the indicators do not compute them again. None to disable it
+    :return: one row per run with the parameters and the indicators of compute_performance
+    """
+    search_space = build_search_space(strategy_grid, stop_loss_grid or dict(), nb_samples, seed)
+
+    done = list()
+    if result_path is not None and Path(result_path).is_file():
+        with open(result_path) as f:
+            done = [json.loads(line) for line in f if line.strip()]
+        done_ids = set(x['run_id'] for x in done)
+        search_space = [x for x in search_space if get_run_id(*x) not in done_ids]
+        logger.info(f'{len(done_ids)} runs already done, {len(search_space)} runs left')
+
+    results = list()
+    with ProcessPoolExecutor(max_workers=nb_workers, initializer=init_worker,
+                             initargs=(data, indicator_cache_bytes)) as executor:
+        futures = [executor.submit(run_one, strategy_class, stop_loss_class, granularity, strategy_params,
+                                   stop_loss_params)
+                   for strategy_params, stop_loss_params in search_space]
+        for future in as_completed(futures):
+            result = future.result()
+            if result['error'] is not None:
+                logger.warning(f"Run {result['run_id']} failed with {result['error']}")
+            results.append(result)
+            if result_path is not None:
+                with open(result_path, 'a') as f:
+                    f.write(json.dumps(result, default=float) + '\n')
+
+    return pd.DataFrame(done + results)
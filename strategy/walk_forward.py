@@ -0,0 +1,229 @@
+import copy
+import logging
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Any, Dict, List, Optional, Tuple, Type
+
+import numpy as np
+import pandas as pd
+
+from strategy.strategy import StrategyAbstract
+from strategy.stop_loss import StopLoss
+from strategy.sweep import STOP_LOSS_PREFIX, build_search_space, get_run_id, get_worker_data, init_worker
+
+logger = logging.getLogger(__name__)
+
+
+class WalkForwardResult(object):
+    """
+    - windows: one row per window with its dates, the parameters selected on the train window, their train metric
+    and the indicators of compute_performance on the test window
+    - equity: results of the test windows stitched together, with the return and return_cumsum columns
+    - indicators: indicators of compute_performance on the stitched test windows
+    """
+    def __init__(self, windows: pd.DataFrame, equity: pd.DataFrame, indicators: Dict[str, Any]) -> None:
+        self.windows = windows
+        self.equity = equity
+        self.indicators = indicators
+
+
+def get_windows(nb_candles: int, train_size: int, test_size: int, anchored: bool = False) -> \
+        List[Tuple[int, int, int]]:
+    """
+    :param nb_candles: number of candles of the data
+    :param train_size: number of candles of each train window, of the first one if anchored
+    :param test_size: number of candles of each test window, the windows move forward by test_size
+    :param anchored: if True every train window starts at the first candle, else it has train_size candles
+    :return: (train start, test start, test end) of each window, the test windows follow each other until the last
+    candle
+    """
+    windows = list()
+    test_start = train_size
+    while test_start < nb_candles:
+        test_end = min(test_start + test_size, nb_candles)
+        windows.append((0 if anchored else test_start - train_size, test_start, test_end))
+        test_start = test_end
+    return windows
+
+
+def get_performance(strategy: StrategyAbstract, result: pd.DataFrame) -> Dict[str, Any]:
+    """
+    :param strategy: strategy giving the granularity, investment and trade size
+    :param result: result columns of a backtest with a range index, return and return_cumsum are added to it
+    :return: scalar indicators of compute_performance
+    """
+    if len(result) == 0:
+        return dict()
+    evaluation = copy.copy(strategy)
+    evaluation.data = result
+    evaluation.indicators = dict()
+    evaluation.compute_return()
+    evaluation.compute_performance()
+    return {k: v for k, v in evaluation.indicators.items() if np.isscalar(v)}
+
+
+def backtest_window(strategy: StrategyAbstract, buy_signals: np.ndarray, sell_signals: np.ndarray, spread: float,
+                    start: int) -> pd.DataFrame:
+    """
+    :return: backtest of the rows of strategy.data from start, as many as there are signals, with their date
+    """
+    result = pd.DataFrame(strategy.backtest(buy_signals, sell_signals, spread, start))
+    result.insert(0, 'date', strategy.data['date'].values[start: start + len(buy_signals)])
+    return result
+
+
+def _apply_strategy(strategy_class: Type[StrategyAbstract], stop_loss_class: Type[StopLoss], granularity: int,
+                    strategy_params: Dict[str, Any], stop_loss_params: Dict[str, Any],
+                    windows: List[Tuple[int, int, int]]) -> Tuple[StrategyAbstract, np.ndarray]:
+    """
+    Run the strategy once on the whole data of the worker, so that its indicators are computed once with the warmup
+    of the full run
+    :return: the strategy, and the bounds of the windows in the rows of the data it kept
+    """
+    data = get_worker_data()
+    strategy = strategy_class(data, granularity, stop_loss_class(**stop_loss_params))
+    strategy.apply_strategy(**strategy_params)
+    # the strategy drops the rows where its indicators are not defined, windows are located by date
+    rows = np.searchsorted(data['date'].values, strategy.data['date'].values)
+    bounds = np.searchsorted(rows, np.asarray(windows, dtype=int).reshape(-1, 3))
+    return strategy, bounds
+
+
+def _backtest_signals(strategy: StrategyAbstract, strategy_params: Dict[str, Any], start: int, end: int) -> \
+        pd.DataFrame:
+    return backtest_window(strategy, strategy.data['buy_signal'].to_numpy(dtype=bool)[start: end],
+                           strategy.data['sell_signal'].to_numpy(dtype=bool)[start: end],
+                           strategy_params.get('spread', 0), start)
+
+
+def run_parameter_set(strategy_class: Type[StrategyAbstract], stop_loss_class: Type[StopLoss], granularity: int,
+                      strategy_params: Dict[str, Any], stop_loss_params: Dict[str, Any],
+                      windows: List[Tuple[int, int, int]]) -> Dict[str, Any]:
+    """
+    Backtest each train window from the signals of one run of the strategy on the whole data
+    :return: the parameters and the performance on each train window
+    """
+    result = {STOP_LOSS_PREFIX + k: v for k, v in stop_loss_params.items()}
+    result.update(strategy_params)
+    result['run_id'] = get_run_id(strategy_params, stop_loss_params)
+    try:
+        strategy, bounds = _apply_strategy(strategy_class, stop_loss_class, granularity, strategy_params,
+                                           stop_loss_params, windows)
+        result['train'] = [get_performance(strategy, _backtest_signals(strategy, strategy_params, train_start,
+                                                                       test_start))
+                           for train_start, test_start, _ in bounds]
+        result['error'] = None
+    except Exception as error:
+        result['error'] = f'{type(error).__name__}: {error}'
+    return result
+
+
+def run_test_windows(strategy_class: Type[StrategyAbstract], stop_loss_class: Type[StopLoss], granularity: int,
+                     strategy_params: Dict[str, Any], stop_loss_params: Dict[str, Any],
+                     windows: List[Tuple[int, int, int]], selected: List[int]) -> Dict[int, pd.DataFrame]:
+    """
+    :param selected: indexes of the windows where the parameter set was selected
+    :return: backtest of each selected test window, by window index
+    """
+    strategy, bounds = _apply_strategy(strategy_class, stop_loss_class, granularity, strategy_params,
+                                       stop_loss_params, windows)
+    return {i: _backtest_signals(strategy, strategy_params, bounds[i][1], bounds[i][2]) for i in selected}
+
+
+def _select(runs: List[Dict[str, Any]], window: int, metric: str, maximize: bool) -> Tuple[Dict[str, Any], float]:
+    scores = np.array([run['train'][window].get(metric, np.NaN) for run in runs], dtype=float)
+    if np.isnan(scores).all():
+        return runs[0], np.NaN
+    best = int(np.nanargmax(scores) if maximize else np.nanargmin(scores))
+    return runs[best], scores[best]
+
+
+def walk_forward(strategy_class: Type[StrategyAbstract], data: pd.DataFrame, granularity: int,
+                 stop_loss_class: Type[StopLoss], strategy_grid: Dict[str, List], train_size: int, test_size: int,
+                 stop_loss_grid: Optional[Dict[str, List]] = None, anchored: bool = False,
+                 metric: str = 'SharpeRatio', maximize: bool = True, nb_samples: Optional[int] = None, seed: int = 0,
+                 nb_workers: Optional[int] = None, indicator_cache_bytes: Optional[int] = 2**27) -> \
+        WalkForwardResult:
+    """
+    Walk-forward optimization: for each window, the parameter set with the best metric on the train window is run on
+    the following test window, and the test windows are stitched together. Each parameter set is run once on the
+    whole data in a process pool, then its train windows are backtested from its signals, so that the indicators are
+    not computed again for each window. Only the metrics of the train windows are sent back, then the selected
+    parameter sets are run again to backtest their test windows. A position still held at the end of a test window is
+    valued at its last close and is not carried to the next window.
+    :param strategy_class: class of the strategy to run
+    :param data: candles given to the strategy, with a date column in increasing order
+    :param granularity: annual granularity of the candles (see AnnualGranularity)
+    :param stop_loss_class: class of the stop loss given to the strategy
+    :param strategy_grid: values to try for each parameter of apply_strategy
+    :param train_size: number of candles of each train window, of the first one if anchored
+    :param test_size: number of candles of each test window
+    :param stop_loss_grid: values to try for each parameter of the stop loss class
+    :param anchored: if True every train window starts at the first candle, else the train windows roll
+    :param metric: indicator of compute_performance used to select the parameters
+    :param maximize: True if the best parameters have the highest metric
+    :param nb_samples: number of parameter sets of the random search, the full grid is run if None
+    :param seed: seed of the random search
+    :param nb_workers: number of processes, all the cores if None
+    :param indicator_cache_bytes: memory bound of the indicator cache of each worker, None to disable it
+    """
+    if 'date' not in data.columns or not data['date'].is_monotonic_increasing:
+        raise ValueError('The candles must have a date column in increasing order')
+    data = data.reset_index(drop=True)
+    windows = get_windows(len(data), train_size, test_size, anchored)
+    if len(windows) == 0:
+        raise ValueError(f'No candle left to test after the first {train_size} candles')
+    search_space = build_search_space(strategy_grid, stop_loss_grid or dict(), nb_samples, seed)
+
+    runs = list()
+    with ProcessPoolExecutor(max_workers=nb_workers, initializer=init_worker,
+                             initargs=(data, indicator_cache_bytes)) as executor:
+        futures = [executor.submit(run_parameter_set, strategy_class, stop_loss_class, granularity, strategy_params,
+                                   stop_loss_params, windows)
+                   for strategy_params, stop_loss_params in search_space]
+        for future in as_completed(futures):
+            run = future.result()
+            if run['error'] is not None:
+                logger.warning(f"Run {run['run_id']} failed with {run['error']}")
+                continue
+            runs.append(run)
+        if len(runs) == 0:
+            raise RuntimeError('Every parameter set failed')
+        # the selection does not depend on the order the runs are done
+        runs.sort(key=lambda x: x['run_id'])
+        selection = [_select(runs, i, metric, maximize) for i in range(len(windows))]
+
+        # only the test windows of the selected parameter sets are backtested, so that the results sent back by the
+        # workers add up to the candles once
+        selected = dict()
+        for i, (run, _) in enumerate(selection):
+            selected.setdefault(run['run_id'], list()).append(i)
+        params = {get_run_id(*x): x for x in search_space}
+        futures = [executor.submit(run_test_windows, strategy_class, stop_loss_class, granularity, *params[run_id],
+                                   windows, window_indexes)
+                   for run_id, window_indexes in selected.items()]
+        test_results = dict()
+        for future in as_completed(futures):
+            test_results.update(future.result())
+
+    # the performance only depends on the granularity, the investment and the trade size of the strategy
+    evaluation = strategy_class(data.iloc[:0], granularity, stop_loss_class(**params[selection[0][0]['run_id']][1]))
+    summaries, equity = list(), list()
+    for i, (train_start, test_start, test_end) in enumerate(windows):
+        run, score = selection[i]
+        test_result = test_results[i]
+        summary = {'window': i,
+                   'train_start': data['date'].iloc[train_start],
+                   'test_start': data['date'].iloc[test_start],
+                   'test_end': data['date'].iloc[test_end - 1],
+                   'run_id': run['run_id'],
+                   f'train_{metric}': score}
+        summary.update({f'test_{k}': v for k, v in get_performance(evaluation, test_result.copy()).items()})
+        summaries.append(summary)
+        test_result.insert(1, 'window', i)
+        equity.append(test_result)
+
+    equity = pd.concat(equity, ignore_index=True)
+    indicators = get_performance(evaluation, equity)
+    logger.info(f'{len(windows)} windows, {len(runs)} parameter sets, {len(selected)} of them selected, '
+                f'out of sample {metric}: {indicators.get(metric)}')
+    return WalkForwardResult(pd.DataFrame(summaries), equity, indicators)
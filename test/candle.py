@@ -0,0 +1,242 @@
+import os
+import sys
+import tempfile
+import threading
+import time
+import types
+
+from proboscis.asserts import assert_true, assert_equal, assert_raises
+from proboscis import test
+
+import numpy as np
+import pandas as pd
+
+import data.candle as candle
+from data.candle import CandleClient, SYMBOLS, get_candles_all_symbols, upload_to_db_candles
+import utils.resampling as resampling
+from utils.resampling import COLS, GRANULARITIES, resample_candles, rollup_candles
+
+
+class FakeFxcmClient(CandleClient):
+    """
+    Serve canned 5 minutes candles like the FXCM API, recording the number of concurrent calls
+    """
+    def __init__(self, delay: float = 0.01, seed: int = 0) -> None:
+        self.delay = delay
+        self.seed = seed
+        self.nb_calls = 0
+        self.nb_running = 0
+        self.max_running = 0
+        self.lock = threading.Lock()
+
+    def get_candles(self, symbol, period, columns, with_index, start, end):
+        with self.lock:
+            self.nb_calls += 1
+            self.nb_running += 1
+            self.max_running = max(self.max_running, self.nb_running)
+        time.sleep(self.delay)
+        dates = pd.date_range(start, end, freq='5min')
+        dates = dates[dates < pd.Timestamp(end)]
+        rng = np.random.RandomState(self.seed + SYMBOLS.index(symbol))
+        # columns are not in the requested order, as it happens with the API
+        data = pd.DataFrame({'date': dates,
+                             'askclose': 1 + rng.rand(len(dates)),
+                             'askopen': 1 + rng.rand(len(dates)),
+                             'asklow': 1 + rng.rand(len(dates)),
+                             'askhigh': 1 + rng.rand(len(dates)),
+                             'tickqty': rng.randint(1, 100, len(dates))})
+        with self.lock:
+            self.nb_running -= 1
+        return data
+
+
+@test
+def test_get_candles_all_symbols():
+    client = FakeFxcmClient()
+    candles = get_candles_all_symbols('2021-01-04', '2021-01-05', client=client, nb_workers=3)
+
+    expected = pd.concat([candle.fetch_candles(FakeFxcmClient(delay=0), symb, start='2021-01-04', end='2021-01-06')
+                          for symb in SYMBOLS], axis=0)
+    expected.reset_index(inplace=True, drop=True)
+    pd.testing.assert_frame_equal(candles, expected)
+    assert_equal(list(candles['symbol'].unique()), SYMBOLS)
+    assert_true((candles['high'] >= candles[['open', 'close', 'low']].max(axis=1)).all())
+    assert_true((candles['low'] <= candles[['open', 'close', 'high']].min(axis=1)).all())
+    assert_equal(client.nb_calls, len(SYMBOLS))
+    assert_true(1 < client.max_running <= 3)
+
+
+@test
+def test_upload_to_db_candles():
+    inserted = list()
+    db_funcs = candle.get_uri_db, candle.insert_df_to_db, candle.create_candle_partitions
+    candle.get_uri_db = lambda schema: 'postgres://user@localhost/db?schema=' + schema
+    candle.insert_df_to_db = lambda conn, df, table_name, schema, method: inserted.append(df)
+    candle.create_candle_partitions = lambda conn, schema, start_date, end_date: None
+    try:
+        client = FakeFxcmClient()
+        upload_to_db_candles('2021-01-01', '2021-03-15', client=client)
+    finally:
+        candle.get_uri_db, candle.insert_df_to_db, candle.create_candle_partitions = db_funcs
+
+    # the period is split in 3 chunks of at most 30 days, consecutive chunks share a day
+    assert_equal(len(inserted), 3)
+    assert_equal(client.nb_calls, 3 * len(SYMBOLS))
+    dates = pd.concat(inserted)['date']
+    assert_equal(dates.min(), pd.Timestamp('2021-01-01'))
+    assert_equal(dates.max(), pd.Timestamp('2021-03-15 23:55'))
+
+
+class FailingFxcmClient(FakeFxcmClient):
+    def get_candles(self, symbol, period, columns, with_index, start, end):
+        if symbol == 'USD/HKD':
+            raise ValueError('Unknown symbol')
+        if symbol == 'EUR/GBP':
+            raise ConnectionError('connection reset')
+        return super().get_candles(symbol, period, columns, with_index, start, end)
+
+
+@test
+def test_fetch_candles_errors():
+    client = FailingFxcmClient(delay=0)
+    assert_true(candle.fetch_candles(client, 'USD/HKD', start='2021-01-04', end='2021-01-05').empty)
+    assert_raises(ConnectionError, candle.fetch_candles, client, 'EUR/GBP', start='2021-01-04', end='2021-01-05')
+
+
+@test
+def test_upload_to_db_candles_insert_error():
+    def insert_df_to_db(conn, df, table_name, schema, method):
+        raise RuntimeError('insert failed')
+
+    db_funcs = candle.get_uri_db, candle.insert_df_to_db, candle.create_candle_partitions
+    candle.get_uri_db = lambda schema: 'postgres://user@localhost/db?schema=' + schema
+    candle.insert_df_to_db = insert_df_to_db
+    candle.create_candle_partitions = lambda conn, schema, start_date, end_date: None
+    try:
+        client = FakeFxcmClient()
+        assert_raises(RuntimeError, upload_to_db_candles, '2021-01-01', '2021-06-30', client=client, queue_size=1)
+    finally:
+        candle.get_uri_db, candle.insert_df_to_db, candle.create_candle_partitions = db_funcs
+
+    # the downloader stopped after a few of the 6 chunks instead of staying blocked on the full queue
+    assert_true(not any(thread.name == 'candle-downloader' for thread in threading.enumerate()))
+    assert_true(client.nb_calls < 6 * len(SYMBOLS))
+
+
+class StubFxcmpy(FakeFxcmClient):
+    """
+    Session of the stubbed fxcmpy module, the connection is reset from failure_date
+    """
+    sessions = list()
+    failure_date = pd.Timestamp('2021-02-15')
+
+    def __init__(self, access_token, log_level, server, log_file) -> None:
+        super().__init__(delay=0)
+        self.access_token = access_token
+        self.closed = False
+        StubFxcmpy.sessions.append(self)
+
+    def get_candles(self, symbol, period, columns, with_index, start, end):
+        if pd.Timestamp(end) > self.failure_date:
+            raise ConnectionError('connection reset')
+        return super().get_candles(symbol, period, columns, with_index, start, end)
+
+    def close(self):
+        self.closed = True
+
+
+@test
+def test_fxcm_session_errors():
+    inserted = list()
+    db_funcs = candle.get_uri_db, candle.insert_df_to_db, candle.create_candle_partitions
+    candle.get_uri_db = lambda schema: 'postgres://user@localhost/db?schema=' + schema
+    candle.insert_df_to_db = lambda conn, df, table_name, schema, method: inserted.append(df)
+    candle.create_candle_partitions = lambda conn, schema, start_date, end_date: None
+    env = {k: os.environ.get(k) for k in ['TRADING_FXCM_KEY', 'TRADING_FXCM_LOGS_PATH']}
+    sys.modules['fxcmpy'] = types.SimpleNamespace(fxcmpy=StubFxcmpy)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        key_path = os.path.join(tmp_dir, 'fxcm_key')
+        with open(key_path, 'w') as f:
+            f.write('token')
+        os.environ.update({'TRADING_FXCM_KEY': key_path, 'TRADING_FXCM_LOGS_PATH': os.path.join(tmp_dir, 'fxcm.log')})
+        try:
+            candles = get_candles_all_symbols('2021-01-04', '2021-01-05')
+            assert_equal(list(candles['symbol'].unique()), SYMBOLS)
+            # the errors of the session reach the caller, and the session is closed
+            assert_raises(ConnectionError, get_candles_all_symbols, '2021-02-14', '2021-02-15')
+            assert_raises(ConnectionError, upload_to_db_candles, '2021-01-01', '2021-06-30')
+        finally:
+            del sys.modules['fxcmpy']
+            for k, v in env.items():
+                if v is None:
+                    os.environ.pop(k, None)
+                else:
+                    os.environ[k] = v
+            candle.get_uri_db, candle.insert_df_to_db, candle.create_candle_partitions = db_funcs
+
+    assert_equal(len(StubFxcmpy.sessions), 3)
+    assert_true(all(session.closed and session.access_token == 'token' for session in StubFxcmpy.sessions))
+    # only the chunk downloaded before the failure is inserted, the backfill does not go on as a success
+    assert_equal(len(inserted), 1)
+
+
+@test
+def test_resample_candles():
+    candles = pd.concat([candle.fetch_candles(FakeFxcmClient(delay=0), symb, start='2021-01-04', end='2021-01-06')
+                         for symb in SYMBOLS[:3]], ignore_index=True)
+    candles = candles.drop(index=candles.index[::7]).sample(frac=1, random_state=0)
+    agg = {'open': 'first', 'close': 'last', 'low': 'min', 'high': 'max', 'tickqty': 'sum'}
+    result = resample_candles(candles)
+
+    sorted_candles = candles.sort_values(['symbol', 'date'])
+    for table_name, freq in [('candle15m', '15min'), ('candle30m', '30min'), ('candle1h', '1h'), ('candle4h', '4h'),
+                             ('candle1d', '1D')]:
+        expected = sorted_candles.groupby(['symbol', sorted_candles['date'].dt.floor(freq)]).aggregate(agg)
+        pd.testing.assert_frame_equal(result[table_name], expected.reset_index(), check_dtype=False)
+    assert_equal(len(result['candle1d']), 6)
+
+
+@test
+def test_rollup_candles():
+    candles = pd.concat([candle.fetch_candles(FakeFxcmClient(delay=0), symb, start='2021-01-04', end='2021-01-08')
+                         for symb in SYMBOLS[:3]], ignore_index=True)[COLS]
+    tables = dict()
+
+    # tables kept in memory, the source candles are selected as by the query of read_rollup_source
+    def read_rollup_source(conn, schema, source_table, table_name, symbols):
+        source = tables[source_table]
+        target = tables.get(table_name, source.iloc[:0])
+        last_date = source['symbol'].map(target.groupby('symbol')['date'].max())
+        selected = source['symbol'].isin(symbols) & (last_date.isna() | (source['date'] >= last_date))
+        return source[selected].sort_values(['symbol', 'date'])
+
+    def upsert_df_to_db(conn, df, table_name, schema):
+        table = pd.concat([tables.get(table_name, df.iloc[:0]), df]).drop_duplicates(['symbol', 'date'], keep='last')
+        tables[table_name] = table.sort_values(['symbol', 'date']).reset_index(drop=True)
+        return len(df)
+
+    db_funcs = resampling.read_rollup_source, resampling.upsert_df_to_db
+    resampling.read_rollup_source, resampling.upsert_df_to_db = read_rollup_source, upsert_df_to_db
+    try:
+        # the candles arrive in batches which end in the middle of buckets of every granularity
+        for end in ['2021-01-05 13:25', '2021-01-05 13:40', '2021-01-07 02:10', '2021-01-09']:
+            tables['candle'] = candles[candles['date'] < end]
+            nb_rows = rollup_candles('conn', 'trading')
+            expected = resample_candles(tables['candle'])
+            for table_name, _ in GRANULARITIES:
+                pd.testing.assert_frame_equal(tables[table_name], expected[table_name], check_dtype=False)
+    finally:
+        resampling.read_rollup_source, resampling.upsert_df_to_db = db_funcs
+
+    # the last run only upserts the buckets from the high-water mark of each symbol
+    assert_equal(nb_rows['candle1d'], 3)
+    assert_true(nb_rows['candle15m'] < len(expected['candle15m']) / 2)
+
+
+test_get_candles_all_symbols()
+test_upload_to_db_candles()
+test_fetch_candles_errors()
+test_upload_to_db_candles_insert_error()
+test_fxcm_session_errors()
+test_resample_candles()
+test_rollup_candles()
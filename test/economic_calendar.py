@@ -0,0 +1,188 @@
+import json
+import tempfile
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from pathlib import Path
+from urllib.parse import parse_qs
+
+from proboscis.asserts import assert_true, assert_equal
+from proboscis import test
+from cerberus import Validator
+
+import pandas as pd
+
+from data.economic_calendar import EventFetcher, ColumnValidator, MISSING, ResponseCache, schema, parse_events, \
+    get_request_params
+
+fixtures_path = Path.cwd() / 'trading' / 'test' / 'data' / 'economic_calendar'
+
+
+class CalendarHandler(BaseHTTPRequestHandler):
+    """
+    Stand-in for getCalendarFilteredData, replaying the responses saved in fixtures_path by dateFrom. The first
+    nb_failures requests get a 503.
+    """
+    nb_failures = 0
+    requested_days = list()
+    lock = threading.Lock()
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers['Content-Length'])).decode()
+        date = parse_qs(body)['dateFrom'][0]
+        with self.lock:
+            fail = CalendarHandler.nb_failures > 0
+            CalendarHandler.nb_failures -= 1
+            CalendarHandler.requested_days.append(date)
+        if fail:
+            self.send_response(503)
+            self.end_headers()
+            return
+
+        fixture = fixtures_path / f'{date}.json'
+        content = fixture.read_bytes() if fixture.is_file() else json.dumps({'data': ''}).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_server(nb_failures: int = 0) -> ThreadingHTTPServer:
+    CalendarHandler.nb_failures = nb_failures
+    CalendarHandler.requested_days = list()
+    server = ThreadingHTTPServer(('127.0.0.1', 0), CalendarHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+# events parsed from the fixtures by the BeautifulSoup parser with a cerberus Validator per event
+recorded_events = json.loads((fixtures_path / 'expected_events.json').read_text())
+
+
+def expected_events(days) -> pd.DataFrame:
+    events = pd.DataFrame([ev for day in days for ev in recorded_events[day]])
+    return events.where(pd.notnull(events), None)
+
+
+@test
+def test_parse_events():
+    for day, events in recorded_events.items():
+        assert_equal(parse_events(json.loads((fixtures_path / f'{day}.json').read_text())['data'], day), events)
+    assert_equal(parse_events('', '2021-03-15'), [])
+
+
+@test
+def test_column_validator():
+    validator = ColumnValidator(schema)
+    columns = {'time': ['10:00', 'Toute la journée', '10:00', '10:00', '10:00', '10:00'],
+               'country': ['EUR', 'JPY', 'XYZ', 'USD', 'USD', 'USD'],
+               'importance': [3, 1, 1, MISSING, 4, True],
+               'name': ['a', 'b', 'c', 'd', 'e', 'f'],
+               'actual_value': [1., None, None, 2, None, None],
+               'is_positive': [0, 0, 0, 1, 0, 0],
+               'forecast_value': [None, None, None, None, None, False],
+               'previous_value': [None, None, None, None, None, None]}
+    is_valid, errors = validator(columns)
+    assert_equal(is_valid.tolist()[:5], [True, False, False, True, False])
+    assert_equal(list(errors[1].keys()), ['time'])
+    assert_equal(list(errors[2].keys()), ['country'])
+    assert_equal(errors[4], {'importance': ['max value is 3']})
+
+    # same result as a cerberus Validator per record, bool values included
+    for i, values in enumerate(zip(*columns.values())):
+        record = {field: value for field, value in zip(columns.keys(), values) if value is not MISSING}
+        event_validator = Validator(schema)
+        assert_equal(event_validator.validate(record), is_valid[i])
+        assert_equal(event_validator.errors, errors[i])
+
+
+@test
+def test_get_events_on_period():
+    server = start_server()
+    try:
+        base_url = f'http://127.0.0.1:{server.server_port}/'
+        with EventFetcher(base_url, nb_workers=3, max_requests_per_second=100) as fetcher:
+            events = fetcher.get_events_on_period('2021-03-15', '2021-03-17')
+    finally:
+        server.shutdown()
+
+    # each day is requested once, the end date included
+    assert_equal(sorted(CalendarHandler.requested_days), ['2021-03-15', '2021-03-16', '2021-03-17'])
+    pd.testing.assert_frame_equal(events, expected_events(['2021-03-15', '2021-03-16', '2021-03-17']))
+    assert_equal(len(events), 19)
+    assert_true(not events.duplicated(['date', 'country', 'name']).any())
+
+
+@test
+def test_get_events_retry():
+    server = start_server(nb_failures=2)
+    try:
+        base_url = f'http://127.0.0.1:{server.server_port}/'
+        with EventFetcher(base_url, nb_workers=1, max_requests_per_second=100, nb_retries=2, backoff=0.01) as fetcher:
+            events = fetcher.get_events('2021-03-16')
+        with EventFetcher(base_url, nb_workers=1, max_requests_per_second=100, nb_retries=0) as fetcher:
+            CalendarHandler.nb_failures = 1
+            no_events = fetcher.get_events('2021-03-16')
+    finally:
+        server.shutdown()
+
+    assert_equal(len(events), 7)
+    assert_equal(no_events, [])
+    assert_equal(CalendarHandler.requested_days, ['2021-03-16'] * 4)
+
+
+@test
+def test_get_events_rate_limit():
+    server = start_server()
+    try:
+        base_url = f'http://127.0.0.1:{server.server_port}/'
+        with EventFetcher(base_url, nb_workers=4, max_requests_per_second=20) as fetcher:
+            start = pd.Timestamp.now()
+            fetcher.get_events_on_period('2021-03-01', '2021-03-20')
+            elapsed = (pd.Timestamp.now() - start).total_seconds()
+    finally:
+        server.shutdown()
+
+    # 20 requests, at most 20 per second
+    assert_equal(len(CalendarHandler.requested_days), 20)
+    assert_true(elapsed >= 19 / 20)
+
+
+@test
+def test_response_cache():
+    server = start_server()
+    try:
+        base_url = f'http://127.0.0.1:{server.server_port}/'
+        with tempfile.TemporaryDirectory() as cache_dir:
+            results = list()
+            for revision_days in [3, 3, 10**5]:
+                with EventFetcher(base_url, max_requests_per_second=100, cache_dir=cache_dir,
+                                  revision_days=revision_days) as fetcher:
+                    results.append(fetcher.get_events_on_period('2021-03-15', '2021-03-17'))
+                    results.append(fetcher.cache.stats())
+            cache = ResponseCache(cache_dir)
+            params = get_request_params('2021-03-15')
+            other_countries = [x for x in params if x != ('country[]', '5')]
+            cached_other_countries = cache.get(other_countries)
+    finally:
+        server.shutdown()
+
+    # the second run is served from disk, the third one considers the days too recent to be final
+    assert_equal(len(CalendarHandler.requested_days), 6)
+    assert_equal(results[1], {'hits': 0, 'misses': 3})
+    assert_equal(results[3], {'hits': 3, 'misses': 0})
+    assert_equal(results[5], {'hits': 0, 'misses': 3})
+    for events in results[2::2]:
+        pd.testing.assert_frame_equal(events, results[0])
+    assert_true(cached_other_countries is None)
+
+
+test_parse_events()
+test_column_validator()
+test_get_events_on_period()
+test_get_events_retry()
+test_get_events_rate_limit()
+test_response_cache()
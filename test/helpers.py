@@ -0,0 +1,44 @@
+from typing import List, Optional
+
+import numpy as np
+import pandas as pd
+
+from data.candle import SYMBOLS
+
+
+def generate_candles(nb_candles: int = 3000, seed: int = 0, start: str = '2020-01-01',
+                     flat: Optional[slice] = None) -> pd.DataFrame:
+    """
+    Random walk of 5 minutes candles of one symbol
+    :param flat: candles of a flat market, where all the prices are equal
+    :return: date, open, close, low, high and tickqty columns
+    """
+    rng = np.random.RandomState(seed)
+    close = 1.2 + np.cumsum(rng.normal(0, 5e-4, nb_candles))
+    open_ = np.concatenate([[close[0]], close[:-1]])
+    high = np.maximum(open_, close) + np.abs(rng.normal(0, 3e-4, nb_candles))
+    low = np.minimum(open_, close) - np.abs(rng.normal(0, 3e-4, nb_candles))
+    if flat is not None:
+        open_[flat] = close[flat] = low[flat] = high[flat] = 1.3
+    return pd.DataFrame({'date': pd.date_range(start, periods=nb_candles, freq='5min'),
+                         'open': open_, 'close': close, 'low': low, 'high': high,
+                         'tickqty': rng.randint(1, 100, nb_candles)})
+
+
+def generate_symbol_candles(start: str, end: str, symbols: List[str] = SYMBOLS, seed: int = 0,
+                            missing_ratio: float = 0.) -> pd.DataFrame:
+    """
+    Random walks of 5 minutes candles of several symbols, in long format
+    :param missing_ratio: share of the dates of [start, end[ without a candle, for each symbol
+    :return: date, symbol, open, close, low, high and tickqty columns, sorted by symbol and date
+    """
+    dates = pd.date_range(start, end, freq='5min')
+    nb_dates = int((dates < pd.Timestamp(end)).sum())
+    rng = np.random.RandomState(seed)
+    candles = list()
+    for i, symbol in enumerate(symbols):
+        candles_symbol = generate_candles(nb_dates, seed + i, start)
+        candles_symbol = candles_symbol[rng.rand(nb_dates) >= missing_ratio]
+        candles_symbol.insert(1, 'symbol', symbol)
+        candles.append(candles_symbol)
+    return pd.concat(candles, ignore_index=True)
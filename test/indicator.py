@@ -1,14 +1,32 @@
+import tempfile
 from pathlib import Path
-from proboscis.asserts import assert_equal
+from proboscis.asserts import assert_equal, assert_true
 from proboscis import test
 
+import numpy as np
 import pandas as pd
+from sklearn.linear_model import LinearRegression
 
+from indicator.cache import IndicatorCache, set_indicator_cache
+from indicator.indicator import IndicatorAbstract
 from indicator.performance import Expectancy
-from indicator.risk import RiskRewardRatio
+from indicator.risk import RiskRewardRatio, MaxDrawDown, SharpeRatio, Calmar, compute_all
+from indicator.oscillator import Rsi, Atr, Stochastic
+from indicator.trend import ExponentialMovingAverage, BollingerBands
+from indicator.streaming import StreamingRsi, StreamingAtr, StreamingStochastic, StreamingExponentialMovingAverage, \
+    StreamingBollingerBands
+from indicator.trade import TradeLedger
+from indicator.trend import Adx, Slope, WeightedMovingAverage, HullMovingAverage
+from utils.utils import compute_wilder_smoothing, compute_rolling_slope, compute_slope
+from benchmark.wilder_smoothing import loop_rsi, loop_adx
+from benchmark.moving_average import rolling_apply_wma, rolling_apply_hma
+from test.helpers import generate_candles
 
 data = pd.read_csv(Path.cwd() / 'trading' / 'test' / 'data' / 'performance_risk_01.csv', sep=';')
 
+# candles of a flat market, where the stochastic is not defined
+FLAT = slice(1000, 1030)
+
 
 @test
 def test_expectancy():
@@ -29,5 +47,176 @@ def test_risk_reward_ratio():
     assert_equal(rrr.result['RiskRewardRatio'], 2.04)
 
 
+@test
+def test_compute_all():
+    equity = data.assign(return_cumsum=100 + data['close'])
+    result = compute_all(equity, 'return_cumsum', trade_size=1)
+    assert_equal(list(result.keys())[:5], ['CAGR', 'Volatility', 'SharpeRatio', 'MaxDrawDown', 'Calmar'])
+    for ind in [SharpeRatio, MaxDrawDown, Calmar]:
+        assert_equal(result[ind.__name__], ind(equity, 'return_cumsum').compute())
+    assert_equal(result['Calmar'], round(result['CAGR'] / result['MaxDrawDown'], 2))
+    assert_equal(result['RiskRewardRatio'], 2.04)
+    assert_equal(result['Expectancy'], 0.9)
+    assert_true('NbTrades' not in compute_all(equity, 'return_cumsum'))
+
+
+@test
+def test_trade_ledger():
+    ledger = TradeLedger.from_result(data)
+    assert_equal(len(ledger), 5)
+    assert_equal(ledger.entry_idx.tolist(), [1, 8, 10, 15, 19])
+    assert_equal(ledger.side.tolist(), [1, -1, 1, -1, 1])
+
+
+def assert_same_values(streamed, batch):
+    streamed, batch = np.asarray(streamed, dtype=float), np.asarray(batch, dtype=float)
+    assert_equal(np.isnan(streamed).tolist(), np.isnan(batch).tolist())
+    assert_true(np.allclose(streamed, batch, rtol=1e-9, atol=1e-9, equal_nan=True))
+
+
+@test
+def test_streaming_indicators():
+    candles = generate_candles(flat=FLAT)
+    indicators = [(StreamingRsi(14), Rsi(candles).compute(14)),
+                  (StreamingExponentialMovingAverage(20), ExponentialMovingAverage(candles).compute(20)),
+                  (StreamingBollingerBands(20, 2), BollingerBands(candles).compute(20, 2)),
+                  (StreamingStochastic(14, 3), Stochastic(candles).compute(14, 3)),
+                  (StreamingStochastic(14, 3, slow=True), Stochastic(candles).compute(14, 3, slow=True))]
+    indicators += [(StreamingAtr(14, avg_type), Atr(candles).compute(14, avg_type))
+                   for avg_type in ['ma', 'ewm', 'wws']]
+
+    for streaming, batch in indicators:
+        streamed = [streaming.update(candle) for candle in candles.to_dict('records')]
+        if isinstance(batch, tuple):
+            for i, batch_values in enumerate(batch):
+                assert_same_values([x[i] for x in streamed], batch_values)
+        else:
+            assert_same_values(streamed, batch)
+
+
+class UndeclaredMedian(IndicatorAbstract):
+    # reads high and low without declaring them, so it must not be cached
+    def compute(self, span: int = 3) -> np.ndarray:
+        self.result = ((self.data['high'] + self.data['low']) / 2).rolling(span).mean()
+        return self.result.values
+
+    def plot(self, fig):
+        pass
+
+
+@test
+def test_wilder_smoothing():
+    values = np.random.RandomState(0).normal(0, 1, 200)
+    values[150] = np.NaN
+    expected = np.full(len(values), np.NaN)
+    expected[20] = 0.5
+    for i in range(21, len(values)):
+        expected[i] = (13 * expected[i - 1] + values[i]) / 14
+    assert_same_values(compute_wilder_smoothing(values, 14, 20, 0.5), expected)
+    assert_true(np.isnan(compute_wilder_smoothing(values[:10], 14, 20, 0.5)).all())
+
+    # same values as the recursions of Rsi and Adx before they were vectorized
+    candles = generate_candles(flat=FLAT)
+    for span in [2, 14, 30]:
+        assert_same_values(Rsi(candles.copy()).compute(span), loop_rsi(candles, span))
+        assert_same_values(Adx(candles.copy()).compute(span)[2], loop_adx(candles, span))
+
+
+def regression_slopes(values: pd.Series, span: int) -> np.ndarray:
+    # Slope.compute before it used compute_rolling_slope, one regression per window
+    slopes = [0] * (span - 1)
+    for i in range(span - 1, len(values)):
+        y = values.loc[i - span + 1: i]
+        x = np.arange(span).reshape((span, 1))
+        y_scaled = (y - y.min()) / (y.max() - y.min())
+        if len(y_scaled[y_scaled.isnull()]):
+            slopes.append(np.NaN)
+            continue
+        x_scaled = (x - x.min()) / (x.max() - x.min())
+        lr = LinearRegression()
+        lr.fit(x_scaled, y_scaled)
+        slopes.append(lr.coef_[0])
+    return np.rad2deg(np.arctan(np.array(slopes, dtype=float)))
+
+
+@test
+def test_rolling_slope():
+    # candles around the flat market, where the slopes are NaN
+    candles = generate_candles(flat=FLAT).iloc[900: 1300].reset_index(drop=True)
+    for span in [2, 5, 20]:
+        expected = regression_slopes(candles['close'], span)
+        assert_same_values(Slope(candles.copy(), 'close').compute(span), expected)
+        assert_true(np.isclose(compute_slope(candles, 200, span), expected[200], rtol=1e-9, atol=1e-9))
+        assert_equal(compute_slope(candles, 125, span), 0)
+
+    values = candles['close'].copy()
+    values[50] = np.NaN
+    slopes = compute_rolling_slope(values, 5)
+    assert_true(np.isnan(slopes[:4]).all() and np.isnan(slopes[50: 55]).all())
+    assert_same_values(slopes[55:], regression_slopes(values, 5)[55:])
+    assert_true(np.isnan(compute_rolling_slope(values[:3], 5)).all())
+
+
+@test
+def test_weighted_moving_average():
+    candles = generate_candles(flat=FLAT)
+    candles.loc[500, 'close'] = np.NaN
+    for span in [2, 6, 20, 200]:
+        wma_candles, hma_candles = candles.copy(), candles.copy()
+        assert_same_values(WeightedMovingAverage(wma_candles, 'close').compute(span),
+                           rolling_apply_wma(candles, 'close', span))
+        assert_same_values(HullMovingAverage(hma_candles, 'close').compute(span),
+                           rolling_apply_hma(candles.copy(), 'close', span))
+        # no scratch column is added to the candles
+        assert_equal(list(wma_candles.columns), list(candles.columns))
+        assert_equal(list(hma_candles.columns), list(candles.columns))
+
+
+@test
+def test_indicator_cache():
+    candles = generate_candles(flat=FLAT)
+    cache = IndicatorCache()
+    set_indicator_cache(cache)
+    try:
+        atr, _ = Atr(candles).compute(14)
+        assert_equal((cache.hits, cache.misses), (0, 1))
+        cached_atr, _ = Atr(candles).compute(14)
+        assert_equal((cache.hits, cache.misses), (1, 1))
+        assert_true(np.array_equal(atr, cached_atr, equal_nan=True))
+
+        # high is read by Atr besides close, a change of it is a miss
+        changed = candles.copy()
+        changed.loc[2000, 'high'] += 1e-2
+        changed_atr, _ = Atr(changed).compute(14)
+        assert_equal((cache.hits, cache.misses), (1, 2))
+        assert_true(not np.array_equal(atr, changed_atr, equal_nan=True))
+
+        stats = cache.stats()
+        UndeclaredMedian(candles).compute()
+        UndeclaredMedian(candles).compute()
+        assert_equal(cache.stats(), stats)
+
+        # room for one Rsi result, the previous one is spilled to disk and read back from there
+        with tempfile.TemporaryDirectory() as spill_dir:
+            cache = IndicatorCache(max_bytes=30000, spill_dir=spill_dir)
+            set_indicator_cache(cache)
+            rsi = Rsi(candles).compute(14)
+            Rsi(candles).compute(10)
+            assert_equal(cache.evictions, 1)
+            assert_equal(len(list(Path(spill_dir).iterdir())), 1)
+            spilled_rsi = Rsi(candles).compute(14)
+            assert_equal((cache.hits, cache.disk_hits, cache.misses), (0, 1, 2))
+            assert_true(np.array_equal(rsi, spilled_rsi, equal_nan=True))
+    finally:
+        set_indicator_cache(None)
+
+
 test_expectancy()
-test_risk_reward_ratio()
\ No newline at end of file
+test_risk_reward_ratio()
+test_compute_all()
+test_trade_ledger()
+test_streaming_indicators()
+test_wilder_smoothing()
+test_rolling_slope()
+test_weighted_moving_average()
+test_indicator_cache()
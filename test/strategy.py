@@ -0,0 +1,279 @@
+import ast
+import hashlib
+import json
+import tempfile
+from decimal import Decimal
+from pathlib import Path
+
+from proboscis.asserts import assert_equal, assert_raises, assert_true
+from proboscis import test
+
+import numpy as np
+import pandas as pd
+
+from strategy.stop_loss import StopLossATR
+from strategy.examples.double_differencing import DoubleDifferencing
+from strategy.examples.e_super_trend import ESuperTrend
+from strategy.examples.equilibrium import Equilibrium
+from strategy.examples.fisher_rsi import FisherRSI
+from strategy.examples.flashing_indicator import FlashingIndicator
+from strategy.examples.hull_rsi import HullRSI
+from strategy.examples.hull_rsi_ma500_rsi import HullRSIMA500RSI
+from strategy.examples.ma500_rsi import MA500Rsi
+from strategy.examples.macd_crossover_strategy import MACDCrossOverStrategy
+from strategy.examples.macd_flip_strategy import MACDFlipStrategy
+from strategy.examples.outstreched import OutstrechedStrategy
+from strategy.examples.rsi_stochastic import RSIStochastic, StreamingRSIStochastic
+from strategy.examples.triangular_rsi import TriRSI, StreamingTriRSI
+from strategy.portfolio import SharedCandles, run_portfolio
+from strategy.streaming import RingBuffer, replay
+from strategy.sweep import build_search_space, sweep_strategy, init_worker
+from strategy.signals import col, crosses_below, crosses_above, held_for_n, lag, within_k_bars
+from strategy.walk_forward import walk_forward, get_windows, run_parameter_set, run_test_windows
+from test.helpers import generate_candles
+from utils.utils import AnnualGranularity
+
+data = generate_candles()
+
+# Ema200MultiTimeframes, Ema5Ema12Rsi21 and KsEnvelopes still rely on helpers that are not in StrategyAbstract
+# anymore, they cannot be run with either engine
+STRATEGIES = [(DoubleDifferencing, {'span': 2, 'spread': 1e-5}),
+              (ESuperTrend, {}),
+              (Equilibrium, {'span_ma': 5, 'span_ema': 5}),
+              (FisherRSI, {}),
+              (FlashingIndicator, {'roc_period': 10, 'bb_span': 20}),
+              (HullRSI, {'span': 6, 'spread': 1e-5}),
+              (HullRSIMA500RSI, {'span_ma': 100}),
+              (MA500Rsi, {'span_ma': 100, 'nb_std_ma': 0.5}),
+              (MACDCrossOverStrategy, {}),
+              (MACDFlipStrategy, {}),
+              (OutstrechedStrategy, {}),
+              (RSIStochastic, {}),
+              (TriRSI, {'span': 5})]
+
+RESULT_COLS = ['action', 'buy_signal', 'sell_signal', 'action_price', 'ret', 'stop_loss', 'take_profit',
+               'current_returns']
+
+
+@test
+def test_run_backtest_matches_loop():
+    # the strategies deciding candle by candle, the others give their signals to run_backtest in apply_strategy
+    for update in [False, True]:
+        for strategy_class, params in [(RSIStochastic, {}), (TriRSI, {'span': 5})]:
+            strategy = strategy_class(data, AnnualGranularity.MIN_5.value, StopLossATR(span=14, stop=1, profit=2,
+                                                                                        update=update))
+            strategy.apply_strategy(**params)
+            loop_result = strategy.data[RESULT_COLS].copy()
+
+            strategy.run_backtest(loop_result['buy_signal'].values, loop_result['sell_signal'].values,
+                                  params.get('spread', 0))
+            for col in RESULT_COLS:
+                assert_true(np.array_equal(loop_result[col].values.astype(float),
+                                           strategy.data[col].values.astype(float), equal_nan=True),
+                            f'{strategy_class.__name__} (update={update}) differs on column {col}')
+
+
+@test
+def test_pinned_actions():
+    # actions given by the loop implementations of the strategies before they were written with strategy.signals
+    expected = pd.read_csv(Path.cwd() / 'trading' / 'test' / 'data' / 'strategy_actions.csv', sep=';')
+    strategies = {strategy_class.__name__: strategy_class for strategy_class, _ in STRATEGIES}
+    for row in expected.itertuples():
+        strategy = strategies[row.strategy](data, AnnualGranularity.MIN_5.value,
+                                            StopLossATR(span=14, stop=1, profit=2, update=row.update))
+        strategy.apply_strategy(**ast.literal_eval(row.params))
+        action = strategy.data['action'].to_numpy(dtype=np.int8)
+        name = f'{row.strategy} {row.params} (update={row.update})'
+        assert_equal(str(strategy.data['date'].iloc[0]), row.first_date, name)
+        assert_equal(((action == 1).sum(), (action == -1).sum()), (row.nb_buy, row.nb_sell), name)
+        assert_equal(hashlib.sha1(action.tobytes()).hexdigest(), row.actions_digest, name)
+        assert_true(np.isclose(np.nansum(strategy.data['ret'].to_numpy(dtype=float)), row.ret, rtol=0, atol=1e-9),
+                    name)
+
+
+@test
+def test_sweep_resume():
+    strategy_grid, stop_loss_grid = {'span': [3, 5]}, {'span': [14], 'stop': [1, 2], 'profit': [2]}
+    assert_equal(len(build_search_space(strategy_grid, stop_loss_grid)), 4)
+    assert_equal(build_search_space(strategy_grid, stop_loss_grid, nb_samples=3),
+                 build_search_space(strategy_grid, stop_loss_grid, nb_samples=3))
+    assert_equal(len(build_search_space(strategy_grid, stop_loss_grid, nb_samples=3)), 3)
+
+    candles = data.iloc[:1000]
+    with tempfile.TemporaryDirectory() as result_dir:
+        result_path = Path(result_dir) / 'sweep.jsonl'
+        result = sweep_strategy(TriRSI, candles, AnnualGranularity.MIN_5.value, StopLossATR, strategy_grid,
+                                stop_loss_grid, nb_workers=2, result_path=str(result_path))
+        assert_equal(len(result), 4)
+        assert_true(result['error'].isnull().all())
+        lines = result_path.read_text().splitlines()
+        runs = {x['run_id']: x for x in map(json.loads, lines)}
+
+        # the sweep is interrupted after two runs, only the two others are run when it is resumed
+        result_path.write_text('\n'.join(lines[:2]) + '\n')
+        result = sweep_strategy(TriRSI, candles, AnnualGranularity.MIN_5.value, StopLossATR, strategy_grid,
+                                stop_loss_grid, nb_workers=2, result_path=str(result_path))
+        resumed_lines = result_path.read_text().splitlines()
+        assert_equal(resumed_lines[:2], lines[:2])
+        assert_equal(len(resumed_lines), 4)
+        assert_equal(sorted(result['run_id']), sorted(runs.keys()))
+        for line in resumed_lines:
+            assert_equal(json.loads(line), runs[json.loads(line)['run_id']])
+
+        result = sweep_strategy(TriRSI, candles, AnnualGranularity.MIN_5.value, StopLossATR, strategy_grid,
+                                stop_loss_grid, nb_workers=2, result_path=str(result_path))
+        assert_equal(len(result), 4)
+        assert_equal(len(result_path.read_text().splitlines()), 4)
+
+
+@test
+def test_ring_buffer():
+    buffer = RingBuffer(3)
+    for i in range(5):
+        buffer.append(i)
+    assert_true(list(buffer) == [2, 3, 4] and buffer[0] == 2 and buffer[-1] == 4 and len(buffer) == 3)
+
+
+@test
+def test_streaming_replay():
+    for update in [False, True]:
+        for batch_class, streaming_class, params in [(RSIStochastic, StreamingRSIStochastic, {}),
+                                                     (RSIStochastic, StreamingRSIStochastic, {'slow': True}),
+                                                     (TriRSI, StreamingTriRSI, {'span': 5, 'spread': 1e-5})]:
+            batch = batch_class(data, AnnualGranularity.MIN_5.value, StopLossATR(span=14, stop=1, profit=2,
+                                                                                 update=update))
+            streaming = streaming_class(None, AnnualGranularity.MIN_5.value, StopLossATR(span=14, stop=1, profit=2,
+                                                                                         update=update))
+            differ, _ = replay(batch, streaming, **params)
+            assert_true(len(differ) == 0, f'{streaming_class.__name__} (update={update}) differs from the batch run '
+                                          f'on {len(differ)} rows')
+            assert_true((batch.data['action'] != 0).any())
+
+
+def loop_crosses_below(values: pd.DataFrame, left: str, right: str, nb_prev: int) -> np.ndarray:
+    # signal of the candle loops, computed with the previous rows
+    signals = list()
+    prev_rows = list()
+    for row in values.itertuples(index=True):
+        signals.append(len(prev_rows) == nb_prev and all([getattr(x, left) > getattr(x, right) for x in prev_rows])
+                       and getattr(row, left) < getattr(row, right))
+        prev_rows = (prev_rows + [row])[-nb_prev:]
+    return np.array(signals)
+
+
+@test
+def test_signals():
+    rng = np.random.RandomState(0)
+    values = pd.DataFrame({'a': rng.normal(0, 1, 1000), 'b': rng.normal(0, 0.5, 1000)})
+    for nb_prev in [1, 2, 5]:
+        assert_true(np.array_equal(crosses_below('a', 'b', nb_prev).evaluate(values),
+                                   loop_crosses_below(values, 'a', 'b', nb_prev)))
+        assert_true(np.array_equal(crosses_above('b', 'a', nb_prev).evaluate(values),
+                                   loop_crosses_below(values, 'a', 'b', nb_prev)))
+
+    values = pd.DataFrame({'x': [1., 2., 3., 2., 1., 2., 3., 4.]})
+    assert_true(held_for_n(col('x') > 1, 2).evaluate(values).tolist() ==
+                [False, False, True, True, False, False, True, True])
+    assert_true(within_k_bars(col('x') == 3, 1).evaluate(values).tolist() ==
+                [False, False, True, True, False, False, True, True])
+    assert_true(lag((col('x') > 2) | (col('x') < 2), 2).evaluate(values).tolist() ==
+                [False, False, True, False, True, False, True, False])
+    assert_true(np.array_equal(lag('x').evaluate(values)[1:], values['x'].values[:-1]))
+    assert_true((~(col('x') >= 2) & (col('x') < 3)).evaluate(values).tolist() ==
+                [True, False, False, False, True, False, False, False])
+
+
+@test
+def test_backtest_window():
+    for update in [False, True]:
+        strategy = HullRSI(data, AnnualGranularity.MIN_5.value, StopLossATR(span=14, stop=1, profit=2, update=update))
+        strategy.apply_strategy(span=6)
+        buy_signals, sell_signals = strategy.data['buy_signal'].values, strategy.data['sell_signal'].values
+        start, end = 1000, 2000
+        window_result = strategy.backtest(buy_signals[start: end], sell_signals[start: end], start=start)
+
+        # same as a backtest of the whole data with signals only in the window, before the window ends
+        in_window = np.zeros(len(strategy.data), dtype=bool)
+        in_window[start: end] = True
+        full_result = strategy.backtest(buy_signals & in_window, sell_signals & in_window)
+        for col_name in RESULT_COLS:
+            assert_true(np.array_equal(window_result[col_name].astype(float),
+                                       full_result[col_name][start: end].astype(float)),
+                        f'backtest of a window (update={update}) differs on column {col_name}')
+
+
+@test
+def test_walk_forward():
+    assert_true(get_windows(10, 4, 3) == [(0, 4, 7), (3, 7, 10)])
+    assert_true(get_windows(10, 4, 4, anchored=True) == [(0, 4, 8), (0, 8, 10)])
+
+    # a worker sends back the metrics of the train windows, and the backtests of the test windows it is selected for
+    windows = get_windows(len(data), 1000, 500)
+    init_worker(data, None)
+    run = run_parameter_set(HullRSI, StopLossATR, AnnualGranularity.MIN_5.value, {'span': 6}, {}, windows)
+    assert_equal(sorted(run.keys()), ['error', 'run_id', 'span', 'train'])
+    assert_equal(len(run['train']), 4)
+    assert_true(all(np.isscalar(v) for train in run['train'] for v in train.values()))
+    tests = run_test_windows(HullRSI, StopLossATR, AnnualGranularity.MIN_5.value, {'span': 6}, {}, windows, [1, 3])
+    assert_equal({k: len(v) for k, v in tests.items()}, {1: 500, 3: 500})
+
+    for anchored in [False, True]:
+        result = walk_forward(HullRSI, data, AnnualGranularity.MIN_5.value, StopLossATR, {'span': [4, 6, 8]},
+                              train_size=1000, test_size=500, stop_loss_grid={'profit': [2, 4]}, anchored=anchored,
+                              nb_workers=2)
+        assert_true(len(result.windows) == 4)
+        assert_true(result.equity['date'].is_monotonic_increasing)
+        assert_true(result.equity['date'].iloc[0] >= data['date'].iloc[1000])
+        assert_true(result.equity['window'].nunique() == 4)
+        assert_true('SharpeRatio' in result.indicators and 'NbTrades' in result.indicators)
+        assert_true(np.isclose(result.equity['return_cumsum'].iloc[-1],
+                               10000 + 1e4 * result.equity['ret'].iloc[1:].sum()))
+
+
+@test
+def test_portfolio():
+    symbols = ['EUR/USD', 'GBP/USD', 'USD/JPY']
+    frames = {symbol: generate_candles(3000 - 200 * i, seed=i).iloc[50 * i:].reset_index(drop=True)
+              for i, symbol in enumerate(symbols)}
+    candles = pd.concat([frame.assign(symbol=symbol) for symbol, frame in frames.items()], ignore_index=True)
+    candles = candles.sample(frac=1, random_state=0)
+
+    shared_candles = SharedCandles(candles)
+    try:
+        assert_true(shared_candles.symbols == symbols)
+        assert_true(shared_candles.get('GBP/USD').equals(frames['GBP/USD']))
+    finally:
+        shared_candles.close()
+
+    # prices read from NUMERIC columns are Decimal objects, a column which is not numeric can't be shared
+    decimal_candles = candles.assign(close=candles['close'].map(lambda x: Decimal(repr(x))))
+    shared_candles = SharedCandles(decimal_candles)
+    try:
+        assert_true(shared_candles.get('GBP/USD').equals(frames['GBP/USD']))
+    finally:
+        shared_candles.close()
+    assert_raises(ValueError, SharedCandles, candles.assign(table='candle'))
+
+    result = run_portfolio(HullRSI, candles, AnnualGranularity.MIN_5.value, StopLossATR, {'span': 6},
+                           symbols=symbols[:2], nb_workers=2)
+    assert_true(list(result.symbols.index) == symbols[:2])
+    assert_true(result.equity['date'].is_unique and result.equity['date'].is_monotonic_increasing)
+    assert_true('SharpeRatio' in result.indicators and 'MaxDrawDown' in result.indicators)
+    for symbol in symbols[:2]:
+        strategy = HullRSI(frames[symbol], AnnualGranularity.MIN_5.value, StopLossATR())
+        strategy.apply_strategy(span=6)
+        strategy.compute_return()
+        assert_true(np.isclose(result.symbols.loc[symbol, 'pnl'], strategy.data['return_cumsum'].iloc[-1] - 10000))
+    assert_true(np.isclose(result.equity['return_cumsum'].iloc[-1],
+                           10000 * (1 + result.symbols['contribution'].sum())))
+
+
+test_run_backtest_matches_loop()
+test_pinned_actions()
+test_sweep_resume()
+test_ring_buffer()
+test_streaming_replay()
+test_signals()
+test_backtest_window()
+test_walk_forward()
+test_portfolio()
@@ -0,0 +1,167 @@
+import json
+import logging
+import shutil
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import List, Optional, Dict
+
+import numpy as np
+import pandas as pd
+
+from db.pool import get_connection
+from db.utils import CANDLE_TABLES
+from utils.candle_reader import PRICE_COLS, read_candles
+
+logger = logging.getLogger(__name__)
+
+COLS = ['date'] + PRICE_COLS + ['tickqty']
+COL_DTYPES = {'date': np.dtype('datetime64[ns]'), **{col: np.dtype(np.float64) for col in PRICE_COLS},
+              'tickqty': np.dtype(np.int64)}
+META_FILE = '_meta.json'
+
+
+def get_months(start_date: str, end_date: str) -> List[pd.Period]:
+    """
+    :return: the months overlapping [start_date, end_date[
+    """
+    start = pd.Timestamp(start_date)
+    end = pd.Timestamp(end_date) - pd.Timedelta(1, 'ns')
+    if end < start:
+        return list()
+    return list(pd.period_range(start, end, freq='M'))
+
+
+class CandleCache(object):
+    """
+    Local copy of the candle tables, one directory per table, month and symbol holding one .npy file per column. The
+    files are memory mapped and sliced by date before being copied into the result, so only the pages of the requested
+    dates are read from disk. A month is fetched from Postgres the first time it is requested. Until it is complete,
+    i.e. it ended more than complete_after_days before it was fetched, later requests only fetch the candles newer than
+    the last cached ones.
+    """
+    def __init__(self, dsn: str, schema: str, cache_dir: str, complete_after_days: int = 2) -> None:
+        self.dsn = dsn
+        self.schema = schema
+        self.cache_dir = Path(cache_dir)
+        self.complete_after_days = complete_after_days
+
+    def _month_dir(self, table: str, month: pd.Period) -> Path:
+        return self.cache_dir / self.schema / table / str(month)
+
+    def _read_meta(self, table: str, month: pd.Period) -> Optional[Dict]:
+        meta_path = self._month_dir(table, month) / META_FILE
+        if not meta_path.is_file():
+            return None
+        return json.loads(meta_path.read_text())
+
+    def _query(self, conn, table: str, start: datetime, end: datetime, after: Optional[datetime] = None) -> \
+            pd.DataFrame:
+        # the last cached candle is fetched again, the fetched one replaces it
+        start = max(start, after) if after is not None else start
+        candles = read_candles(conn, self.schema, str(start), str(end), tables=[table])
+        return candles.drop(columns='table')
+
+    def _write_month(self, table: str, month: pd.Period, candles: pd.DataFrame, complete: bool) -> None:
+        month_dir = self._month_dir(table, month)
+        tmp_dir = month_dir.with_name(month_dir.name + '.tmp')
+        if tmp_dir.exists():
+            shutil.rmtree(tmp_dir)
+        tmp_dir.mkdir(parents=True)
+
+        symbols = list()
+        for i, (symbol, candles_symbol) in enumerate(candles.groupby('symbol', sort=True)):
+            symbol_dir = tmp_dir / str(i)
+            symbol_dir.mkdir()
+            candles_symbol = candles_symbol.sort_values('date')
+            for col in COLS:
+                np.save(symbol_dir / f'{col}.npy', candles_symbol[col].to_numpy(dtype=COL_DTYPES[col]))
+            symbols.append({'symbol': symbol, 'dir': str(i), 'last_date': str(candles_symbol['date'].max())})
+
+        meta = {'complete': complete, 'fetched_at': datetime.now().isoformat(), 'symbols': symbols}
+        (tmp_dir / META_FILE).write_text(json.dumps(meta))
+        # the month directory is replaced only once fully written, so an interrupted sync leaves the old one
+        if month_dir.exists():
+            shutil.rmtree(month_dir)
+        tmp_dir.rename(month_dir)
+
+    def _read_month(self, table: str, month: pd.Period, meta: Dict) -> pd.DataFrame:
+        month_dir = self._month_dir(table, month)
+        candles = list()
+        for symbol in meta['symbols']:
+            values = {col: np.load(month_dir / symbol['dir'] / f'{col}.npy') for col in COLS}
+            candles_symbol = pd.DataFrame(values)
+            candles_symbol['symbol'] = symbol['symbol']
+            candles.append(candles_symbol)
+        if not candles:
+            return pd.DataFrame(columns=COLS + ['symbol'])
+        return pd.concat(candles, ignore_index=True)
+
+    def _slice_month(self, table: str, month: pd.Period, symbol: Dict, start: np.datetime64, end: np.datetime64) -> \
+            Dict[str, np.ndarray]:
+        """
+        :return: views on the memory mapped columns of the symbol, restricted to its candles in [start, end[
+        """
+        symbol_dir = self._month_dir(table, month) / symbol['dir']
+        columns = {col: np.load(symbol_dir / f'{col}.npy', mmap_mode='r') for col in COLS}
+        first, last = np.searchsorted(columns['date'], [start, end])
+        return {col: values[first: last] for col, values in columns.items()}
+
+    def sync(self, conn, table: str, month: pd.Period) -> Dict:
+        """
+        Fetch the candles of a month which are not in the cache yet
+        :return: the metadata of the cached month
+        """
+        meta = self._read_meta(table, month)
+        if meta is not None and meta['complete']:
+            return meta
+
+        start = month.start_time.to_pydatetime()
+        end = (month + 1).start_time.to_pydatetime()
+        complete = datetime.now() >= end + timedelta(days=self.complete_after_days)
+        if meta is None:
+            logger.info(f'Fetching {table} candles of {month}')
+            candles = self._query(conn, table, start, end)
+        else:
+            # only the candles newer than the last cached ones for every symbol are fetched
+            cached = self._read_month(table, month, meta)
+            last_dates = [pd.Timestamp(x['last_date']) for x in meta['symbols']]
+            after = min(last_dates).to_pydatetime() if last_dates else None
+            logger.info(f'Fetching {table} candles of {month} after {after}')
+            new_candles = self._query(conn, table, start, end, after)
+            candles = pd.concat([cached, new_candles], ignore_index=True)
+            candles = candles.drop_duplicates(subset=['symbol', 'date'], keep='last')
+
+        self._write_month(table, month, candles, complete)
+        return self._read_meta(table, month)
+
+    def get_candles(self, start_date: str, end_date: str, tables: List[str] = CANDLE_TABLES) -> pd.DataFrame:
+        """
+        Same result as utils.get_candles, with float64 prices, read from the cache after fetching what is missing
+        """
+        months = get_months(start_date, end_date)
+        metas = {(table, month): self._read_meta(table, month) for table in tables for month in months}
+        to_sync = [k for k, meta in metas.items() if meta is None or not meta['complete']]
+        if to_sync:
+            with get_connection(self.dsn) as conn:
+                for table, month in to_sync:
+                    metas[(table, month)] = self.sync(conn, table, month)
+
+        # slices of the candles of each table, sorted by symbol and date
+        start, end = pd.Timestamp(start_date).to_datetime64(), pd.Timestamp(end_date).to_datetime64()
+        slices = list()
+        for table in tables:
+            symbol_months = dict()
+            for month in months:
+                for symbol in metas[(table, month)]['symbols']:
+                    symbol_months.setdefault(symbol['symbol'], list()).append((month, symbol))
+            for name in sorted(symbol_months):
+                for month, symbol in symbol_months[name]:
+                    slices.append((table, name, self._slice_month(table, month, symbol, start, end)))
+
+        lengths = np.array([len(columns['date']) for _, _, columns in slices], dtype=np.int64)
+        values = {col: np.concatenate([np.empty(0, dtype=COL_DTYPES[col])] + [columns[col] for _, _, columns in slices])
+                  for col in COLS}
+        return pd.DataFrame({'table': np.repeat(np.array([table for table, _, _ in slices], dtype=object), lengths),
+                             'date': values['date'],
+                             'symbol': np.repeat(np.array([name for _, name, _ in slices], dtype=object), lengths),
+                             **{col: values[col] for col in PRICE_COLS + ['tickqty']}})
@@ -0,0 +1,60 @@
+import io
+import logging
+from typing import List, Optional, Union
+
+import numpy as np
+import pandas as pd
+import psycopg2.extensions
+
+from db.pool import get_connection
+from db.utils import CANDLE_TABLES
+
+logger = logging.getLogger(__name__)
+
+PRICE_COLS = ['open', 'close', 'low', 'high']
+VALUE_COLS = PRICE_COLS + ['tickqty']
+
+
+def read_candles(conn: Union[str, psycopg2.extensions.connection], schema: str, start_date: str, end_date: str,
+                 tables: List[str] = CANDLE_TABLES, symbols: Optional[List[str]] = None,
+                 columns: List[str] = VALUE_COLS, dtype: type = np.float64) -> pd.DataFrame:
+    """
+    Read candles with typed columns instead of the Decimal objects returned by read_sql for NUMERIC columns. Prices
+    are cast to float8 by the server and streamed with COPY, then parsed directly into arrays of dtype.
+    :param conn: an open connection or a uri of the database
+    :param tables: candle tables to read, in the order of the result
+    :param symbols: symbols to read, all of them if None
+    :param columns: columns to read besides table, date and symbol
+    :param dtype: np.float64 or np.float32, dtype of the prices
+    :return: candles of each table sorted by symbol and date, with a datetime64[ns] date column
+    """
+    unknown_cols = set(columns) - set(VALUE_COLS)
+    if unknown_cols:
+        raise ValueError(f"Unknown candle columns {unknown_cols}")
+
+    select_cols = ', '.join([f'{col}::float8 AS {col}' if col in PRICE_COLS else col for col in columns])
+    col_dtypes = {col: dtype if col in PRICE_COLS else np.int64 for col in columns}
+    col_dtypes['symbol'] = str
+    candles = list()
+    with get_connection(conn) as conn, conn.cursor() as cur:
+        for table in tables:
+            query = f'''
+                SELECT date, symbol{', ' if columns else ''}{select_cols}
+                FROM {schema}.{table}
+                WHERE date >= %(start_date)s AND date < %(end_date)s
+            '''
+            if symbols is not None:
+                query += ' AND symbol = ANY(%(symbols)s)'
+            query += ' ORDER BY symbol, date'
+            query = cur.mogrify(query, {'start_date': start_date, 'end_date': end_date, 'symbols': symbols})
+
+            buffer = io.StringIO()
+            cur.copy_expert(f"COPY ({query.decode()}) TO STDOUT WITH (FORMAT csv, HEADER)", buffer)
+            buffer.seek(0)
+            candles_table = pd.read_csv(buffer, dtype=col_dtypes, parse_dates=['date'])
+            candles_table.insert(0, 'table', table)
+            candles.append(candles_table)
+
+    candles = pd.concat(candles, ignore_index=True)
+    candles['date'] = candles['date'].values.astype('datetime64[ns]')
+    return candles
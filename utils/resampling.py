@@ -0,0 +1,121 @@
+import logging
+from typing import Dict, List, Tuple
+
+import numpy as np
+import pandas as pd
+from pandas.io.sql import read_sql
+
+from data.candle import SYMBOLS
+from db.utils import upsert_df_to_db
+
+logger = logging.getLogger(__name__)
+
+# Tables of the aggregated candles with their granularity, each granularity is a multiple of the previous one
+GRANULARITIES = [('candle15m', np.timedelta64(15, 'm')),
+                 ('candle30m', np.timedelta64(30, 'm')),
+                 ('candle1h', np.timedelta64(1, 'h')),
+                 ('candle4h', np.timedelta64(4, 'h')),
+                 ('candle1d', np.timedelta64(1, 'D'))]
+COLS = ['symbol', 'date', 'open', 'close', 'low', 'high', 'tickqty']
+
+
+def floor_dates(dates: np.ndarray, freq: np.timedelta64) -> np.ndarray:
+    """
+    :param dates: datetime64 values
+    :param freq: granularity, dividing a day
+    :return: start of the bucket of each date, buckets are aligned on midnight
+    """
+    ns = dates.astype('datetime64[ns]').view(np.int64)
+    freq_ns = freq.astype('timedelta64[ns]').astype(np.int64)
+    return (ns - ns % freq_ns).view('datetime64[ns]')
+
+
+def aggregate_sorted(codes: np.ndarray, dates: np.ndarray, values: Dict[str, np.ndarray], freq: np.timedelta64) -> \
+        Tuple[np.ndarray, np.ndarray, Dict[str, np.ndarray]]:
+    """
+    Aggregate candles sorted by symbol and date into buckets of freq
+    :param codes: code of the symbol of each candle
+    :param dates: date of each candle
+    :param values: open, close, low, high and tickqty of each candle
+    :return: code, date and values of each bucket
+    """
+    buckets = floor_dates(dates, freq)
+    if len(codes) == 0:
+        return codes, buckets, values
+    is_start = np.empty(len(codes), dtype=bool)
+    is_start[0] = True
+    is_start[1:] = (codes[1:] != codes[:-1]) | (buckets[1:] != buckets[:-1])
+    starts = np.flatnonzero(is_start)
+    ends = np.append(starts[1:], len(codes)) - 1
+
+    agg_values = {'open': values['open'][starts],
+                  'close': values['close'][ends],
+                  'low': np.minimum.reduceat(values['low'], starts),
+                  'high': np.maximum.reduceat(values['high'], starts),
+                  'tickqty': np.add.reduceat(values['tickqty'], starts)}
+    return codes[starts], buckets[starts], agg_values
+
+
+def resample_candles(candles: pd.DataFrame, granularities: List[Tuple[str, np.timedelta64]] = GRANULARITIES) -> \
+        Dict[str, pd.DataFrame]:
+    """
+    Aggregate 5 minutes candles into every granularity. The candles are sorted once, then each granularity is
+    aggregated from the previous one.
+    :param candles: candles with the columns symbol, date, open, close, low, high and tickqty
+    :return: aggregated candles with the columns of COLS, by table name
+    """
+    codes, symbols = pd.factorize(candles['symbol'], sort=True)
+    dates = candles['date'].values.astype('datetime64[ns]')
+    order = np.lexsort((dates, codes))
+    codes, dates = codes[order], dates[order]
+    values = {col: candles[col].values[order] for col in ['open', 'close', 'low', 'high', 'tickqty']}
+
+    result = dict()
+    for table_name, freq in granularities:
+        codes, dates, values = aggregate_sorted(codes, dates, values, freq)
+        agg_candles = pd.DataFrame({'symbol': np.asarray(symbols)[codes], 'date': dates})
+        for col, val in values.items():
+            agg_candles[col] = val
+        result[table_name] = agg_candles[COLS]
+    return result
+
+
+def read_rollup_source(conn, schema: str, source_table: str, table_name: str, symbols: List[str] = SYMBOLS) -> \
+        pd.DataFrame:
+    """
+    :return: candles of source_table which are not aggregated into table_name yet, or are in its last bucket of each
+    symbol, which may be partially filled. The date of this bucket is the high-water mark of the symbol, it is looked
+    up for each symbol with the (symbol, date) index of table_name instead of aggregating the whole table.
+    """
+    sql = f'set search_path = {schema};'
+    sql += f'''
+        SELECT s.symbol, s.date, s.open, s.close, s.low, s.high, s.tickqty
+        FROM unnest(%(symbols)s::text[]) AS sym(symbol)
+        LEFT JOIN LATERAL (SELECT t.date AS last_date FROM {table_name} t WHERE t.symbol = sym.symbol
+                           ORDER BY t.date DESC LIMIT 1) h ON true
+        JOIN {source_table} s ON s.symbol = sym.symbol AND (h.last_date IS NULL OR s.date >= h.last_date)
+        ORDER BY s.symbol, s.date
+    '''
+    return read_sql(sql, conn, params={'symbols': list(symbols)})
+
+
+def rollup_candles(conn, schema: str, base_table: str = 'candle',
+                   granularities: List[Tuple[str, np.timedelta64]] = GRANULARITIES, symbols: List[str] = SYMBOLS) -> \
+        Dict[str, int]:
+    """
+    Aggregate incrementally the candles of base_table into every granularity, each table being built from the
+    previous one: only the candles after the high-water mark of each symbol are read, and the aggregated candles are
+    upserted so that the last bucket is completed by the candles which arrived since the previous rollup.
+    :param symbols: symbols to roll up
+    :return: number of candles upserted by table name
+    """
+    nb_rows = dict()
+    source_table = base_table
+    for table_name, freq in granularities:
+        candles = read_rollup_source(conn, schema, source_table, table_name, symbols)
+        agg_candles = resample_candles(candles, [(table_name, freq)])[table_name]
+        nb_rows[table_name] = upsert_df_to_db(conn, agg_candles, table_name, schema) if len(agg_candles) else 0
+        logger.info(f"{len(candles)} candles of {source_table} rolled up into {nb_rows[table_name]} candles of "
+                    f"{table_name}")
+        source_table = table_name
+    return nb_rows
@@ -5,11 +5,8 @@ from datetime import datetime, timedelta
 import re
 from enum import Enum
 
-import psycopg2
 import pandas as pd
 import numpy as np
-from pandas.io.sql import read_sql
-from sklearn.linear_model import LinearRegression
 
 
 class AnnualGranularity(Enum):
@@ -90,21 +87,36 @@ def compute_average(data: pd.Series, span: int = 14,  avg_type: str = 'ma') -> p
     return avg
 
 
-def get_candles(dsn, schema, start_date, end_date):
-    candles = pd.DataFrame()
-    with psycopg2.connect(dsn) as conn:
-        for table in ['candle', 'candle15m', 'candle30m', 'candle1h', 'candle4h', 'candle1d']:
-            sql = f'set search_path = {schema};'
-            sql += f'''
-                SELECT '{table}' as table, date, symbol, open, close, low, high, tickqty
-                FROM {table}
-                WHERE date >= %(start_date)s and date < %(end_date)s 
-                order by symbol, date
-            '''
-            candles_tmp = read_sql(sql, conn, params={'start_date': start_date, 'end_date': end_date})
-            candles = pd.concat([candles, candles_tmp])
-    candles.reset_index(drop=True, inplace=True)
-    return candles
+def compute_wilder_smoothing(data: np.ndarray, span: int, start: int, first_value: float) -> np.ndarray:
+    """
+    Vectorized version of the recursion avg[i] = ((span - 1) * avg[i - 1] + data[i]) / span
+    :param data: values to smooth
+    :param span: the historical of date to take into account to compute the mean
+    :param start: index of the first smoothed value, the values before it are NaN and data[start] is not used
+    :param first_value: the smoothed value at index start
+    :return: an array of the smoothed values, as in the recursion a NaN in data makes all the following values NaN
+    """
+    data = np.array(data, dtype=float)
+    if start >= len(data):
+        return np.full(len(data), np.NaN)
+
+    data[:start] = np.NaN
+    data[start] = first_value
+    avg = pd.Series(data).ewm(alpha=1 / span, adjust=False).mean().values
+    nan_idx = np.flatnonzero(np.isnan(data[start:]))
+    if len(nan_idx):
+        avg[start + nan_idx[0]:] = np.NaN
+    return avg
+
+
+def get_candles(dsn, schema, start_date, end_date, cache_dir: Optional[str] = None):
+    # the candle readers use db.utils, which imports this module
+    from utils.candle_cache import CandleCache
+    from utils.candle_reader import read_candles
+
+    if cache_dir is not None:
+        return CandleCache(dsn, schema, cache_dir).get_candles(start_date, end_date)
+    return read_candles(dsn, schema, start_date, end_date)
 
 
 def compute_sign_changement(data, col, span):
@@ -117,22 +129,41 @@ def compute_sign_changement(data, col, span):
     return change_sign_pos, change_sign_neg
 
 
+def compute_rolling_slope(data: pd.Series, span: int = 5) -> np.ndarray:
+    """
+    :param data: series of data to compute the slopes
+    :param span: number of values of each window
+    :return: for each window of span values, the slope in degrees of the linear regression of the values, x and y
+    being min-max scaled in the window. The slope is given at the last index of the window, it is NaN for the first
+    span - 1 values and for the windows containing a NaN or only equal values.
+    """
+    values = np.asarray(data, dtype=float)
+    slopes = np.full(len(values), np.NaN)
+    if len(values) < span:
+        return slopes
+
+    # with centered x the regression slope is sum((x - mean(x)) * y) / sum((x - mean(x))^2)
+    x_centered = np.arange(span) - (span - 1) / 2
+    raw_slopes = np.correlate(values, x_centered, mode='valid') / np.sum(x_centered ** 2)
+
+    # scaling x to [0, 1] multiplies the slope by span - 1, scaling y divides it by max(y) - min(y)
+    rolling = pd.Series(values).rolling(span, min_periods=span)
+    amplitude = (rolling.max() - rolling.min()).values[span - 1:]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        scaled_slopes = np.where(amplitude > 0, raw_slopes * (span - 1) / amplitude, np.NaN)
+    slopes[span - 1:] = np.rad2deg(np.arctan(scaled_slopes))
+    return slopes
+
+
 def compute_slope(candles, idx, span=5, before=True, col='close'):
     if before:
-        y = candles.loc[idx - span + 1:idx, [col]]
+        y = candles.loc[idx - span + 1:idx, col]
     else:
-        y = candles.loc[idx: idx + span - 1, [col]]
-    x = np.arange(span).reshape((span, 1))
-    y_scaled = (y - y.min()) / (y.max() - y.min())
-    if len(y_scaled[y_scaled.isnull().any(axis=1)]):
-        return 0
-    x_scaled = (x - x.min()) / (x.max() - x.min())
-    lr = LinearRegression()
-    try:
-        lr.fit(x_scaled, y_scaled)
-    except:
+        y = candles.loc[idx: idx + span - 1, col]
+    if len(y) != span:
         return 0
-    return np.rad2deg(np.arctan(lr.coef_[0]))[0]
+    slope = compute_rolling_slope(y, span)[-1]
+    return 0 if np.isnan(slope) else slope
 
 
 def decompose_date(candles):